@@ -1,12 +1,20 @@
-import imagen_hub
-from imagen_hub.utils import save_pil_image
 import logging
 import os
-from PIL import Image
-from imagen_hub.SoM import SoM
+from manifest import Manifest
+from telemetry import report as report_telemetry, stage
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-logging.info(imagen_hub.__version__)
+
+# Set by main() / the som_pool workers; anything with SoM's add_marks() works
+som = None
+
+
+def load_som():
+    """imagen_hub's SoM; imported here so dummy runs don't need imagen_hub installed."""
+    import imagen_hub
+    from imagen_hub.SoM import SoM
+    logging.info(imagen_hub.__version__)
+    return SoM()
 
 
 # Task mapping
@@ -31,18 +39,20 @@ ID_TO_TOPIC = {
 
 
 def process_image(entry_path,filename):
+    """Returns "skipped", "done" or "failed"."""
     full_path = os.path.join(entry_path, filename)
-    model_name = filename.split(".")[0]
+    model_name = os.path.splitext(filename)[0]
     dest_path = full_path.replace("model_output", "SoM")
     som_dir = os.path.dirname(dest_path)
     som_dir = os.path.join(som_dir, model_name)
     image_path = os.path.join(som_dir, filename)
     if os.path.exists(image_path):
         print(f"⏭️ Already processed {image_path}. Skipping.")
-        return
+        return "skipped"
     os.makedirs(som_dir, exist_ok=True)
     try:
-        preview, npz_file = som.add_marks(
+        with stage("add_marks"):
+            preview, npz_file = som.add_marks(
                                 slider=1.8,
                                 anno_mode=["Mask", "Mark"], 
                                 alpha=0.6 , 
@@ -52,13 +62,15 @@ def process_image(entry_path,filename):
                                 text_size=800
                             )
         #result = som.add_marks(image_path=full_path, slider=1.8,method='semantic-sam',text_size=800,alpha=0.6)
-        save_pil_image(preview, som_dir, filename)
+        preview.save(image_path)
         logging.info(f"Processed: {full_path} -> {dest_path}")
+        return "done"
     except Exception as e:
         logging.warning(f"Failed to process {full_path}: {e}. Saving original instead.")
         # Save original image instead
         #original = Image.open(full_path)
         #save_pil_image(original, som_dir, filename)
+        return "failed"
 
 def process_single_example(input_path):
     task_name = None
@@ -71,11 +83,15 @@ def process_single_example(input_path):
         print(f"❌ Could not infer task name from path: {input_path}")
         return
     for filename in os.listdir(input_path):
-        if(filename.split(".")[1].lower() in IMAGE_EXTS):
+        if(os.path.splitext(filename)[1][1:].lower() in IMAGE_EXTS):
             process_image(input_path,filename)
 
 
-def process_all(root_dir):
+def process_all(root_dir, manifest=None):
+    if manifest is not None:
+        for model_output_dir, filename in manifest.pending_som(os.path.basename(os.path.normpath(root_dir))):
+            process_image(model_output_dir, filename)
+        return
     for entry in sorted(os.listdir(root_dir)):
         entry_path = os.path.join(root_dir, entry)
         if not os.path.isdir(entry_path):
@@ -84,15 +100,18 @@ def process_all(root_dir):
         process_single_example(entry_path)
 
 def main():
-    global som 
-    som = SoM()
+    global som
+    som = load_som()
     root = 'YOUR-DATA-ROOT'
     tasks = ['TIG','TIE','SRIG','SRIE','MRIG','MRIE']
+    manifest = Manifest(root)
+    manifest.refresh(tasks)
     #task = "TIG"
     #process_single_example("/home/samin/ImagenHub2_data/TIG/TIG_A_000002/model_output")
     for task in tasks:
         print(f'processing {task}')
-        process_all(f"{root}/{task}")
+        process_all(f"{root}/{task}", manifest)
+    report_telemetry()
 
         
 
@@ -0,0 +1,69 @@
+"""Grouping of compatible entries into inference batches.
+
+Entries can share a forward pass only if they have the same task, the same
+number of conditioning images and the same conditioning resolutions. `Batcher`
+keeps one open group per such key and hands a group back once it is full, or
+once its oldest entry has waited `max_wait` seconds. `timeout` says how long a
+caller waiting for the next entry may block before a group is due.
+
+Models opt in by exposing
+    infer_batch(prompts: List[str], input_images: Optional[List[List[Image]]] = None, **kwargs) -> List[Image]
+anything else is run one item at a time through `infer_one_image`.
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, List, Optional, Tuple
+
+
+def group_key(task_name: str, image_inputs: List[Any]) -> Tuple:
+    return (task_name, len(image_inputs), tuple(getattr(img, "size", None) for img in image_inputs))
+
+
+def supports_batching(model) -> bool:
+    return callable(getattr(model, "infer_batch", None))
+
+
+class Batcher:
+    def __init__(self, batch_size: int = 8, max_wait: float = 2.0, clock: Callable[[], float] = time.monotonic):
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self._clock = clock
+        # key -> (time the group was opened, items); insertion order = age order
+        self._groups: "OrderedDict[Hashable, Tuple[float, List[Any]]]" = OrderedDict()
+
+    def add(self, key: Hashable, item: Any) -> List[Any]:
+        """Add an item; returns the full batch if this filled its group, else []."""
+        if key not in self._groups:
+            self._groups[key] = (self._clock(), [])
+        items = self._groups[key][1]
+        items.append(item)
+        if len(items) >= self.batch_size:
+            del self._groups[key]
+            return items
+        return []
+
+    def expired(self) -> List[List[Any]]:
+        """Pop every group whose oldest item has waited at least `max_wait` seconds."""
+        now = self._clock()
+        ready = []
+        for key, (opened, items) in list(self._groups.items()):
+            if now - opened < self.max_wait:
+                break
+            del self._groups[key]
+            ready.append(items)
+        return ready
+
+    def timeout(self) -> Optional[float]:
+        """Seconds until the oldest open group expires (0 if it has), or None with no open groups."""
+        if not self._groups:
+            return None
+        opened, _ = next(iter(self._groups.values()))
+        return max(0.0, opened + self.max_wait - self._clock())
+
+    def drain(self) -> List[List[Any]]:
+        ready = [items for _, items in self._groups.values()]
+        self._groups.clear()
+        return ready
+
+    def __len__(self) -> int:
+        return sum(len(items) for _, items in self._groups.values())
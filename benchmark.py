@@ -0,0 +1,556 @@
+"""Offline benchmark suite for the pipeline's hot paths.
+
+Builds a synthetic ImagenWorld-shaped tree (<root>/<task>/<entry> with
+metadata.json, cond images and model_output/) and runs each stage against the
+mock backends: FakeGeminiClient / FakeOpenAIClient for the APIs, DummyModel
+for imagen_hub and DummySoM for SoM, all with the same --latency and
+--failure-rate. Nothing touches the network or a GPU, and with a fixed --seed
+every run sees the same tree, prompts and failure pattern.
+
+End-to-end benchmarks report items/s through the real entry points:
+
+- e2e/preprocess, e2e/extract, e2e/fused: gemini_preprocess / extract_objects / fused_preprocess batch_process
+- e2e/generate: the generation engine with gpt, gemini and a dummy imagen_hub model side by side
+- e2e/som: add_som.process_image over every pending model output
+- e2e/score: the async scorer with a Gemini judge
+
+Micro-benchmarks report the best per-call time of parse_json_safely,
+parse_bullet_list, directory scanning (walk / cold and warm manifest refresh)
+and the stats aggregation (human_auto_summary.summarize, telemetry summary).
+
+Results go to one JSON file per run, so runs on two commits can be compared:
+
+    python benchmark.py run                                          # writes benchmark-<commit>.json
+    python benchmark.py run --only e2e/generate micro/ --entries 20 --latency 0.05 --failure-rate 0.05
+    python benchmark.py compare benchmark-abc1234.json benchmark-def5678.json --tolerance 0.1
+    python benchmark.py tree /tmp/fake-tree --entries 10             # tree for running the scripts by hand
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "eval", "scripts"))
+
+from fake_client import FakeGeminiClient, tiny_png
+from rate_control import AdaptiveRateLimiter, RateLimiter
+from telemetry import Telemetry, get_telemetry
+
+logger = logging.getLogger("benchmark")
+
+SCHEMA_VERSION = 1
+TASKS = ["TIG", "TIE", "SRIG", "SRIE", "MRIG", "MRIE"]
+TOPICS = ["A", "I", "S", "CG", "P", "T"]
+# (min, max) cond images per entry
+COND_IMAGES = {"TIG": (0, 0), "TIE": (1, 1), "SRIG": (1, 1), "SRIE": (2, 2), "MRIG": (2, 4), "MRIE": (3, 5)}
+MODEL_NAMES = ["sdxl", "bagel", "uno", "omnigen2", "flux_krea", "step1x"]
+WORDS = ("a red car on a wet street at dusk poster with bold title infographic chart of sales cat sitting "
+         "on a windowsill screenshot of a settings page watercolor mountain lake logo for a coffee shop").split()
+# Requests/min that never throttles the fake clients (the generators' default limiter starts at 10)
+UNLIMITED_RPM = 1e6
+
+REFINED = "A red vintage car parked on a wet city street at dusk, with reflections on the asphalt."
+OBJECTS = ["red vintage car", "wet city street", "dusk sky", "street lamps", "reflections"]
+RESPONDERS = {
+    "preprocess": lambda contents: REFINED,
+    "extract": lambda contents: "\n".join(f"- {o}" for o in OBJECTS),
+    "fused": lambda contents: json.dumps({"prompt_refined": REFINED, "objects": OBJECTS}),
+}
+
+
+# --- Synthetic tree ---
+def make_tree(root: str, entries: int = 5, tasks: Sequence[str] = TASKS, models: int = 3, seed: int = 0,
+              image_size: int = 64) -> int:
+    """Write `entries` condition sets per task under root; returns the number of entries."""
+    rng = random.Random(seed)
+    count = 0
+    for task in tasks:
+        for i in range(entries):
+            topic = TOPICS[i % len(TOPICS)]
+            entry_path = os.path.join(root, task, f"{task}_{topic}_{i + 1:06d}")
+            os.makedirs(os.path.join(entry_path, "model_output"), exist_ok=True)
+            cond_images = [f"cond_{k + 1}.png" for k in range(rng.randint(*COND_IMAGES[task]))]
+            for name in cond_images:
+                color = tuple(rng.randint(0, 255) for _ in range(3))
+                with open(os.path.join(entry_path, name), "wb") as f:
+                    f.write(tiny_png(color, image_size))
+            prompt = " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 16)))
+            with open(os.path.join(entry_path, "metadata.json"), "w") as f:
+                json.dump({"task": task, "topic": topic, "prompt": prompt, "cond_images": cond_images}, f, indent=2)
+            for model in MODEL_NAMES[:models]:
+                color = tuple(rng.randint(0, 255) for _ in range(3))
+                with open(os.path.join(entry_path, "model_output", f"{model}.png"), "wb") as f:
+                    f.write(tiny_png(color, image_size))
+            count += 1
+    return count
+
+
+def fresh_tree(args: argparse.Namespace, name: str) -> str:
+    root = os.path.join(args.workdir, name.replace("/", "_"))
+    make_tree(root, args.entries, args.tasks, args.models, args.seed, args.image_size)
+    return root
+
+
+def iter_metadata(root: str, tasks: Sequence[str]):
+    for task in tasks:
+        task_dir = os.path.join(root, task)
+        for entry in sorted(os.listdir(task_dir)):
+            with open(os.path.join(task_dir, entry, "metadata.json")) as f:
+                yield json.load(f)
+
+
+# --- Result helpers ---
+def limiter(args: argparse.Namespace) -> RateLimiter:
+    return AdaptiveRateLimiter(args.rpm, max_rpm=args.rpm) if args.rpm else RateLimiter()
+
+
+def throughput(items: int, failed: int, elapsed: float, stages: Tuple[str, ...], **extra) -> Dict[str, Any]:
+    """An end-to-end result, with the telemetry rows of the stages it exercised."""
+    rows = [r for r in get_telemetry().summary() if r["stage"].startswith(stages)]
+    return {
+        "value": round(items / elapsed, 3) if elapsed else 0.0,
+        "unit": "items/s",
+        "higher_is_better": True,
+        "items": items,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 3),
+        **extra,
+        "telemetry": rows,
+    }
+
+
+def time_op(fn: Callable[[], Any], number: int, repeat: int, per: int = 1, unit: str = "us") -> Dict[str, Any]:
+    """Best and median time of one call, over `repeat` rounds of `number` calls of fn (each doing `per` ops)."""
+    scale = {"us": 1e6, "ms": 1e3}[unit]
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        times.append((time.perf_counter() - start) / (number * per))
+    times.sort()
+    return {
+        "value": round(times[0] * scale, 3),
+        "unit": unit,
+        "higher_is_better": False,
+        "median": round(times[len(times) // 2] * scale, 3),
+        "number": number,
+        "repeat": repeat,
+        "per": per,
+    }
+
+
+# --- End-to-end benchmarks ---
+def _preprocess(args: argparse.Namespace, name: str, module_name: str, stages: Tuple[str, ...],
+                done: Callable[[Dict[str, Any]], bool]) -> Dict[str, Any]:
+    import extract_objects
+    import fused_preprocess
+    import gemini_preprocess
+    root = fresh_tree(args, name)
+    client = FakeGeminiClient(latency=args.latency, upload_latency=args.upload_latency,
+                              failure_rate=args.failure_rate, responder=RESPONDERS[name.split("/")[1]],
+                              seed=args.seed)
+    pacing = limiter(args)
+    # fused_preprocess falls back to the other two modules, so all three share the fake
+    for module in (gemini_preprocess, extract_objects, fused_preprocess):
+        module.client, module.limiter = client, pacing
+    module = {"gemini_preprocess": gemini_preprocess, "extract_objects": extract_objects,
+              "fused_preprocess": fused_preprocess}[module_name]
+
+    start = time.perf_counter()
+    for task in args.tasks:
+        module.batch_process(os.path.join(root, task))
+    elapsed = time.perf_counter() - start
+    results = [done(data) for data in iter_metadata(root, args.tasks)]
+    return throughput(sum(results), results.count(False), elapsed, stages, requests=client.counts["requests"],
+                      uploads=client.counts["uploads"])
+
+
+def bench_preprocess(args: argparse.Namespace) -> Dict[str, Any]:
+    return _preprocess(args, "e2e/preprocess", "gemini_preprocess", ("clarify_prompt",),
+                       lambda data: bool(data.get("prompt_refined")))
+
+
+def bench_extract(args: argparse.Namespace) -> Dict[str, Any]:
+    return _preprocess(args, "e2e/extract", "extract_objects", ("find_objects",),
+                       lambda data: bool(data.get("objects")))
+
+
+def bench_fused(args: argparse.Namespace) -> Dict[str, Any]:
+    return _preprocess(args, "e2e/fused", "fused_preprocess", ("refine_and_extract",),
+                       lambda data: bool(data.get("prompt_refined") and data.get("objects")))
+
+
+def bench_generate(args: argparse.Namespace) -> Dict[str, Any]:
+    from generation import GenerationEngine, make_generator
+    root = fresh_tree(args, "e2e/generate")
+    generators = [
+        make_generator(spec, args.concurrency, args.rpm or UNLIMITED_RPM, args.batch_size, args.latency,
+                       args.failure_rate)
+        for spec in ("gpt", "gemini", "dummy")
+    ]
+    start = time.perf_counter()
+    reports = asyncio.run(GenerationEngine(generators, root, args.tasks).run())
+    elapsed = time.perf_counter() - start
+    return throughput(sum(r["saved"] for r in reports.values()), sum(r["failed"] for r in reports.values()),
+                      elapsed, ("generate/", "infer_one_image"), generators=reports)
+
+
+def bench_som(args: argparse.Namespace) -> Dict[str, Any]:
+    import add_som
+    from som_pool import DummySoM, list_pending
+    root = fresh_tree(args, "e2e/som")
+    add_som.som = DummySoM(args.latency, args.failure_rate, args.seed)
+    counts: Counter = Counter()
+    start = time.perf_counter()
+    for model_output_dir, filenames in list_pending(root, args.tasks, use_manifest=False):
+        for filename in filenames:
+            counts[add_som.process_image(model_output_dir, filename)] += 1
+    elapsed = time.perf_counter() - start
+    return throughput(counts["done"], counts["failed"], elapsed, ("add_marks",))
+
+
+def bench_score(args: argparse.Namespace) -> Dict[str, Any]:
+    from async_score import AsyncScorer
+    from gemini_score import MODEL_NAME
+    from judges import make_judge
+    root = fresh_tree(args, "e2e/score")
+    client = FakeGeminiClient(latency=args.latency, upload_latency=args.upload_latency,
+                              failure_rate=args.failure_rate, seed=args.seed)
+    scorer = AsyncScorer(make_judge("gemini", MODEL_NAME, client=client), concurrency=args.concurrency,
+                         requests_per_minute=args.rpm)
+    result = asyncio.run(scorer.run([os.path.join(root, task) for task in args.tasks]))
+    return throughput(result["scored"], result["failed"], result["elapsed"], ("evaluate_generated_image",),
+                      judge=result["judge"])
+
+
+# --- Micro-benchmarks ---
+def score_replies(n: int, seed: int) -> List[str]:
+    """Judge replies in the shapes parse_json_safely meets: bare, fenced, wrapped in prose, broken."""
+    rng = random.Random(seed)
+    keys = ["prompt_relevance", "aesthetic_quality", "content_coherence", "artifacts"]
+    replies = []
+    for i in range(n):
+        body = json.dumps({k: rng.randint(1, 5) for k in keys}, indent=rng.choice([None, 2]))
+        shape = i % 5
+        if shape == 0:
+            replies.append(body)
+        elif shape == 1:
+            replies.append(f"```json\n{body}\n```")
+        elif shape == 2:
+            replies.append(f"Here is my evaluation of the image:\n{body}\nThe artifacts are minor.")
+        elif shape == 3:
+            replies.append(body[: rng.randint(1, len(body) - 1)])
+        else:
+            replies.append("I'm unable to evaluate this image because it failed to load.")
+    return replies
+
+
+def bullet_replies(n: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    bullets = ["- ", "* ", "• ", "{}. ", "{}) "]
+    replies = []
+    for _ in range(n):
+        style = rng.choice(bullets)
+        lines = ["Objects in the image:", ""]
+        for k in range(rng.randint(3, 12)):
+            lines.append(style.format(k + 1) + " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))))
+        replies.append("\n".join(lines))
+    return replies
+
+
+def bench_parse_json(args: argparse.Namespace) -> Dict[str, Any]:
+    from gemini_score import parse_json_safely
+    corpus = score_replies(args.corpus, args.seed)
+    return time_op(lambda: [parse_json_safely(t) for t in corpus], 1, args.repeat, per=len(corpus))
+
+
+def bench_parse_bullets(args: argparse.Namespace) -> Dict[str, Any]:
+    from extract_objects import parse_bullet_list
+    corpus = bullet_replies(args.corpus, args.seed)
+    return time_op(lambda: [parse_bullet_list(t) for t in corpus], 1, args.repeat, per=len(corpus))
+
+
+def scan_tree(args: argparse.Namespace) -> str:
+    root = os.path.join(args.workdir, "micro_scan")
+    if not os.path.isdir(root):
+        make_tree(root, args.scan_entries, args.tasks, args.models, args.seed, image_size=8)
+    return root
+
+
+def bench_scan_walk(args: argparse.Namespace) -> Dict[str, Any]:
+    from som_pool import list_pending
+    root = scan_tree(args)
+    result = time_op(lambda: list_pending(root, args.tasks, use_manifest=False), 1, args.repeat, unit="ms")
+    result["entries"] = args.scan_entries * len(args.tasks)
+    return result
+
+
+def bench_manifest_cold(args: argparse.Namespace) -> Dict[str, Any]:
+    from manifest import Manifest
+    root = scan_tree(args)
+    db_path = os.path.join(args.workdir, "cold.sqlite")
+
+    def refresh():
+        if os.path.exists(db_path):
+            os.remove(db_path)
+        manifest = Manifest(root, db_path)
+        manifest.refresh(args.tasks)
+        manifest.close()
+    result = time_op(refresh, 1, args.repeat, unit="ms")
+    result["entries"] = args.scan_entries * len(args.tasks)
+    return result
+
+
+def bench_manifest_warm(args: argparse.Namespace) -> Dict[str, Any]:
+    from manifest import Manifest
+    root = scan_tree(args)
+    manifest = Manifest(root, os.path.join(args.workdir, "warm.sqlite"))
+    manifest.refresh(args.tasks)
+    try:
+        result = time_op(lambda: manifest.refresh(args.tasks), 1, args.repeat, unit="ms")
+    finally:
+        manifest.close()
+    result["entries"] = args.scan_entries * len(args.tasks)
+    return result
+
+
+def bench_summarize(args: argparse.Namespace) -> Dict[str, Any]:
+    import numpy as np
+    from human_auto_summary import CRITERIA, summarize
+    rng = np.random.default_rng(args.seed)
+    n_items, n_coders = args.stats_items, 3
+    item = np.repeat(np.arange(n_items), n_coders)
+    tasks = np.array(TASKS, dtype=object)[item % len(TASKS)]
+    entries = np.array([f"E_{TOPICS[i % len(TOPICS)]}_{i // 6:06d}" for i in range(n_items)], dtype=object)[item]
+    models = np.array(MODEL_NAMES, dtype=object)[(item // len(TASKS)) % len(MODEL_NAMES)]
+    annotations = {"task": tasks, "entry": entries, "model": models,
+                   "annotator": np.tile(np.array([f"a{k}" for k in range(n_coders)], dtype=object), n_items)}
+    for name in CRITERIA:
+        ratings = (rng.integers(1, 6, size=n_items * n_coders) - 1) / 4.0
+        ratings[rng.random(ratings.size) < 0.02] = np.nan
+        annotations[name] = ratings
+    auto = {key: (rng.integers(1, 6, size=len(CRITERIA)) - 1) / 4.0
+            for key in set(zip(tasks, entries, models))}
+    result = time_op(lambda: summarize(annotations, auto), 1, args.repeat, unit="ms")
+    result["items"] = n_items
+    return result
+
+
+def bench_telemetry_summary(args: argparse.Namespace) -> Dict[str, Any]:
+    rng = random.Random(args.seed)
+    tel = Telemetry()
+    for i in range(args.stats_items * 10):
+        name = f"stage_{i % 8}"
+        tel.observe(name, "seconds", rng.expovariate(2.0))
+        tel.observe(name, "api_seconds", rng.expovariate(3.0), model=f"model-{i % 3}")
+        tel.count(name, "calls")
+        tel.count(name, "input_tokens", rng.randint(100, 2000))
+    result = time_op(tel.summary, 1, args.repeat, unit="ms")
+    result["observations"] = args.stats_items * 20
+    return result
+
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], Dict[str, Any]]] = {
+    "e2e/preprocess": bench_preprocess,
+    "e2e/extract": bench_extract,
+    "e2e/fused": bench_fused,
+    "e2e/generate": bench_generate,
+    "e2e/som": bench_som,
+    "e2e/score": bench_score,
+    "micro/parse_json_safely": bench_parse_json,
+    "micro/parse_bullet_list": bench_parse_bullets,
+    "micro/scan_walk": bench_scan_walk,
+    "micro/manifest_refresh_cold": bench_manifest_cold,
+    "micro/manifest_refresh_warm": bench_manifest_warm,
+    "micro/summarize": bench_summarize,
+    "micro/telemetry_summary": bench_telemetry_summary,
+}
+
+
+# --- Results ---
+def git_revision() -> Tuple[Optional[str], bool]:
+    """(short commit, has uncommitted changes), or (None, False) outside a git checkout."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return commit, bool(status.strip())
+
+
+def environment() -> Dict[str, Any]:
+    commit, dirty = git_revision()
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def print_results(results: Dict[str, Dict[str, Any]]):
+    header = f"{'benchmark':<30} {'value':>12} {'unit':<8} {'detail'}"
+    print(header)
+    print("-" * len(header))
+    for name, r in results.items():
+        if "error" in r:
+            print(f"{name:<30} {'-':>12} {'':<8} ❌ failed: {r['error']}")
+        elif r["unit"] == "items/s":
+            print(f"{name:<30} {r['value']:>12.2f} {r['unit']:<8} {r['items']} items, {r['failed']} failed "
+                  f"in {r['elapsed_s']:.2f}s")
+        else:
+            print(f"{name:<30} {r['value']:>12.3f} {r['unit']:<8} median {r['median']:.3f}, {r['repeat']} rounds")
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    selected = [name for name in BENCHMARKS if not args.only or name.startswith(tuple(args.only))]
+    if not selected:
+        raise SystemExit(f"❌ No benchmark matches {args.only}; choose from {list(BENCHMARKS)}")
+    keep = args.keep or args.workdir is not None
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="imagenworld-bench-")
+    os.makedirs(args.workdir, exist_ok=True)
+    # Keep the upload and score caches away from the user's real ones
+    os.environ["IMAGENWORLD_UPLOAD_CACHE"] = os.path.join(args.workdir, "uploads.sqlite")
+    os.environ["IMAGENWORLD_SCORE_CACHE"] = os.path.join(args.workdir, "scores.sqlite")
+    random.seed(args.seed)  # retry backoff jitter
+
+    results = {}
+    try:
+        for name in selected:
+            logger.info(f"⏱️ {name}")
+            try:
+                # Some stages print per item; keep the pipeline's own output for -v
+                with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+                    results[name] = BENCHMARKS[name](args)
+            except ImportError as e:
+                # Every benchmark has a mock backend, so a missing module is a failure, not a skip
+                logger.error(f"❌ {name} failed: {e}")
+                results[name] = {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        if not keep:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("command", "out", "only", "keep", "workdir", "verbose")}
+    return {"schema": SCHEMA_VERSION, "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "environment": environment(), "config": config, "results": results}
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any], tolerance: float = 0.1) -> int:
+    """Print base vs new per benchmark; returns the number of regressions beyond `tolerance`."""
+    changed = {k for k in set(base["config"]) | set(new["config"]) if base["config"].get(k) != new["config"].get(k)}
+    if changed:
+        logger.warning(f"⚠️ Runs used different settings ({', '.join(sorted(changed))}); numbers may not be comparable")
+    header = f"{'benchmark':<30} {'base':>12} {'new':>12} {'unit':<8} {'change':>8}"
+    print(f"{base['environment'].get('commit')} -> {new['environment'].get('commit')}")
+    print(header)
+    print("-" * len(header))
+    regressions = 0
+    for name, r in new["results"].items():
+        b = base["results"].get(name)
+        if b is None or "value" not in b:
+            continue
+        if "value" not in r:
+            print(f"{name:<30} {b['value']:>12.3f} {'-':>12} {b['unit']:<8} {'':>8} 🔻 failed: {r.get('error')}")
+            regressions += 1
+            continue
+        change = (r["value"] - b["value"]) / b["value"] if b["value"] else 0.0
+        worse = -change if r["higher_is_better"] else change
+        flag = ""
+        if worse > tolerance:
+            flag = "🔻 regression"
+            regressions += 1
+        elif worse < -tolerance:
+            flag = "🔺 improvement"
+        print(f"{name:<30} {b['value']:>12.3f} {r['value']:>12.3f} {r['unit']:<8} {change:>+8.1%} {flag}")
+    print(f"{regressions} regression(s) beyond {tolerance:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("run", help="run benchmarks and write a results JSON")
+    p.add_argument("--only", nargs="+", default=None, help="benchmark names or prefixes, e.g. e2e/score micro/")
+    p.add_argument("--out", default=None, help="results file (default: benchmark-<commit>.json)")
+    p.add_argument("--workdir", default=None, help="where to build the trees (kept; default: a temp dir)")
+    p.add_argument("--keep", action="store_true", help="keep the temp dir")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--tasks", nargs="+", default=TASKS)
+    p.add_argument("--entries", type=int, default=8, help="entries per task in the end-to-end trees")
+    p.add_argument("--models", type=int, default=3, help="model outputs per entry")
+    p.add_argument("--image-size", type=int, default=64)
+    p.add_argument("--latency", type=float, default=0.01, help="seconds per mock API / model / SoM call")
+    p.add_argument("--upload-latency", type=float, default=0.0, help="seconds per mock Files API upload")
+    p.add_argument("--failure-rate", type=float, default=0.0, help="fraction of mock calls that fail")
+    p.add_argument("--concurrency", type=int, default=8, help="in-flight requests for the generators / scorer")
+    p.add_argument("--rpm", type=float, default=None, help="requests/min ceiling (default: unlimited)")
+    p.add_argument("--batch-size", type=int, default=1, help="infer_batch size of the dummy hub model")
+    p.add_argument("--repeat", type=int, default=5, help="rounds per micro-benchmark")
+    p.add_argument("--corpus", type=int, default=500, help="replies per parser micro-benchmark")
+    p.add_argument("--scan-entries", type=int, default=200, help="entries per task for the scanning benchmarks")
+    p.add_argument("--stats-items", type=int, default=5000, help="items for the stats aggregation benchmarks")
+    p.add_argument("-v", "--verbose", action="store_true", help="show the pipeline's own logs")
+
+    p = sub.add_parser("compare", help="compare two results files")
+    p.add_argument("base")
+    p.add_argument("new")
+    p.add_argument("--tolerance", type=float, default=0.1, help="relative change that counts as a regression")
+
+    p = sub.add_parser("tree", help="only build a synthetic tree")
+    p.add_argument("root")
+    p.add_argument("--entries", type=int, default=5)
+    p.add_argument("--tasks", nargs="+", default=TASKS)
+    p.add_argument("--models", type=int, default=3)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--image-size", type=int, default=64)
+    args = parser.parse_args()
+
+    # Configured before any pipeline module is imported, so their INFO logs stay quiet unless -v
+    logging.basicConfig(level=logging.INFO if getattr(args, "verbose", False) else logging.WARNING,
+                        format="%(asctime)s [%(levelname)s] %(message)s")
+    logger.setLevel(logging.INFO)
+
+    if args.command == "tree":
+        n = make_tree(args.root, args.entries, args.tasks, args.models, args.seed, args.image_size)
+        logger.info(f"🌳 Wrote {n} entries under {args.root}")
+    elif args.command == "compare":
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        raise SystemExit(1 if compare(base, new, args.tolerance) else 0)
+    else:
+        out = args.out
+        doc = run(args)
+        print_results(doc["results"])
+        if out is None:
+            env = doc["environment"]
+            out = f"benchmark-{env['commit'] or 'local'}{'-dirty' if env['dirty'] else ''}.json"
+        with open(out, "w") as f:
+            json.dump(doc, f, indent=2)
+        logger.info(f"💾 Wrote {len(doc['results'])} results to {out}")
+        failed = [name for name, r in doc["results"].items() if "error" in r]
+        if failed:
+            raise SystemExit(f"❌ {len(failed)} benchmark(s) failed: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
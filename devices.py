@@ -0,0 +1,25 @@
+"""Device discovery and per-process GPU pinning for the multi-process runners.
+
+Shared by inference/open-source/sharded_runner.py, inference/open-source/model_pool.py
+and som_pool.py.
+"""
+import os
+from typing import List
+
+
+def detect_devices() -> List[str]:
+    try:
+        import torch
+        if torch.cuda.is_available():
+            return [f"cuda:{i}" for i in range(torch.cuda.device_count())]
+    except ImportError:
+        pass
+    return ["cpu"]
+
+
+def bind_device(device: str):
+    """Pin this process to one GPU before torch/imagen_hub get imported."""
+    if device.startswith("cuda:"):
+        os.environ["CUDA_VISIBLE_DEVICES"] = device.split(":", 1)[1]
+    elif device == "cpu":
+        os.environ["CUDA_VISIBLE_DEVICES"] = ""
@@ -0,0 +1,269 @@
+"""Concurrent scoring engine for gemini_score.py.
+
+Scores many (entry, model) pairs at once, bounded by a concurrency limit and a
+requests/tokens-per-minute token bucket. Results are written to each entry's
+gemini_result.json as soon as they land, so an interrupted sweep resumes
+exactly like the serial `process_all` does.
+
+Any judge backend from judges.py can be used. With several --judge values
+the same job set is run through each judge in turn, with the same scheduler
+settings, followed by a throughput / cost / latency comparison.
+
+    python eval/scripts/async_score.py --root YOUR-DATA-ROOT --concurrency 32 --rpm 1000 --tpm 1000000
+    python eval/scripts/async_score.py --root /tmp/fake-tree --fake-latency 0.5   # offline
+    python eval/scripts/async_score.py --root YOUR-DATA-ROOT --judge mock gemini openai:gpt-4o --limit 200
+"""
+import argparse
+import asyncio
+import functools
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from google import genai
+
+from gemini_score import (
+    API_KEY,
+    EVALUATION_INSTRUCTION,
+    MODEL_NAME,
+    Sampling,
+    logger,
+    plan_entries,
+    record_scores,
+    request_tag,
+    save_results,
+    score_image,
+    score_images,
+)
+from fake_client import isolate_caches
+from judges import ImageRef, Judge, as_judge, estimate_input_tokens, make_judge
+from manifest import Manifest
+from rate_control import AdaptiveRateLimiter, RateLimiter
+from score_cache import ScoreCache, get_default_cache
+from telemetry import report as report_telemetry
+
+# Expected reply size, added to each request's input estimate for tokens-per-minute pacing
+OUTPUT_TOKENS = 100
+
+
+@dataclass
+class EntryState:
+    entry_path: str
+    result_path: str
+    results_data: Dict[str, Any]
+    prompt: str
+    task: str
+    cond_image_paths: List[str]
+
+
+class AsyncScorer:
+    """Runs judge calls on a thread pool behind a fixed-size worker pool.
+
+    `client` is a `judges.Judge` or a genai client (scored with MODEL_NAME); `limit` caps the
+    number of images scored in one run.
+    """
+
+    def __init__(self, client, concurrency: int = 16, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, manifest: Optional[Manifest] = None,
+                 cache: Optional[ScoreCache] = None, sampling: Optional[Sampling] = None, group_size: int = 1,
+                 limit: Optional[int] = None):
+        self.judge = as_judge(client, MODEL_NAME)
+        self.limit = limit
+        self.sampling = sampling
+        self.group_size = max(1, group_size)
+        self.concurrency = concurrency
+        self.manifest = manifest
+        self.cache = cache
+        # With a requests/min ceiling, AIMD backs off below it whenever the API throttles us.
+        if requests_per_minute:
+            self.limiter = AdaptiveRateLimiter(requests_per_minute, tokens_per_minute, max_rpm=requests_per_minute)
+        else:
+            self.limiter = RateLimiter(None, tokens_per_minute)
+        self.stats = {"scored": 0, "failed": 0}
+
+    def iter_jobs(self, root_dirs: List[str]) -> Iterator[Tuple[EntryState, List[Tuple[str, str, Optional[str]]]]]:
+        """(entry, [(model_key, image_path, cache key), ...]) per request; lists hold one item unless grouping."""
+        for root_dir in root_dirs:
+            if not os.path.isdir(root_dir):
+                logger.warning(f"⚠️ Missing task folder {root_dir}")
+                continue
+            for entry_path, entry_info, results_data, pending in plan_entries(
+                    root_dir, self.manifest, self.cache, self.sampling, self.group_size, self.judge):
+                result_path = os.path.join(entry_path, "gemini_result.json")
+                state = EntryState(entry_path, result_path, results_data, **entry_info)
+                for start in range(0, len(pending), self.group_size):
+                    yield state, pending[start:start + self.group_size]
+
+    def _record(self, state: EntryState, model_key: str, scores: Optional[Dict[str, Any]], key: Optional[str] = None,
+                tag: Optional[Dict[str, Any]] = None):
+        # Runs on the event loop thread only, so writes to one entry never interleave. The planner
+        # thread only reads an entry's results before handing its state over.
+        if scores:
+            record_scores(state.results_data, model_key, scores, key, self.judge.result_field)
+            if self.cache is not None and key:
+                self.cache.put(self.cache.request_key(key, tag), scores)
+            save_results(state.result_path, state.results_data)
+            self.stats["scored"] += 1
+            logger.info(f"✅ Saved scores for {model_key} in {state.entry_path}: {scores}")
+        else:
+            self.stats["failed"] += 1
+            logger.error(f"❌ Failed to obtain scores for {model_key} in {state.entry_path}")
+
+    async def _worker(self, queue: asyncio.Queue, executor: ThreadPoolExecutor):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await queue.get()
+            try:
+                if job is None:
+                    return
+                state, items = job
+                images = [ImageRef(p) for p in state.cond_image_paths] + [ImageRef(path) for _, path, _ in items]
+                tokens = estimate_input_tokens([EVALUATION_INSTRUCTION, state.prompt, *images]) + OUTPUT_TOKENS
+                # Pacing and 429/5xx retries happen inside the call, on the executor thread.
+                if len(items) == 1:
+                    call = functools.partial(
+                        score_image, self.judge, items[0][1], state.prompt, state.cond_image_paths, self.sampling,
+                        limiter=self.limiter, tokens=tokens,
+                    )
+                    all_scores = [(await loop.run_in_executor(executor, call), request_tag(False, self.sampling))]
+                else:
+                    call = functools.partial(
+                        score_images, self.judge, [path for _, path, _ in items], state.prompt,
+                        state.cond_image_paths, len(items), limiter=self.limiter, tokens=tokens,
+                    )
+                    all_scores = await loop.run_in_executor(executor, call)
+                for (model_key, _, key), (scores, tag) in zip(items, all_scores):
+                    self._record(state, model_key, scores, key, tag)
+            except Exception as e:
+                logger.error(f"❌ Scoring job failed: {e}")
+                self.stats["failed"] += 1
+            finally:
+                queue.task_done()
+
+    async def run(self, root_dirs: List[str]) -> Dict[str, Any]:
+        start = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        loop = asyncio.get_running_loop()
+        # The default executor caps at 32 threads; size ours to the concurrency limit instead.
+        # Planning (result/metadata reads, file hashing, manifest queries) runs on its own
+        # thread so it never stalls the workers' event loop.
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor, \
+                ThreadPoolExecutor(max_workers=1, thread_name_prefix="plan") as planner:
+            workers = [asyncio.create_task(self._worker(queue, executor)) for _ in range(self.concurrency)]
+            jobs = self.iter_jobs(root_dirs)
+            queued = 0
+            try:
+                while True:
+                    job = await loop.run_in_executor(planner, next, jobs, None)
+                    if job is None:
+                        break
+                    state, items = job
+                    if self.limit is not None:
+                        if queued >= self.limit:
+                            break
+                        items = items[:self.limit - queued]
+                    queued += len(items)
+                    await queue.put((state, items))
+            finally:
+                await loop.run_in_executor(planner, jobs.close)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        elapsed = time.perf_counter() - start
+        done = self.stats["scored"] + self.stats["failed"]
+        logger.info(f"🏁 Scored {self.stats['scored']} images ({self.stats['failed']} failed) in {elapsed:.1f}s "
+                    f"({done / elapsed if elapsed else 0:.2f} req/s)")
+        report = self.judge.report(elapsed)
+        logger.info(f"📈 {self.judge!r}: {report['requests']} requests ({report['errors']} errors), "
+                    f"{report['input_tokens']}+{report['output_tokens']} tokens, ${report['cost_usd']:.4f}, "
+                    f"latency p50 {report['latency_p50']:.2f}s / p95 {report['latency_p95']:.2f}s")
+        return dict(self.stats, elapsed=elapsed, judge=report)
+
+
+def print_comparison(results: List[Dict[str, Any]]):
+    """Side-by-side table of `AsyncScorer.run` results for several judges."""
+    header = (f"{'judge':<8} {'model':<28} {'scored':>7} {'failed':>7} {'reqs':>6} {'in_tok':>10} {'out_tok':>8} "
+              f"{'cost_usd':>9} {'p50_s':>6} {'p95_s':>6} {'img/s':>7}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        j = r["judge"]
+        rate = r["scored"] / r["elapsed"] if r["elapsed"] else 0.0
+        print(f"{j['judge']:<8} {j['model'][:28]:<28} {r['scored']:>7} {r['failed']:>7} {j['requests']:>6} "
+              f"{j['input_tokens']:>10} {j['output_tokens']:>8} {j['cost_usd']:>9.4f} {j['latency_p50']:>6.2f} "
+              f"{j['latency_p95']:>6.2f} {rate:>7.2f}")
+
+
+def build_judge(spec: str, args: argparse.Namespace) -> Judge:
+    """A judge from a "name" or "name:model" spec."""
+    name, _, model = spec.partition(":")
+    if name == "gemini":
+        if args.fake_latency is not None:
+            from fake_client import FakeGeminiClient
+            client = FakeGeminiClient(latency=args.fake_latency, failure_rate=args.fake_failure_rate)
+        else:
+            client = genai.Client(api_key=API_KEY)
+        return make_judge("gemini", model or MODEL_NAME, client=client)
+    if name == "mock":
+        return make_judge("mock", model or None, latency=args.fake_latency or 0.0)
+    return make_judge(name, model or None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=["TIG", "TIE", "SRIG", "SRIE", "MRIG", "MRIE"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rpm", type=float, default=None, help="requests per minute (default: unlimited)")
+    parser.add_argument("--tpm", type=float, default=None, help="input+output tokens per minute (default: unlimited)")
+    parser.add_argument("--samples", type=int, default=1,
+                        help="judge samples per image (>1 enables self-consistency scoring)")
+    parser.add_argument("--min-samples", type=int, default=2, help="samples drawn before checking agreement")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="stop sampling once every criterion's ratings lie within this range")
+    parser.add_argument("--sample-temperature", type=float, default=1.0)
+    parser.add_argument("--aggregate", choices=["median", "majority"], default="median")
+    parser.add_argument("--group-size", type=int, default=1,
+                        help="score up to this many outputs of an entry in one request (shuffled order)")
+    parser.add_argument("--judge", nargs="+", default=["gemini"], metavar="NAME[:MODEL]",
+                        help="judge backend(s): gemini, openai, local, mock; several run one after another")
+    parser.add_argument("--limit", type=int, default=None, help="score at most this many images per judge")
+    parser.add_argument("--fake-latency", type=float, default=None,
+                        help="score against a local fake client with this per-call latency in seconds "
+                             "(also the mock judge's latency)")
+    parser.add_argument("--no-manifest", action="store_true", help="walk the tree instead of using the job manifest")
+    parser.add_argument("--fake-failure-rate", type=float, default=0.0, help="fraction of fake calls that return 429")
+    parser.add_argument("--no-score-cache", action="store_true",
+                        help="don't reuse cached scores or re-check existing ones for staleness")
+    args = parser.parse_args()
+    if args.group_size > 1 and args.samples > 1:
+        parser.error("--group-size and --samples can't be combined")
+
+    # Fake and mock scores must never reach the shared caches
+    if args.fake_latency is not None or any(spec.partition(":")[0] == "mock" for spec in args.judge):
+        isolate_caches()
+    cache = None if args.no_score_cache else get_default_cache()
+    manifest = None
+    # Skips finished entries (with the cache: unchanged ones); only used for Gemini-field judges
+    if not args.no_manifest:
+        manifest = Manifest(args.root)
+        manifest.refresh(args.tasks)
+    sampling = Sampling(args.samples, args.min_samples, args.tolerance, args.sample_temperature, args.aggregate)
+    results = []
+    for spec in args.judge:
+        judge = build_judge(spec, args)
+        scorer = AsyncScorer(judge, args.concurrency, args.rpm, args.tpm, manifest, cache, sampling,
+                             args.group_size, args.limit)
+        results.append(asyncio.run(scorer.run([os.path.join(args.root, task) for task in args.tasks])))
+    if len(results) > 1:
+        print_comparison(results)
+    report_telemetry()
+
+
+if __name__ == "__main__":
+    main()
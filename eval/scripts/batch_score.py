@@ -0,0 +1,276 @@
+"""Batch-API submission mode for gemini_score.py.
+
+Instead of one synchronous `generate_content` call per image, every pending
+(entry, model) pair is written as a line of a JSONL batch file, submitted to
+the Gemini Batch API, polled until done, and the results are merged back into
+each entry's gemini_result.json.
+
+    python eval/scripts/batch_score.py prepare --root YOUR-DATA-ROOT --work-dir batch_work
+    python eval/scripts/batch_score.py submit  --work-dir batch_work
+    python eval/scripts/batch_score.py wait    --work-dir batch_work      # poll + merge
+    python eval/scripts/batch_score.py run     --root YOUR-DATA-ROOT      # all three
+    python eval/scripts/batch_score.py run     --root /tmp/fake-tree --fake   # offline
+
+State lives in <work-dir>/batch_state.json, so each step can be re-run after an
+interruption. Keys are "<task>/<entry>|<model_key>" relative to --root.
+"""
+import argparse
+import json
+import mimetypes
+import os
+import sys
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from google import genai
+from google.genai import types
+
+from gemini_score import (
+    API_KEY,
+    EVALUATION_INSTRUCTION,
+    MODEL_NAME,
+    check_scores,
+    load_results,
+    logger,
+    parse_json_safely,
+    plan_entries,
+    record_scores,
+    save_results,
+)
+from manifest import Manifest
+from score_cache import ScoreCache, get_default_cache
+from upload_cache import cached_upload
+
+STATE_NAME = "batch_state.json"
+MAX_REQUESTS_PER_BATCH = 10_000
+# Batch jobs may sit in the queue for up to 24h; their file references must outlive that.
+BATCH_MIN_TTL = 26 * 3600
+TERMINAL_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+
+def load_state(work_dir: str) -> Dict[str, Any]:
+    path = os.path.join(work_dir, STATE_NAME)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            return json.load(f)
+    return {"root": None, "batches": []}
+
+
+def save_state(work_dir: str, state: Dict[str, Any]):
+    path = os.path.join(work_dir, STATE_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def _file_part(client, path: str) -> Dict[str, Any]:
+    handle = cached_upload(client, path, min_ttl=BATCH_MIN_TTL)
+    mime_type = getattr(handle, "mime_type", None) or mimetypes.guess_type(path)[0] or "image/png"
+    return {"file_data": {"file_uri": handle.uri, "mime_type": mime_type}}
+
+
+def build_request(client, image_path: str, prompt: str, cond_image_paths: List[str]) -> Dict[str, Any]:
+    """Same contents as `evaluate_generated_image`, in the REST form the batch file expects."""
+    parts = [{"text": EVALUATION_INSTRUCTION}, {"text": f"Prompt: {prompt}"}]
+    cond_parts = [_file_part(client, p) for p in cond_image_paths if os.path.exists(p)]
+    if cond_parts:
+        parts.append({"text": "Reference images:"})
+        parts.extend(cond_parts)
+    parts.append({"text": "Output Image to be Evaluated:"})
+    parts.append(_file_part(client, image_path))
+    return {
+        "contents": [{"role": "user", "parts": parts}],
+        "generation_config": {"response_mime_type": "application/json", "temperature": 0.0},
+    }
+
+
+def _queued_keys(state: Dict[str, Any]) -> Set[str]:
+    """Keys already sitting in a batch that hasn't been merged yet."""
+    keys = set()
+    for batch in state["batches"]:
+        if batch.get("merged"):
+            continue
+        with open(batch["jsonl"], "r") as f:
+            for line in f:
+                keys.add(json.loads(line)["key"])
+    return keys
+
+
+def prepare(client, root: str, tasks: List[str], work_dir: str, max_requests: int = MAX_REQUESTS_PER_BATCH,
+            cache: Optional[ScoreCache] = None) -> int:
+    os.makedirs(work_dir, exist_ok=True)
+    state = load_state(work_dir)
+    if state["root"] and os.path.abspath(state["root"]) != os.path.abspath(root):
+        raise RuntimeError(f"❌ {work_dir} belongs to root {state['root']}; use a separate --work-dir.")
+    state["root"] = root
+    queued = _queued_keys(state)
+    # Score cache keys of queued requests, recorded next to their scores on merge
+    cache_keys = state.setdefault("cache_keys", {})
+    manifest = Manifest(root)
+    manifest.refresh(tasks)
+
+    out, n_in_file, total = None, 0, 0
+    for task in tasks:
+        task_dir = os.path.join(root, task)
+        if not os.path.isdir(task_dir):
+            logger.warning(f"⚠️ Missing task folder {task_dir}")
+            continue
+        for entry_path, info, results_data, pending in plan_entries(task_dir, manifest, cache):
+            entry = os.path.basename(entry_path)
+            for model_key, image_path, cache_key in pending:
+                key = f"{task}/{entry}|{model_key}"
+                if key in queued:
+                    continue
+                try:
+                    request = build_request(client, image_path, info["prompt"], info["cond_image_paths"])
+                except Exception as e:
+                    logger.error(f"⚠️ Failed to upload images for {key}: {e}")
+                    continue
+                if out is None or n_in_file >= max_requests:
+                    if out:
+                        out.close()
+                    jsonl = os.path.join(work_dir, f"batch_{len(state['batches']):04d}.jsonl")
+                    state["batches"].append({"jsonl": jsonl, "n": 0, "name": None, "state": None, "merged": False})
+                    out, n_in_file = open(jsonl, "w"), 0
+                out.write(json.dumps({"key": key, "request": request}) + "\n")
+                if cache_key:
+                    cache_keys[key] = cache_key
+                n_in_file += 1
+                state["batches"][-1]["n"] = n_in_file
+                total += 1
+    if out:
+        out.close()
+    save_state(work_dir, state)
+    logger.info(f"📝 Wrote {total} scoring requests to {work_dir}")
+    return total
+
+
+def submit(client, work_dir: str):
+    state = load_state(work_dir)
+    for batch in state["batches"]:
+        if batch["name"] or not batch["n"]:
+            continue
+        uploaded = client.files.upload(
+            file=batch["jsonl"],
+            config=types.UploadFileConfig(display_name=os.path.basename(batch["jsonl"]), mime_type="jsonl"),
+        )
+        job = client.batches.create(
+            model=MODEL_NAME, src=uploaded.name, config={"display_name": f"imagenworld-{os.path.basename(batch['jsonl'])}"}
+        )
+        batch["name"] = job.name
+        batch["state"] = job.state.name
+        save_state(work_dir, state)
+        logger.info(f"🚀 Submitted {batch['jsonl']} ({batch['n']} requests) as {job.name}")
+
+
+def _response_text(response: Dict[str, Any]) -> str:
+    try:
+        parts = response["candidates"][0]["content"]["parts"]
+    except (KeyError, IndexError, TypeError):
+        return ""
+    return "\n".join(p["text"] for p in parts if p.get("text")).strip()
+
+
+def merge_results(root: str, result_lines: List[str], cache_keys: Optional[Dict[str, str]] = None,
+                  cache: Optional[ScoreCache] = None, field: str = "gemini") -> Dict[str, int]:
+    """Fold batch output lines into gemini_result.json, one write per entry.
+
+    Scores go under `field`, the same one `plan_scores` read when the jobs were prepared.
+    """
+    cache_keys = cache_keys or {}
+    by_entry: Dict[str, Dict[str, Any]] = defaultdict(dict)
+    stats = {"scored": 0, "failed": 0}
+    for line in result_lines:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        entry_rel, model_key = item["key"].rsplit("|", 1)
+        scores = None
+        if "response" in item:
+            data = parse_json_safely(_response_text(item["response"]))
+            scores = check_scores(data) if data is not None else None
+        if scores:
+            cache_key = cache_keys.pop(item["key"], None)
+            by_entry[entry_rel][model_key] = (scores, cache_key)
+            if cache is not None and cache_key:
+                cache.put(cache_key, scores)
+            stats["scored"] += 1
+        else:
+            logger.error(f"❌ No valid scores for {item['key']}: {item.get('error') or 'unparseable response'}")
+            stats["failed"] += 1
+
+    for entry_rel, scores_by_model in by_entry.items():
+        result_path = os.path.join(root, entry_rel, "gemini_result.json")
+        results_data = load_results(result_path)
+        # Don't clobber scores a synchronous run wrote while the batch was queued, unless
+        # this request re-scored a stale one (it then carries a cache key).
+        # The file may hold only another judge's scores, so the field can be missing
+        scored = results_data.get(field, {})
+        for model_key, (scores, cache_key) in scores_by_model.items():
+            if cache_key or model_key not in scored:
+                record_scores(results_data, model_key, scores, cache_key, field)
+        save_results(result_path, results_data)
+    return stats
+
+
+def wait(client, work_dir: str, poll_interval: float = 60.0, cache: Optional[ScoreCache] = None):
+    state = load_state(work_dir)
+    pending = [b for b in state["batches"] if b["name"] and not b["merged"]]
+    while pending:
+        for batch in list(pending):
+            job = client.batches.get(name=batch["name"])
+            batch["state"] = job.state.name
+            if job.state.name not in TERMINAL_STATES:
+                continue
+            pending.remove(batch)
+            if job.state.name != "JOB_STATE_SUCCEEDED":
+                logger.error(f"❌ Batch {batch['name']} ended in {job.state.name}; re-run prepare to requeue its jobs.")
+                batch["merged"] = True
+                continue
+            content = client.files.download(file=job.dest.file_name)
+            stats = merge_results(state["root"], content.decode("utf-8").splitlines(),
+                                  state.get("cache_keys"), cache)
+            batch["merged"] = True
+            logger.info(f"✅ Merged {batch['name']}: {stats['scored']} scored, {stats['failed']} failed")
+        save_state(work_dir, state)
+        if pending:
+            logger.info(f"⏳ {len(pending)} batch(es) still running; polling again in {poll_interval:.0f}s")
+            time.sleep(poll_interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["prepare", "submit", "wait", "run"])
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=["TIG", "TIE", "SRIG", "SRIE", "MRIG", "MRIE"])
+    parser.add_argument("--work-dir", default="batch_work")
+    parser.add_argument("--max-requests", type=int, default=MAX_REQUESTS_PER_BATCH)
+    parser.add_argument("--poll-interval", type=float, default=60.0)
+    parser.add_argument("--no-score-cache", action="store_true",
+                        help="don't reuse cached scores or re-check existing ones for staleness")
+    parser.add_argument("--fake", action="store_true",
+                        help="use the in-process fake batch endpoint (only meaningful with `run`)")
+    args = parser.parse_args()
+
+    if args.fake:
+        from fake_client import FakeGeminiClient, isolate_caches
+        isolate_caches()
+        client = FakeGeminiClient(latency=0.0, batch_latency=2.0)
+        args.poll_interval = min(args.poll_interval, 1.0)
+    else:
+        client = genai.Client(api_key=API_KEY)
+
+    cache = None if args.no_score_cache else get_default_cache()
+    if args.command in ("prepare", "run"):
+        prepare(client, args.root, args.tasks, args.work_dir, args.max_requests, cache)
+    if args.command in ("submit", "run"):
+        submit(client, args.work_dir)
+    if args.command in ("wait", "run"):
+        wait(client, args.work_dir, args.poll_interval, cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""Bootstrap CIs and paired permutation tests for the human/auto summary metrics.
+
+For every (model, task) group this resamples items with replacement and
+reports percentile CIs for each mean in human_auto_summary.json, for
+Krippendorff's alpha and for the human/auto Spearman rho. For every pair of
+models on the same task, a paired sign-flip permutation test over their
+shared entries gives a p-value for the difference in human and auto overall
+scores.
+
+Each resample is a row of item draw counts, so every statistic for a chunk
+of resamples comes from one (B, n) @ (n, k) product; Spearman ranks come from
+weighted histograms over the (few) distinct score values instead of sorts.
+All comparisons of a task share one sign-flip matrix. Each group/task gets its
+own child of one SeedSequence, so results are identical for any --workers value.
+
+    python eval/scripts/bootstrap_stats.py --root YOUR-DATA-ROOT --annotations human_eval.json
+    python eval/scripts/bootstrap_stats.py ... --resamples 10000 --workers 8 --seed 0 --out bootstrap.json
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from human_auto_summary import CRITERIA, TASKS, build_items, group_codes, load_annotations, load_auto_scores
+
+logger = logging.getLogger(__name__)
+
+MEAN_METRICS = [*CRITERIA, "human_overall", "auto_overall"]
+# Resamples per chunk; bounds memory at roughly CHUNK * n_items * 8 bytes per array
+CHUNK = 2000
+
+
+# --- Statistics over (B, n) resample-count matrices ---
+# A bootstrap resample is represented by how often it draws each item, so every
+# sum over a resample becomes a (B, n) @ (n, k) product on BLAS.
+def resample_counts(rng: np.random.Generator, b: int, n: int) -> np.ndarray:
+    idx = rng.integers(0, n, size=(b, n)) + (np.arange(b) * n)[:, None]
+    return np.bincount(idx.ravel(), minlength=b * n).reshape(b, n).astype(float)
+
+
+def dense_codes(values: np.ndarray) -> Tuple[np.ndarray, int]:
+    """Map values to 0..k-1 in sorted order; scores are discrete, so k is small."""
+    uniques, codes = np.unique(values, return_inverse=True)
+    return codes.reshape(values.shape), len(uniques)
+
+
+def weighted_ranks(weights: np.ndarray, codes: np.ndarray, k: int) -> np.ndarray:
+    """(B, n) average rank of each item in each resample, ties sharing their mean rank.
+
+    Counting instead of sorting: the weighted histogram over the k codes gives each
+    code's rank span directly.
+    """
+    hist = weights @ np.eye(k)[codes]
+    avg_rank = np.cumsum(hist, axis=1) - hist + (hist + 1) / 2.0
+    return avg_rank[:, codes]
+
+
+def weighted_pearson(weights: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    total = weights.sum(axis=1, keepdims=True)
+    dx = x - (weights * x).sum(axis=1, keepdims=True) / total
+    dy = y - (weights * y).sum(axis=1, keepdims=True) / total
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (weights * dx * dy).sum(axis=1) / np.sqrt((weights * dx * dx).sum(axis=1) * (weights * dy * dy).sum(axis=1))
+
+
+def alpha_parts(ratings: np.ndarray) -> np.ndarray:
+    """Per-item (m, sum v, sum v^2, within-item disagreement); zero for unpairable items."""
+    ok = ~np.isnan(ratings)
+    m = ok.sum(axis=1).astype(float)
+    v = np.where(ok, ratings, 0.0)
+    s1, s2 = v.sum(axis=1), (v ** 2).sum(axis=1)
+    pairable = m >= 2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        within = np.where(pairable, 2 * (m * s2 - s1 ** 2) / (m - 1), 0.0)
+    return np.stack([m, s1, s2, within], axis=1) * pairable[:, None]
+
+
+def alpha_from_parts(summed: np.ndarray) -> np.ndarray:
+    """Interval alpha from per-resample sums of `alpha_parts` (last axis)."""
+    n, total1, total2, within = np.moveaxis(summed, -1, 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        d_o = within / n
+        d_e = 2 * (n * total2 - total1 ** 2) / (n * (n - 1))
+        return 1.0 - d_o / d_e
+
+
+def group_statistics(data: Dict[str, np.ndarray], weights: np.ndarray, pair_weights: np.ndarray) -> Dict[str, np.ndarray]:
+    """Every metric for each row of `weights` (item draw counts); `pair_weights` covers the
+    items that have both human and auto scores and drives rho."""
+    values = np.stack([data[name] for name in MEAN_METRICS], axis=1)
+    present = ~np.isnan(values)
+    sums = weights @ np.hstack([np.where(present, values, 0.0), present, alpha_parts(data["ratings"])])
+    k = len(MEAN_METRICS)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums[:, :k] / sums[:, k:2 * k]
+    out = {name: means[:, i] for i, name in enumerate(MEAN_METRICS)}
+    out["alpha"] = alpha_from_parts(sums[:, 2 * k:])
+
+    paired = ~(np.isnan(data["human_overall"]) | np.isnan(data["auto_overall"]))
+    if paired.sum() > 2:
+        ranks = [weighted_ranks(pair_weights, *dense_codes(data[name][paired])) for name in ("human_overall", "auto_overall")]
+        out["rho"] = weighted_pearson(pair_weights, *ranks)
+    else:
+        out["rho"] = np.full(len(weights), np.nan)
+    return out
+
+
+# --- Jobs (run in the pool) ---
+def bootstrap_group(data: Dict[str, np.ndarray], n_resamples: int, seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    """Bootstrap distributions of every metric for one group's items."""
+    rng = np.random.default_rng(seed)
+    n = len(data["human_overall"])
+    n_paired = int((~(np.isnan(data["human_overall"]) | np.isnan(data["auto_overall"]))).sum())
+    chunks = []
+    for start in range(0, n_resamples, CHUNK):
+        b = min(CHUNK, n_resamples - start)
+        chunks.append(group_statistics(data, resample_counts(rng, b, n), resample_counts(rng, b, n_paired)))
+    return {name: np.concatenate([c[name] for c in chunks]) for name in chunks[0]}
+
+
+def permutation_tests(diffs: np.ndarray, n_resamples: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Two-sided paired sign-flip p-values for each column of an (entries, comparisons) matrix.
+
+    Entries a comparison doesn't share are 0 in its column and drop out of the sum,
+    so all comparisons of a task reuse one flip matrix in a single matmul.
+    """
+    rng = np.random.default_rng(seed)
+    observed = np.abs(diffs.sum(axis=0))
+    total = diffs.sum(axis=0)
+    weights = diffs.astype(np.float32)
+    extreme = np.zeros(diffs.shape[1], dtype=np.int64)
+    for start in range(0, n_resamples, CHUNK):
+        b = min(CHUNK, n_resamples - start)
+        # sum(sign * d) = total - 2 * sum of the flipped d's; a float32 0/1 matmul keeps this on BLAS
+        flipped = (rng.random((b, len(diffs)), dtype=np.float32) < 0.5).astype(np.float32)
+        stats = np.abs(total - 2 * (flipped @ weights))
+        # Tolerance so float32 noise doesn't turn the observed statistic into a non-match
+        extreme += (stats >= observed - 1e-4).sum(axis=0)
+    return (extreme + 1) / (n_resamples + 1)
+
+
+def run_job(job: Tuple) -> Tuple:
+    kind, key, payload, n_resamples, seed = job
+    if kind == "group":
+        return kind, key, bootstrap_group(payload, n_resamples, seed)
+    return kind, key, permutation_tests(payload, n_resamples, seed)
+
+
+# --- Driver ---
+def build_jobs(table: Dict[str, Any], n_resamples: int, seed: int) -> Tuple[List[Tuple], Dict]:
+    groups, keys = group_codes(table["model"], table["task"])
+    jobs, info = [], {}
+    for g, key in enumerate(keys):
+        rows = groups == g
+        data = {name: table[name][rows] for name in MEAN_METRICS}
+        data["ratings"] = table["ratings"][rows]
+        jobs.append(("group", key, data))
+        n_paired = int((~(np.isnan(data["human_overall"]) | np.isnan(data["auto_overall"]))).sum())
+        estimate = group_statistics(data, np.ones((1, len(data["human_overall"]))), np.ones((1, n_paired)))
+        info[key] = {"n_items": int(rows.sum()), "estimate": {name: float(v[0]) for name, v in estimate.items()}}
+
+    for task in sorted(set(table["task"])):
+        in_task = table["task"] == task
+        entries = sorted(set(table["entry"][in_task]))
+        row_of = {entry: i for i, entry in enumerate(entries)}
+        models = sorted(set(table["model"][in_task]))
+        # (entries, models) score matrices, NaN where a model has no score
+        scores = {metric: np.full((len(entries), len(models)), np.nan) for metric in ("human_overall", "auto_overall")}
+        for i in np.flatnonzero(in_task):
+            r, c = row_of[table["entry"][i]], models.index(table["model"][i])
+            for metric in scores:
+                scores[metric][r, c] = table[metric][i]
+
+        columns, pair_keys = [], []
+        for (a, model_a), (b, model_b) in itertools.combinations(enumerate(models), 2):
+            for metric, matrix in scores.items():
+                diffs = matrix[:, a] - matrix[:, b]
+                shared = ~np.isnan(diffs)
+                if shared.sum() < 2:
+                    continue
+                key = (task, model_a, model_b, metric)
+                columns.append(np.where(shared, diffs, 0.0))
+                pair_keys.append(key)
+                info[key] = {"n_pairs": int(shared.sum()), "diff": float(diffs[shared].mean())}
+        if columns:
+            jobs.append(("pairs", tuple(pair_keys), np.stack(columns, axis=1)))
+
+    children = np.random.SeedSequence(seed).spawn(len(jobs))
+    return [(kind, key, payload, n_resamples, child) for (kind, key, payload), child in zip(jobs, children)], info
+
+
+def run(table: Dict[str, Any], n_resamples: int = 10_000, seed: int = 0, workers: int = 1,
+        confidence: float = 0.95) -> Dict[str, Any]:
+    jobs, info = build_jobs(table, n_resamples, seed)
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(run_job, jobs, chunksize=4))
+    else:
+        results = [run_job(job) for job in jobs]
+
+    lo, hi = (1 - confidence) / 2, 1 - (1 - confidence) / 2
+    groups, comparisons = [], []
+    for kind, key, result in results:
+        if kind == "group":
+            row: Dict[str, Any] = {"model": key[0], "task": key[1], "n_items": info[key]["n_items"]}
+            for name, dist in result.items():
+                finite = dist[np.isfinite(dist)]
+                low, high = np.quantile(finite, [lo, hi]) if len(finite) else (np.nan, np.nan)
+                row[name] = {"estimate": info[key]["estimate"][name], "ci_low": float(low), "ci_high": float(high)}
+            groups.append(row)
+        else:
+            for (task, model_a, model_b, metric), p_value in zip(key, result):
+                comparisons.append({"task": task, "model_a": model_a, "model_b": model_b, "metric": metric,
+                                    **info[(task, model_a, model_b, metric)], "p_value": float(p_value)})
+    return {"seed": seed, "n_resamples": n_resamples, "confidence": confidence,
+            "groups": groups, "comparisons": comparisons}
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=TASKS)
+    parser.add_argument("--annotations", required=True, help="human annotations (JSON list or JSONL)")
+    parser.add_argument("--resamples", type=int, default=10_000)
+    parser.add_argument("--confidence", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="processes for resampling (1 = in-process)")
+    parser.add_argument("--out", default="bootstrap_stats.json")
+    args = parser.parse_args()
+
+    table = build_items(load_annotations(args.annotations), load_auto_scores(args.root, args.tasks))
+    start = time.perf_counter()
+    report = run(table, args.resamples, args.seed, args.workers, args.confidence)
+    logger.info(f"🎲 {len(report['groups'])} groups, {len(report['comparisons'])} comparisons"
+                f" x {args.resamples} resamples in {time.perf_counter() - start:.1f}s")
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"💾 Wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Columnar (Parquet / Arrow IPC) export of all metadata and scores.
+
+Consolidates every <root>/<task>/<entry>/metadata.json and gemini_result.json
+into two hive-partitioned datasets under --out:
+
+    entries/task=TIG/part-*.parquet   one row per entry: topic, prompt, prompt_refined, objects, cond_images
+    scores/task=TIG/part-*.parquet    one row per (entry, judge, model): the four criteria + any extra fields
+
+Exports are incremental: <out>/_export_state.sqlite remembers each file's mtime
+and a digest of each (entry, judge, model) score it wrote, so a re-run only stats the
+tree and appends a new part file with what changed. Updated entries are
+appended again with a newer `exported_at`; `load_table` keeps the latest row per
+key and `compact` rewrites each partition down to those rows.
+
+    python eval/scripts/export_results.py export  --root YOUR-DATA-ROOT --out results_parquet
+    python eval/scripts/export_results.py compact --out results_parquet
+    python eval/scripts/export_results.py query   --out results_parquet   # per model/task means
+
+Requires pyarrow (pip install pyarrow).
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:  # only needed when exporting/reading
+    pa = pc = ds = None
+
+from judges import CRITERIA
+
+TASKS = ["TIG", "TIE", "SRIG", "SRIE", "MRIG", "MRIE"]
+STATE_NAME = "_export_state.sqlite"
+TABLE_KEYS = {"entries": ["entry_id"], "scores": ["entry_id", "judge", "model"]}
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS stamps (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS exported (entry_id TEXT NOT NULL, judge TEXT NOT NULL, model TEXT NOT NULL,
+                                     digest TEXT NOT NULL, PRIMARY KEY (entry_id, judge, model));
+"""
+
+
+def require_pyarrow():
+    if pa is None:
+        raise SystemExit("❌ pyarrow is required for the columnar export: pip install pyarrow")
+
+
+def schemas() -> Dict[str, "pa.Schema"]:
+    return {
+        "entries": pa.schema([
+            ("entry_id", pa.string()), ("task", pa.string()), ("entry", pa.string()), ("topic", pa.string()),
+            ("task_name", pa.string()), ("prompt", pa.string()), ("prompt_refined", pa.string()),
+            ("objects", pa.list_(pa.string())), ("cond_images", pa.list_(pa.string())),
+            ("exported_at", pa.timestamp("ms")),
+        ]),
+        "scores": pa.schema([
+            ("entry_id", pa.string()), ("task", pa.string()), ("entry", pa.string()), ("topic", pa.string()),
+            ("judge", pa.string()), ("model", pa.string()),
+            *[(name, pa.float64()) for name in CRITERIA],
+            ("extra", pa.string()), ("exported_at", pa.timestamp("ms")),
+        ]),
+    }
+
+
+# --- Reading the tree ---
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def entry_row(task: str, entry: str, data: Dict[str, Any], now) -> Dict[str, Any]:
+    return {
+        "entry_id": f"{task}/{entry}", "task": task, "entry": entry, "topic": data.get("topic"),
+        "task_name": data.get("task"), "prompt": data.get("prompt"), "prompt_refined": data.get("prompt_refined"),
+        "objects": [str(o) for o in data.get("objects") or []],
+        "cond_images": [str(c) for c in data.get("cond_images") or []],
+        "exported_at": now,
+    }
+
+
+def _digest(scores: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(scores, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def score_rows(task: str, entry: str, topic: Optional[str], results: Dict[str, Any],
+               exported: Dict[Tuple[str, str], str], now) -> List[Dict[str, Any]]:
+    """Rows for (judge, model) scores that are new or differ from what was last exported."""
+    rows = []
+    for judge, by_model in results.items():
+        if not isinstance(by_model, dict):
+            continue
+        for model, scores in by_model.items():
+            if not isinstance(scores, dict):
+                continue
+            digest = _digest(scores)
+            if exported.get((judge, model)) == digest:
+                continue
+            extra = {k: v for k, v in scores.items() if k not in CRITERIA}
+            rows.append({
+                "entry_id": f"{task}/{entry}", "task": task, "entry": entry, "topic": topic,
+                "judge": judge, "model": model, **{name: _number(scores.get(name)) for name in CRITERIA},
+                "extra": json.dumps(extra) if extra else None, "exported_at": now, "_digest": digest,
+            })
+    return rows
+
+
+def write_part(out: str, table_name: str, task: str, rows: List[Dict[str, Any]], file_format: str = "parquet") -> Optional[str]:
+    """Write rows as a new part file of <out>/<table_name>/task=<task>/."""
+    if not rows:
+        return None
+    table = pa.Table.from_pylist(rows, schema=schemas()[table_name])
+    part_dir = os.path.join(out, table_name, f"task={task}")
+    os.makedirs(part_dir, exist_ok=True)
+    path = os.path.join(part_dir, f"part-{time.time_ns()}.{file_format}")
+    tmp = path + ".tmp"
+    if file_format == "parquet":
+        import pyarrow.parquet as pq
+        pq.write_table(table, tmp)
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+class Exporter:
+    def __init__(self, root: str, out: str, file_format: str = "parquet"):
+        require_pyarrow()
+        self.root = root
+        self.out = out
+        self.file_format = file_format
+        os.makedirs(out, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(out, STATE_NAME))
+        self._db.executescript(STATE_SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def _changed(self, rel: str) -> Tuple[bool, Optional[int]]:
+        mtime = _mtime(os.path.join(self.root, rel))
+        row = self._db.execute("SELECT mtime_ns FROM stamps WHERE path=?", (rel,)).fetchone()
+        return mtime is not None and (row is None or row[0] != mtime), mtime
+
+    def _exported(self, entry_id: str) -> Dict[Tuple[str, str], str]:
+        rows = self._db.execute("SELECT judge, model, digest FROM exported WHERE entry_id=?", (entry_id,))
+        return {(judge, model): digest for judge, model, digest in rows}
+
+    def collect(self, task: str) -> Tuple[List[Dict], List[Dict], List[Tuple[str, int]]]:
+        """New/changed entry rows, new score rows and the stamps to record once they're written."""
+        task_dir = os.path.join(self.root, task)
+        entries, scores, stamps = [], [], []
+        if not os.path.isdir(task_dir):
+            return entries, scores, stamps
+        now = int(time.time() * 1000)
+        for entry in sorted(os.listdir(task_dir)):
+            entry_id = f"{task}/{entry}"
+            meta_rel = os.path.join(task, entry, "metadata.json")
+            result_rel = os.path.join(task, entry, "gemini_result.json")
+            meta_changed, meta_mtime = self._changed(meta_rel)
+            result_changed, result_mtime = self._changed(result_rel)
+            if not (meta_changed or result_changed):
+                continue
+
+            data = {}
+            if meta_mtime is not None:
+                try:
+                    with open(os.path.join(self.root, meta_rel), "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except Exception as e:
+                    logger.warning(f"⚠️ Unreadable {meta_rel}: {e}")
+                    continue
+            if meta_changed:
+                entries.append(entry_row(task, entry, data, now))
+                stamps.append((meta_rel, meta_mtime))
+            if result_changed:
+                try:
+                    with open(os.path.join(self.root, result_rel), "r") as f:
+                        results = json.load(f)
+                except Exception as e:
+                    logger.warning(f"⚠️ Unreadable {result_rel}: {e}")
+                    continue
+                scores.extend(score_rows(task, entry, data.get("topic"), results, self._exported(entry_id), now))
+                stamps.append((result_rel, result_mtime))
+        return entries, scores, stamps
+
+    def export(self, tasks: Sequence[str]) -> Dict[str, int]:
+        stats = {"entries": 0, "scores": 0}
+        for task in tasks:
+            entries, scores, stamps = self.collect(task)
+            write_part(self.out, "entries", task, entries, self.file_format)
+            write_part(self.out, "scores", task, scores, self.file_format)
+            # State is only advanced once the part files are on disk
+            self._db.executemany("INSERT OR REPLACE INTO stamps VALUES (?, ?)", stamps)
+            self._db.executemany("INSERT OR REPLACE INTO exported VALUES (?, ?, ?, ?)",
+                                 [(r["entry_id"], r["judge"], r["model"], r["_digest"]) for r in scores])
+            self._db.commit()
+            stats["entries"] += len(entries)
+            stats["scores"] += len(scores)
+            if entries or scores:
+                logger.info(f"📦 {task}: appended {len(entries)} entries, {len(scores)} scores")
+        return stats
+
+
+# --- Reading the dataset ---
+def dataset(out: str, table_name: str) -> "ds.Dataset":
+    require_pyarrow()
+    path = os.path.join(out, table_name)
+    files = [os.path.join(d, f) for d, _, fs in os.walk(path) for f in fs if f.endswith((".parquet", ".arrow"))]
+    fmt = "parquet" if not files or files[0].endswith(".parquet") else "ipc"
+    return ds.dataset(path, format=fmt, partitioning="hive", schema=schemas()[table_name])
+
+
+def latest(table: "pa.Table", keys: Sequence[str]) -> "pa.Table":
+    """Keep the newest row (by exported_at) for every key."""
+    if table.num_rows == 0:
+        return table
+    table = table.append_column("_row", pa.array(range(table.num_rows), pa.int64()))
+    table = table.sort_by([*[(k, "ascending") for k in keys], ("exported_at", "descending")])
+    first = table.group_by(list(keys), use_threads=False).aggregate([("_row", "first")])
+    rows = pc.is_in(table["_row"], value_set=first["_row_first"])
+    return table.filter(rows).drop_columns(["_row"])
+
+
+def load_table(out: str, table_name: str, filter=None, columns: Optional[List[str]] = None) -> "pa.Table":
+    table = dataset(out, table_name).to_table(filter=filter)
+    table = latest(table, TABLE_KEYS[table_name])
+    return table.select(columns) if columns else table
+
+
+def compact(out: str, file_format: str = "parquet"):
+    """Rewrite each partition as one file of latest rows."""
+    require_pyarrow()
+    for table_name in TABLE_KEYS:
+        base = os.path.join(out, table_name)
+        if not os.path.isdir(base):
+            continue
+        for part in sorted(os.listdir(base)):
+            part_dir = os.path.join(base, part)
+            old = sorted(os.path.join(part_dir, f) for f in os.listdir(part_dir) if f.endswith((".parquet", ".arrow")))
+            if len(old) < 2:
+                continue
+            task = part.split("=", 1)[1]
+            table = latest(dataset(out, table_name).to_table(filter=ds.field("task") == task), TABLE_KEYS[table_name])
+            write_part(out, table_name, task, table.to_pylist(), file_format)
+            for path in old:
+                os.remove(path)
+            logger.info(f"🧹 {table_name}/{part}: {len(old)} files -> 1 ({table.num_rows} rows)")
+
+
+def summary(out: str) -> "pa.Table":
+    """Mean of each criterion per (model, task), straight from the dataset."""
+    scores = load_table(out, "scores")
+    return scores.group_by(["model", "task"]).aggregate(
+        [("entry_id", "count"), *[(name, "mean") for name in CRITERIA]]
+    ).sort_by([("model", "ascending"), ("task", "ascending")])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["export", "compact", "query"])
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=TASKS)
+    parser.add_argument("--out", default="results_parquet")
+    parser.add_argument("--format", choices=["parquet", "arrow"], default="parquet")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        exporter = Exporter(args.root, args.out, args.format)
+        start = time.perf_counter()
+        stats = exporter.export(args.tasks)
+        exporter.close()
+        logger.info(f"✅ Appended {stats['entries']} entries and {stats['scores']} scores"
+                    f" in {time.perf_counter() - start:.1f}s")
+    elif args.command == "compact":
+        compact(args.out, args.format)
+    else:
+        start = time.perf_counter()
+        table = summary(args.out)
+        for row in table.to_pylist():
+            print(row)
+        logger.info(f"⏱️ {table.num_rows} groups in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,25 @@
 import json
 import os
 import re
+import sys
 import logging
+import random
+import statistics
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from google import genai
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from rate_control import AdaptiveRateLimiter, RateLimiter, call_with_retry
+from manifest import Manifest
+from telemetry import report as report_telemetry, stage
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from judges import CRITERIA, ImageRef, Judge, JudgeReply, as_judge, make_judge
+from score_cache import ScoreCache, get_default_cache, text_sha256
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 logger = logging.getLogger(__name__)
 
@@ -16,6 +30,15 @@ if not API_KEY:
 # You can keep the preview model; if it misbehaves, try the stable alias "gemini-2.5-flash"
 MODEL_NAME = "gemini-2.5-flash-preview-05-20"
 
+# Judge backend for the serial sweep: "gemini", "openai", "local" or "mock" (see judges.py)
+JUDGE = "gemini"
+
+# Reuse scores of identical requests and re-score ones whose inputs changed (see score_cache.py)
+USE_SCORE_CACHE = True
+
+# Used by the serial sweep; paces requests and backs off on 429/5xx
+limiter = AdaptiveRateLimiter(requests_per_minute=60)
+
 EVALUATION_INSTRUCTION = """
 You are an expert AI image evaluator. Your task is to rate a generated image based on a provided text prompt and any reference images.
 
@@ -84,145 +107,451 @@ def parse_json_safely(text: str) -> Optional[Dict[str, Any]]:
     except json.JSONDecodeError:
         return None
 
-def extract_text_from_response(resp) -> str:
-    """Be resilient: prefer resp.text; fall back to concatenating parts."""
-    # Fast path
-    try:
-        if getattr(resp, "text", None):
-            return resp.text
-    except Exception:
-        pass
-    # Fallback: join all text parts from first candidate
-    try:
-        if resp and resp.candidates:
-            parts = resp.candidates[0].content.parts or []
-            collected = []
-            for p in parts:
-                # p may have 'text' or 'inline_data' etc.; we only want text here
-                t = getattr(p, "text", None)
-                if t:
-                    collected.append(t)
-            return "\n".join(collected).strip()
-    except Exception:
-        return ""
-    return ""
-
-def upload_file(client,path: str):
-    try:
-        return client.files.upload(file=path)
-    except Exception as e:
-        logger.error(f"⚠️ Failed to upload file {path}: {e}")
+# Top-level field of gemini_result.json: model_key -> score cache key its scores were produced under
+SCORE_KEYS = "gemini_keys"
+
+EXPECTED_KEYS = set(CRITERIA)
+
+def check_scores(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Basic schema check on a parsed score object."""
+    if not isinstance(data, dict) or not EXPECTED_KEYS.issubset(set(data.keys())):
+        logger.error(f"JSON missing expected keys: got {list(data.keys()) if isinstance(data, dict) else data}")
         return None
+    return data
 
-def evaluate_generated_image(client, generated_image_path: str, prompt: str, cond_image_paths: List[str]) -> Optional[Dict[str, Any]]:
-    """Call Gemini, force JSON output, and robustly parse the response."""
-    gen_file = upload_file(client,generated_image_path)
+def log_unparseable(reply: JudgeReply, expected: str = "JSON"):
+    logger.error(f"Model did not return valid {expected}. {reply.detail + ', ' if reply.detail else ''}raw='{reply.text[:300]}'")
+
+def evaluate_generated_image(client, generated_image_path: str, prompt: str, cond_image_paths: List[str],
+                             limiter: Optional[RateLimiter] = None, tokens: int = 0,
+                             temperature: float = 0.0) -> Optional[Dict[str, Any]]:
+    """Ask the judge (a `judges.Judge`, or a genai client for MODEL_NAME) and robustly parse the response.
+
+    `limiter` paces the call (`tokens` is its estimated cost) and learns from 429/5xx retries.
+    """
+    judge = as_judge(client, MODEL_NAME)
     print(prompt)
-    if not gen_file:
-        return None
 
-    cond_files = []
-    for p in cond_image_paths:
-        if os.path.exists(p):
-            f = upload_file(client,p)
-            if f:
-                cond_files.append(f)
-
-    # Build multimodal contents: files + text together
-    contents = []
-    contents.append(EVALUATION_INSTRUCTION)
-    contents.append(f"Prompt: {prompt}")
-    if cond_files:
-        contents.append(f"Reference images:")
-        contents.extend(cond_files)
-    
-    contents.append("Output Image to be Evaluated:")
-    contents.append(gen_file)
-    
+    # Build multimodal contents: images + text together
+    parts = [EVALUATION_INSTRUCTION, f"Prompt: {prompt}"]
+    cond_refs = [ImageRef(p) for p in cond_image_paths if os.path.exists(p)]
+    if cond_refs:
+        parts.append("Reference images:")
+        parts.extend(cond_refs)
+    parts.append("Output Image to be Evaluated:")
+    parts.append(ImageRef(generated_image_path))
+
     try:
-        resp = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=contents,
-            config={
-                # Force strict JSON so json.loads won’t fail.
-                "response_mime_type": "application/json",
-                "temperature": 0.0,
-            },
-        )
-
-        raw = extract_text_from_response(resp)
-        data = parse_json_safely(raw)
-
-        # If still None, log diagnostics for finish/blocked reasons
-        if data is None:
-            try:
-                fr = getattr(resp.candidates[0], "finish_reason", None)
-                bs = getattr(resp, "usage_metadata", None)
-                logger.error(f"Model did not return valid JSON. finish_reason={fr}, usage={bs}, raw='{raw[:300]}'")
-            except Exception:
-                logger.error(f"Model did not return valid JSON. raw='{raw[:300]}'")
-            return None
+        with stage("evaluate_generated_image", judge=judge.name):
+            reply = call_with_retry(judge.generate, parts, temperature, limiter=limiter, tokens=tokens)
+    except Exception as e:
+        logger.error(f"❌ {judge.name} judge error during evaluation of {generated_image_path}: {e}")
+        return None
 
-        # Basic schema check
-        expected_keys = {"prompt_relevance", "aesthetic_quality", "content_coherence", "artifacts"}
-        if not expected_keys.issubset(set(data.keys())):
-            logger.error(f"JSON missing expected keys: got {list(data.keys())}")
+    data = parse_json_safely(reply.text)
+    if data is None:
+        log_unparseable(reply)
+        return None
+    return check_scores(data)
+
+# --- Self-consistency sampling ---
+
+def sample_ratings(samples: List[Dict[str, Any]]) -> Dict[str, List[float]]:
+    return {c: [float(s[c]) for s in samples] for c in CRITERIA}
+
+def samples_agree(samples: List[Dict[str, Any]], tolerance: float = 0.0) -> bool:
+    """True when, for every criterion, all ratings lie within `tolerance` of each other."""
+    return all(max(r) - min(r) <= tolerance for r in sample_ratings(samples).values())
+
+def majority(ratings: List[float]) -> float:
+    """Most frequent rating; ties go to the one closest to the median, then the lower one."""
+    counts = Counter(ratings)
+    top = max(counts.values())
+    median = statistics.median(ratings)
+    return min((r for r, n in counts.items() if n == top), key=lambda r: (abs(r - median), r))
+
+def aggregate_samples(samples: List[Dict[str, Any]], method: str = "median") -> Dict[str, Any]:
+    """Per-criterion median (or majority) of the samples, plus their variance and the raw ratings."""
+    ratings = sample_ratings(samples)
+    pick = statistics.median if method == "median" else majority
+    result: Dict[str, Any] = {c: pick(r) for c, r in ratings.items()}
+    result["samples"] = len(samples)
+    result["variance"] = {c: statistics.pvariance(r) for c, r in ratings.items()}
+    result["ratings"] = ratings
+    return result
+
+@dataclass
+class Sampling:
+    """How many judge samples to draw per image; k=1 is the plain temperature-0 call."""
+    k: int = 1
+    min_samples: int = 2
+    tolerance: float = 0.0
+    temperature: float = 1.0
+    method: str = "median"
+
+    def cache_tag(self) -> Optional[Dict[str, Any]]:
+        """Part of the score cache key, so sampled and single-call scores don't mix."""
+        return asdict(self) if self.k > 1 else None
+
+# Used by the serial sweep; e.g. Sampling(k=5, min_samples=2) for self-consistency runs
+SAMPLING = Sampling()
+
+def evaluate_self_consistent(client, generated_image_path: str, prompt: str, cond_image_paths: List[str],
+                             k: int = 5, min_samples: int = 2, tolerance: float = 0.0, temperature: float = 1.0,
+                             method: str = "median", limiter: Optional[RateLimiter] = None,
+                             tokens: int = 0) -> Optional[Dict[str, Any]]:
+    """Up to `k` sampled evaluations, aggregated with `aggregate_samples`.
+
+    Samples are drawn concurrently in rounds of `min_samples`; sampling stops early once every
+    criterion agrees within `tolerance`, so images the judge is sure about cost `min_samples` calls.
+    Failed calls count towards `k` but not towards agreement.
+    """
+    def one(_):
+        scores = evaluate_generated_image(client, generated_image_path, prompt, cond_image_paths,
+                                          limiter=limiter, tokens=tokens, temperature=temperature)
+        try:
+            return scores if scores and sample_ratings([scores]) else None
+        except (TypeError, ValueError):
+            logger.error(f"Non-numeric ratings from sample of {generated_image_path}: {scores}")
             return None
 
-        return data
+    samples: List[Dict[str, Any]] = []
+    drawn = 0
+    step = max(1, min(min_samples, k))
+    with ThreadPoolExecutor(max_workers=step) as pool:
+        while drawn < k:
+            n = min(step, k - drawn)
+            samples.extend(s for s in pool.map(one, range(n)) if s)
+            drawn += n
+            if len(samples) >= min_samples and samples_agree(samples, tolerance):
+                break
+    if not samples:
+        return None
+    logger.info(f"🎲 {len(samples)}/{drawn} samples for {os.path.basename(generated_image_path)}"
+                f"{' (agreed early)' if drawn < k else ''}")
+    return aggregate_samples(samples, method)
+
+def score_image(client, generated_image_path: str, prompt: str, cond_image_paths: List[str],
+                sampling: Optional[Sampling] = None, limiter: Optional[RateLimiter] = None,
+                tokens: int = 0) -> Optional[Dict[str, Any]]:
+    if sampling is None or sampling.k <= 1:
+        return evaluate_generated_image(client, generated_image_path, prompt, cond_image_paths,
+                                        limiter=limiter, tokens=tokens)
+    return evaluate_self_consistent(client, generated_image_path, prompt, cond_image_paths,
+                                    k=sampling.k, min_samples=sampling.min_samples, tolerance=sampling.tolerance,
+                                    temperature=sampling.temperature, method=sampling.method,
+                                    limiter=limiter, tokens=tokens)
+
+# --- Multi-image requests ---
+# Appended to EVALUATION_INSTRUCTION when several outputs of one entry share a request
+MULTI_IMAGE_INSTRUCTION = """
+# Multiple Output Images
+This request contains {n} output images, labelled "Image 1" to "Image {n}", generated for the same prompt.
+Rate EACH image independently against the guidelines above; do not compare the images with each other.
+Instead of a single object, output ONLY a JSON array with one object per image, in label order:
+[
+  {{"image": 1, "prompt_relevance": <rating>, "aesthetic_quality": <rating>, "content_coherence": <rating>, "artifacts": <rating>}},
+  ...
+]
+"""
 
-    except Exception as e:
-        logger.error(f"❌ Gemini API error during evaluation of {generated_image_path}: {e}")
+# Model outputs per multi-image request in the serial sweep; 1 keeps one request per image.
+# Multi-image requests are always single-sample (SAMPLING is ignored for them).
+GROUP_SIZE = 1
+
+def parse_json_array(text: str) -> Optional[List[Any]]:
+    """Extract the first JSON array from text, also accepting an object that wraps one."""
+    if not text:
         return None
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.IGNORECASE)
+    m = re.search(r"\[[\s\S]*\]", text)
+    if m:
+        try:
+            return json.loads(m.group(0))
+        except json.JSONDecodeError:
+            pass
+    data = parse_json_safely(text)
+    if isinstance(data, dict):
+        return next((v for v in data.values() if isinstance(v, list)), None)
+    return None
+
+def evaluate_images_together(client, image_paths: List[str], prompt: str, cond_image_paths: List[str],
+                             limiter: Optional[RateLimiter] = None, tokens: int = 0,
+                             rng: Optional[random.Random] = None) -> List[Optional[Dict[str, Any]]]:
+    """Score several outputs for one prompt in a single request; returns scores in `image_paths` order.
+
+    The images are shown in a random order (controls position bias); each score records the
+    `position` it was shown at and the `group_size`. Images without a valid score come back as None.
+    """
+    judge = as_judge(client, MODEL_NAME)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(image_paths)
+    order = list(range(len(image_paths)))
+    (rng or random).shuffle(order)
+
+    parts = [EVALUATION_INSTRUCTION + MULTI_IMAGE_INSTRUCTION.format(n=len(order)), f"Prompt: {prompt}"]
+    cond_refs = [ImageRef(p) for p in cond_image_paths if os.path.exists(p)]
+    if cond_refs:
+        parts.append("Reference images:")
+        parts.extend(cond_refs)
+    for label, i in enumerate(order, 1):
+        parts.append(f"Image {label}:")
+        parts.append(ImageRef(image_paths[i]))
 
-def process_single_example(entry_path: str):
+    try:
+        with stage("evaluate_images_together", judge=judge.name):
+            reply = call_with_retry(judge.generate, parts, 0.0, limiter=limiter, tokens=tokens)
+    except Exception as e:
+        logger.error(f"❌ {judge.name} judge error during multi-image evaluation of {image_paths[0]} and others: {e}")
+        return results
+
+    items = parse_json_array(reply.text)
+    if not isinstance(items, list):
+        log_unparseable(reply, "JSON array")
+        return results
+    for pos, item in enumerate(items):
+        if not isinstance(item, dict):
+            continue
+        label = item.pop("image", pos + 1)
+        try:
+            label = int(label)
+        except (TypeError, ValueError):
+            label = pos + 1
+        if not 1 <= label <= len(order):
+            continue
+        scores = check_scores(item)
+        if scores:
+            results[order[label - 1]] = dict(scores, position=label, group_size=len(order))
+    return results
+
+def request_tag(together: bool, sampling: Optional[Sampling] = None) -> Optional[Dict[str, Any]]:
+    """How a score was requested, for `ScoreCache.request_key`: grouped, sampled, or neither (None)."""
+    if together:
+        return {"multi_image": text_sha256(MULTI_IMAGE_INSTRUCTION)}
+    return sampling.cache_tag() if sampling else None
+
+def score_images(client, image_paths: List[str], prompt: str, cond_image_paths: List[str],
+                 group_size: int = GROUP_SIZE, limiter: Optional[RateLimiter] = None, tokens: int = 0,
+                 rng: Optional[random.Random] = None) -> List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+    """(scores, request_tag) for all `image_paths`, in requests of up to `group_size` images.
+
+    Images a multi-image response left out are re-scored on their own, so their tag is None.
+    """
+    results: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]] = []
+    for start in range(0, len(image_paths), max(1, group_size)):
+        chunk = image_paths[start:start + max(1, group_size)]
+        if len(chunk) == 1:
+            results.append((evaluate_generated_image(client, chunk[0], prompt, cond_image_paths,
+                                                     limiter=limiter, tokens=tokens), None))
+            continue
+        scores = evaluate_images_together(client, chunk, prompt, cond_image_paths,
+                                          limiter=limiter, tokens=tokens, rng=rng)
+        for path, s in zip(chunk, scores):
+            if s is None:
+                logger.warning(f"⚠️ No score for {path} in the multi-image response; scoring it alone")
+                s = evaluate_generated_image(client, path, prompt, cond_image_paths, limiter=limiter, tokens=tokens)
+                results.append((s, None))
+            else:
+                results.append((s, request_tag(True)))
+    return results
+
+def load_results(result_path: str) -> Dict[str, Any]:
+    """Load an existing gemini_result.json, or an empty one if missing/unreadable."""
     results_data = {"gemini": {}}
-    result_path = os.path.join(entry_path, "gemini_result.json")
     if os.path.exists(result_path):
         try:
             with open(result_path, "r") as f:
                 results_data = json.load(f)
         except Exception:
             logger.warning("gemini_result.json exists but is unreadable; starting fresh.")
+    return results_data
+
+def save_results(result_path: str, results_data: Dict[str, Any]):
+    with open(result_path, "w") as f:
+        json.dump(results_data, f, indent=2)
 
+def load_entry(entry_path: str) -> Dict[str, Any]:
+    """Read metadata.json and return what the scorer needs for one condition set."""
     json_path = os.path.join(entry_path, "metadata.json")
     with open(json_path, "r") as f:
         data = json.load(f)
 
-    prompt_to_evaluate = data.get("prompt_refined") or data.get("prompt", "")
-    task = data.get("task", "")
     cond_images = data.get("cond_images", [])
-    cond_image_paths = [os.path.join(entry_path, img) for img in cond_images]
-
+    return {
+        "prompt": data.get("prompt_refined") or data.get("prompt", ""),
+        "task": data.get("task", ""),
+        "cond_image_paths": [os.path.join(entry_path, img) for img in cond_images],
+    }
+
+def model_outputs(entry_path: str, task: str) -> List[Tuple[str, str]]:
+    """(model_key, image_path) pairs in model_output/ that should be scored."""
     model_output_dir = os.path.join(entry_path, "model_output")
     if not os.path.isdir(model_output_dir):
         logger.info(f"No model_output folder in {entry_path}")
-        return
+        return []
 
+    outputs = []
     for model_file in sorted(os.listdir(model_output_dir)):
         if not model_file.lower().endswith((".png", ".jpg", ".jpeg")):
             continue
         model_key = os.path.splitext(model_file)[0]
-        if model_key in results_data["gemini"] or ((model_key=='uno') and ("IE" in task)):
+        if (model_key=='uno') and ("IE" in task):
+            continue
+        outputs.append((model_key, os.path.join(model_output_dir, model_file)))
+    return outputs
+
+def keys_field(field: str) -> str:
+    return SCORE_KEYS if field == "gemini" else f"{field}_keys"
+
+def pending_model_outputs(entry_path: str, task: str, results_data: Dict[str, Any],
+                          field: str = "gemini") -> List[Tuple[str, str]]:
+    """(model_key, image_path) pairs in model_output/ that have no score under `field` yet."""
+    pending = []
+    scored = results_data.get(field, {})
+    for model_key, image_path in model_outputs(entry_path, task):
+        if model_key in scored:
             logger.info(f"✨ already calculated scores for {model_key} in '{entry_path}'")
             continue
+        pending.append((model_key, image_path))
+    return pending
+
+def record_scores(results_data: Dict[str, Any], model_key: str, scores: Dict[str, Any], key: Optional[str] = None,
+                  field: str = "gemini"):
+    results_data.setdefault(field, {})[model_key] = scores
+    if key:
+        results_data.setdefault(keys_field(field), {})[model_key] = key
+
+def plan_scores(entry_path: str, entry: Dict[str, Any], results_data: Dict[str, Any],
+                cache: Optional[ScoreCache] = None, sampling: Optional[Sampling] = None,
+                group_size: int = 1, judge: Optional[Judge] = None) -> List[Tuple[str, str, Optional[str]]]:
+    """(model_key, image_path, cache key) triples that still need a judge call.
+
+    Scores are read from and written to `judge.result_field` (default: "gemini" / MODEL_NAME).
+
+    Without a cache this is `pending_model_outputs`. With one, a stored score only counts if it was
+    recorded under the current key (scores from before the cache existed are kept as they are);
+    missing or stale scores are taken from the cache when the same inputs were scored before in
+    the mode this run would use, and written to gemini_result.json right away. The returned key
+    covers the inputs only; callers store scores with `request_key(key, request_tag(...))`.
+    """
+    field = judge.result_field if judge else "gemini"
+    judge_model = judge.model if judge else MODEL_NAME
+    if cache is None:
+        return [(m, p, None) for m, p in pending_model_outputs(entry_path, entry["task"], results_data, field)]
+
+    scored = results_data.get(field, {})
+    recorded = results_data.get(keys_field(field), {})
+    # Grouped runs still score a lone pending output (or a left-out one) with a plain call
+    tags = [request_tag(True), None] if group_size > 1 else [request_tag(False, sampling)]
+    pending, filled = [], False
+    for model_key, image_path in model_outputs(entry_path, entry["task"]):
+        try:
+            key = cache.key(image_path, entry["prompt"], entry["cond_image_paths"], EVALUATION_INSTRUCTION, judge_model)
+        except OSError as e:
+            logger.error(f"⚠️ Failed to hash inputs of {model_key} in {entry_path}: {e}")
+            continue
+        if model_key in scored and recorded.get(model_key, key) == key:
+            continue
+        stale = model_key in scored
+        cached = next((c for c in (cache.get(cache.request_key(key, tag)) for tag in tags) if c is not None), None)
+        if cached is not None:
+            record_scores(results_data, model_key, cached, key, field)
+            filled = True
+            logger.info(f"♻️ Reused cached scores for {model_key} in '{entry_path}'")
+            continue
+        if stale:
+            logger.info(f"🔁 Scores for {model_key} in '{entry_path}' are stale; re-scoring")
+        pending.append((model_key, image_path, key))
+    if filled:
+        save_results(os.path.join(entry_path, "gemini_result.json"), results_data)
+    return pending
+
+def score_check_tag(judge: Optional[Judge] = None) -> str:
+    """What, besides an entry's files, its scores depend on; part of `Manifest.input_signature`."""
+    model, field = (judge.model, judge.result_field) if judge else (MODEL_NAME, "gemini")
+    return text_sha256(json.dumps([text_sha256(EVALUATION_INSTRUCTION), model, field]))
+
+def entry_dirs(root_dir: str, manifest: Optional[Manifest] = None, cache: Optional[ScoreCache] = None,
+               judge: Optional[Judge] = None) -> List[str]:
+    """Entries to visit: the manifest's unscored entries, plus (with a cache) those whose inputs changed."""
+    if manifest is not None:
+        task = os.path.basename(os.path.normpath(root_dir))
+        if cache is None:
+            return manifest.pending_scores(task)
+        return manifest.pending_score_checks(task, score_check_tag(judge))
+    entries = (os.path.join(root_dir, e) for e in sorted(os.listdir(root_dir)))
+    return [e for e in entries if os.path.isdir(e)]
+
+def plan_entries(root_dir: str, manifest: Optional[Manifest] = None, cache: Optional[ScoreCache] = None,
+                 sampling: Optional[Sampling] = None, group_size: int = 1,
+                 judge: Optional[Judge] = None) -> Iterator[Tuple[str, Dict[str, Any], Dict[str, Any], List]]:
+    """(entry_path, entry, results_data, plan_scores triples) for every entry with work left.
+
+    Entries found fully scored are marked checked in the manifest, so the next run skips them
+    until their files change. The manifest only tracks Gemini scores, so other judges walk the tree.
+    """
+    if judge is not None and judge.result_field != "gemini":
+        manifest = None
+    tag = score_check_tag(judge)
+    for entry_path in entry_dirs(root_dir, manifest, cache, judge):
+        signature = manifest.input_signature(entry_path, tag) if manifest is not None and cache is not None else None
+        results_data = load_results(os.path.join(entry_path, "gemini_result.json"))
+        try:
+            entry = load_entry(entry_path)
+        except Exception as e:
+            logger.error(f"❌ Failed to read metadata in {entry_path}: {e}")
+            continue
+        pending = plan_scores(entry_path, entry, results_data, cache, sampling, group_size, judge)
+        if not pending:
+            if signature is not None:
+                manifest.mark_score_checked(entry_path, signature)
+            continue
+        yield entry_path, entry, results_data, pending
 
-        image_path = os.path.join(model_output_dir, model_file)
-        logger.info(f"✨ Evaluating {model_key} for task '{task}' and dir={entry_path} with prompt: '{prompt_to_evaluate}'")
-        scores = evaluate_generated_image(client,image_path, prompt_to_evaluate, cond_image_paths)
+def score_entry(entry_path: str, entry: Dict[str, Any], results_data: Dict[str, Any], pending: List,
+                cache: Optional[ScoreCache] = None, sampling: Optional[Sampling] = None, group_size: int = 1):
+    """Score the `plan_scores` triples of one entry and save each result as it lands."""
+    result_path = os.path.join(entry_path, "gemini_result.json")
+    prompt_to_evaluate = entry["prompt"]
+    task = entry["task"]
+    cond_image_paths = entry["cond_image_paths"]
+    judge = as_judge(client, MODEL_NAME)
+
+    def save(model_key, scores, key, tag):
         if scores:
-            results_data["gemini"][model_key] = scores
-            with open(result_path, "w") as f:
-                json.dump(results_data, f, indent=2)
+            record_scores(results_data, model_key, scores, key, judge.result_field)
+            if cache is not None and key:
+                cache.put(cache.request_key(key, tag), scores)
+            save_results(result_path, results_data)
             logger.info(f"✅ Saved scores for {model_key}: {scores}")
         else:
             logger.error(f"❌ Failed to obtain scores for {model_key}")
 
-def process_all(root_dir: str):
-    for entry in sorted(os.listdir(root_dir)):
-        entry_path = os.path.join(root_dir, entry)
-        if os.path.isdir(entry_path):
-            process_single_example(entry_path)
+    if group_size > 1 and len(pending) > 1:
+        logger.info(f"✨ Evaluating {len(pending)} outputs for task '{task}' and dir={entry_path} "
+                    f"in requests of up to {group_size} with prompt: '{prompt_to_evaluate}'")
+        all_scores = score_images(judge, [p for _, p, _ in pending], prompt_to_evaluate, cond_image_paths,
+                                  group_size, limiter=limiter)
+        for (model_key, _, key), (scores, tag) in zip(pending, all_scores):
+            save(model_key, scores, key, tag)
+        return
+
+    for model_key, image_path, key in pending:
+        logger.info(f"✨ Evaluating {model_key} for task '{task}' and dir={entry_path} with prompt: '{prompt_to_evaluate}'")
+        save(model_key, score_image(judge, image_path, prompt_to_evaluate, cond_image_paths, sampling, limiter=limiter),
+             key, request_tag(False, sampling))
+
+def process_single_example(entry_path: str, cache: Optional[ScoreCache] = None, sampling: Optional[Sampling] = None,
+                           group_size: int = 1):
+    results_data = load_results(os.path.join(entry_path, "gemini_result.json"))
+    entry = load_entry(entry_path)
+    pending = plan_scores(entry_path, entry, results_data, cache, sampling, group_size, as_judge(client, MODEL_NAME))
+    score_entry(entry_path, entry, results_data, pending, cache, sampling, group_size)
+
+def process_all(root_dir: str, manifest: Optional[Manifest] = None, cache: Optional[ScoreCache] = None,
+                sampling: Optional[Sampling] = None, group_size: int = 1):
+    judge = as_judge(client, MODEL_NAME)
+    for entry_path, entry, results_data, pending in plan_entries(root_dir, manifest, cache, sampling, group_size, judge):
+        score_entry(entry_path, entry, results_data, pending, cache, sampling, group_size)
 
 def main():
     root = "YOUR-DATA-ROOT"
@@ -230,12 +559,18 @@ def main():
     #process_single_example("/home/samin/ImagenHub2_data/TIG/TIG_A_000001")
     # Uncomment to run full sweep:4
     tasks = ["TIG","TIE","SRIG","SRIE","MRIG","MRIE"]
+    cache = get_default_cache() if USE_SCORE_CACHE else None
+    # Skips finished entries; with the cache it also re-checks entries whose files changed
+    manifest = Manifest(root)
+    manifest.refresh(tasks)
     for task in tasks:
         logger.info(f"processing {task}")
-        process_all(os.path.join(root, task))
+        process_all(os.path.join(root, task), manifest, cache, SAMPLING, GROUP_SIZE)
+    report_telemetry()
 
 if __name__ == "__main__":
     API_KEY = API_KEY 
 
-    client = genai.Client(api_key=API_KEY)
+    client = make_judge(JUDGE, MODEL_NAME if JUDGE == "gemini" else None,
+                        client=genai.Client(api_key=API_KEY) if JUDGE == "gemini" else None)
     main()
@@ -0,0 +1,283 @@
+"""Build eval/results/human_auto_summary.json from human annotations and Gemini scores.
+
+Inputs
+- Human annotations: a JSON list or JSONL file, one record per (item, annotator):
+      {"task": "TIG", "entry": "TIG_A_000001", "model": "sdxl", "annotator": "a3",
+       "prompt_relevance": 4, "aesthetic_quality": 5, "content_coherence": 4, "artifacts": 3}
+  ("entry_id": "TIG/TIG_A_000001" may replace task + entry; "artifact" is accepted for "artifacts").
+- Automatic scores: every <root>/<task>/<entry>/gemini_result.json, as written by gemini_score.py.
+
+All ratings are 1-5 and normalized to 0-1 as (r - 1) / 4. Per item, each criterion is
+averaged over annotators; an item's overall score is the mean of its four criteria.
+Means/stds (ddof=1) are taken over items. `human_overall_alpha` is interval
+Krippendorff's alpha of the annotators' per-item overall scores, and
+`human_auto_spearman_rho` is Spearman's rho between human and auto overall scores.
+Every statistic is computed for all groups at once with bincount reductions.
+
+    python eval/scripts/human_auto_summary.py --root YOUR-DATA-ROOT --annotations human_eval.json
+    python eval/scripts/human_auto_summary.py ... --group-by model topic --out by_topic.json
+    python eval/scripts/human_auto_summary.py ... --check eval/results/human_auto_summary.json
+"""
+import argparse
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+logger = logging.getLogger(__name__)
+
+TASKS = ["TIG", "TIE", "SRIG", "SRIE", "MRIG", "MRIE"]
+# Output name -> key in annotations / gemini_result.json
+CRITERIA = {
+    "prompt_relevance": "prompt_relevance",
+    "aesthetic_quality": "aesthetic_quality",
+    "content_coherence": "content_coherence",
+    "artifact": "artifacts",
+}
+GROUP_FIELDS = ("model", "task", "topic")
+
+
+def normalize(ratings: np.ndarray) -> np.ndarray:
+    return (ratings - 1.0) / 4.0
+
+
+# --- Grouped reductions ---
+def group_codes(*columns: np.ndarray) -> Tuple[np.ndarray, List[Tuple]]:
+    """Integer group id per row, plus the key tuple of each group."""
+    keys = list(zip(*columns))
+    uniques = sorted(set(keys))
+    lookup = {key: i for i, key in enumerate(uniques)}
+    return np.fromiter((lookup[k] for k in keys), dtype=np.int64, count=len(keys)), uniques
+
+
+def grouped_mean_std(values: np.ndarray, groups: np.ndarray, n_groups: int) -> Tuple[np.ndarray, np.ndarray]:
+    """NaN-skipping per-group mean and sample std (ddof=1)."""
+    ok = ~np.isnan(values)
+    g, v = groups[ok], values[ok]
+    n = np.bincount(g, minlength=n_groups).astype(float)
+    s1 = np.bincount(g, weights=v, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = s1 / n
+        sq = np.bincount(g, weights=(v - mean[g]) ** 2, minlength=n_groups)
+        std = np.sqrt(sq / (n - 1))
+    return mean, std
+
+
+def grouped_alpha(ratings: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """Interval Krippendorff's alpha per group.
+
+    `ratings` is (items, coders) with NaN for missing ratings; `groups` gives each
+    item's group. Uses sum_{c != k} (v_c - v_k)^2 = 2 * (m * sum v^2 - (sum v)^2)
+    per item, so no pairwise expansion is needed.
+    """
+    ok = ~np.isnan(ratings)
+    m = ok.sum(axis=1).astype(float)
+    v = np.where(ok, ratings, 0.0)
+    s1, s2 = v.sum(axis=1), (v ** 2).sum(axis=1)
+    pairable = m >= 2
+    g, m, s1, s2 = groups[pairable], m[pairable], s1[pairable], s2[pairable]
+
+    n = np.bincount(g, weights=m, minlength=n_groups)
+    within = np.bincount(g, weights=2 * (m * s2 - s1 ** 2) / (m - 1), minlength=n_groups)
+    total1 = np.bincount(g, weights=s1, minlength=n_groups)
+    total2 = np.bincount(g, weights=s2, minlength=n_groups)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        d_o = within / n
+        d_e = 2 * (n * total2 - total1 ** 2) / (n * (n - 1))
+        return 1.0 - d_o / d_e
+
+
+def grouped_ranks(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """1-based ranks within each group, ties get their average rank."""
+    order = np.lexsort((values, groups))
+    g, v = groups[order], values[order]
+    new_group = np.r_[True, g[1:] != g[:-1]]
+    new_block = new_group | np.r_[True, v[1:] != v[:-1]]
+    position = np.arange(len(v)) - np.maximum.accumulate(np.where(new_group, np.arange(len(v)), 0)) + 1
+    block = np.cumsum(new_block) - 1
+    block_rank = np.bincount(block, weights=position) / np.bincount(block)
+    ranks = np.empty(len(v))
+    ranks[order] = block_rank[block]
+    return ranks
+
+
+def grouped_pearson(x: np.ndarray, y: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    n = np.bincount(groups, minlength=n_groups).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mx = np.bincount(groups, weights=x, minlength=n_groups) / n
+        my = np.bincount(groups, weights=y, minlength=n_groups) / n
+        dx, dy = x - mx[groups], y - my[groups]
+        sxy = np.bincount(groups, weights=dx * dy, minlength=n_groups)
+        sxx = np.bincount(groups, weights=dx * dx, minlength=n_groups)
+        syy = np.bincount(groups, weights=dy * dy, minlength=n_groups)
+        return sxy / np.sqrt(sxx * syy)
+
+
+def grouped_spearman(x: np.ndarray, y: np.ndarray, groups: np.ndarray, n_groups: int) -> np.ndarray:
+    """Spearman's rho per group over rows where both x and y are present."""
+    ok = ~(np.isnan(x) | np.isnan(y))
+    x, y, groups = x[ok], y[ok], groups[ok]
+    if not len(x):
+        return np.full(n_groups, np.nan)
+    return grouped_pearson(grouped_ranks(x, groups), grouped_ranks(y, groups), groups, n_groups)
+
+
+# --- Loading ---
+def read_records(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if text.lstrip().startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def topic_from_entry(entry: str) -> Optional[str]:
+    """TIG_A_000001 -> "A"."""
+    m = re.match(r"^[A-Z]+_([A-Z]+)_\d+$", entry)
+    return m.group(1) if m else None
+
+
+def load_annotations(path: str) -> Dict[str, np.ndarray]:
+    """Columns of the long-format annotation table, criteria normalized to 0-1."""
+    records = read_records(path)
+    cols: Dict[str, list] = {k: [] for k in ("task", "entry", "model", "annotator", *CRITERIA)}
+    for r in records:
+        if "entry_id" in r:
+            task, entry = r["entry_id"].split("/", 1)
+        else:
+            task, entry = r["task"], r["entry"]
+        cols["task"].append(task)
+        cols["entry"].append(entry)
+        cols["model"].append(r["model"])
+        cols["annotator"].append(str(r.get("annotator", "")))
+        for name, key in CRITERIA.items():
+            value = r.get(key, r.get(name))
+            cols[name].append(np.nan if value is None else float(value))
+    out = {k: np.asarray(v, dtype=object) for k, v in cols.items() if k not in CRITERIA}
+    out.update({name: normalize(np.asarray(cols[name], dtype=float)) for name in CRITERIA})
+    logger.info(f"📥 {len(records)} human annotations from {path}")
+    return out
+
+
+def load_auto_scores(root: str, tasks: Sequence[str]) -> Dict[Tuple[str, str, str], np.ndarray]:
+    """(task, entry, model) -> normalized criteria, from every gemini_result.json."""
+    scores = {}
+    for task in tasks:
+        task_dir = os.path.join(root, task)
+        if not os.path.isdir(task_dir):
+            continue
+        for entry in sorted(os.listdir(task_dir)):
+            path = os.path.join(task_dir, entry, "gemini_result.json")
+            if not os.path.exists(path):
+                continue
+            try:
+                with open(path, "r") as f:
+                    results = json.load(f).get("gemini", {})
+            except Exception as e:
+                logger.warning(f"⚠️ Unreadable {path}: {e}")
+                continue
+            for model, s in results.items():
+                try:
+                    scores[(task, entry, model)] = normalize(np.array([float(s[key]) for key in CRITERIA.values()]))
+                except (KeyError, TypeError, ValueError):
+                    logger.warning(f"⚠️ Malformed scores for {model} in {path}")
+    logger.info(f"📥 {len(scores)} automatic scores under {root}")
+    return scores
+
+
+# --- Summary ---
+def build_items(annotations: Dict[str, np.ndarray], auto: Dict[Tuple[str, str, str], np.ndarray]) -> Dict[str, Any]:
+    """Item-level table: one row per (task, entry, model) that has human annotations."""
+    item_ids, items = group_codes(annotations["task"], annotations["entry"], annotations["model"])
+    coder_ids, coders = group_codes(annotations["annotator"])
+    n_items = len(items)
+
+    table: Dict[str, Any] = {"items": items}
+    for name in CRITERIA:
+        table[name], _ = grouped_mean_std(annotations[name], item_ids, n_items)
+    table["human_overall"] = np.mean([table[name] for name in CRITERIA], axis=0)
+
+    # Annotator-level overall scores, (items, annotators), for agreement
+    coder_overall = np.mean([annotations[name] for name in CRITERIA], axis=0)
+    table["ratings"] = np.full((n_items, len(coders)), np.nan)
+    table["ratings"][item_ids, coder_ids] = coder_overall
+
+    table["auto_overall"] = np.array([np.nanmean(auto[item]) if item in auto else np.nan for item in items])
+    table["task"] = np.array([t for t, _, _ in items], dtype=object)
+    table["entry"] = np.array([e for _, e, _ in items], dtype=object)
+    table["model"] = np.array([m for _, _, m in items], dtype=object)
+    table["topic"] = np.array([topic_from_entry(e) for _, e, _ in items], dtype=object)
+    return table
+
+
+def summarize(annotations: Dict[str, np.ndarray], auto: Dict[Tuple[str, str, str], np.ndarray],
+              group_by: Sequence[str] = ("model", "task")) -> List[Dict[str, Any]]:
+    table = build_items(annotations, auto)
+    per_criterion = {name: table[name] for name in CRITERIA}
+    human_overall, auto_overall, matrix = table["human_overall"], table["auto_overall"], table["ratings"]
+    groups, keys = group_codes(*(table[field] for field in group_by))
+    n_groups = len(keys)
+
+    columns = {"n_items": np.bincount(groups, minlength=n_groups)}
+    for name in CRITERIA:
+        columns[f"{name}_mean"], columns[f"{name}_std"] = grouped_mean_std(per_criterion[name], groups, n_groups)
+    columns["human_overall_mean"], columns["human_overall_std"] = grouped_mean_std(human_overall, groups, n_groups)
+    columns["auto_overall_mean"], columns["auto_overall_std"] = grouped_mean_std(auto_overall, groups, n_groups)
+    columns["human_overall_alpha"] = grouped_alpha(matrix, groups, n_groups)
+    columns["human_auto_spearman_rho"] = grouped_spearman(human_overall, auto_overall, groups, n_groups)
+
+    rows = []
+    for i, key in enumerate(keys):
+        row: Dict[str, Any] = dict(zip(group_by, key))
+        for name, values in columns.items():
+            value = values[i].item()
+            row[name] = None if isinstance(value, float) and np.isnan(value) else value
+        rows.append(row)
+    return rows
+
+
+def compare(rows: List[Dict[str, Any]], reference_path: str, group_by: Sequence[str], tol: float = 1e-6) -> int:
+    """Log fields that differ from a previously published summary; returns the mismatch count."""
+    with open(reference_path, "r") as f:
+        reference = {tuple(r[k] for k in group_by): r for r in json.load(f)}
+    mismatches = 0
+    for row in rows:
+        key = tuple(row[k] for k in group_by)
+        ref = reference.pop(key, None)
+        if ref is None:
+            continue
+        for field, value in row.items():
+            expected = ref.get(field)
+            if isinstance(expected, (int, float)) and (value is None or abs(value - expected) > tol):
+                logger.warning(f"≠ {key} {field}: computed {value}, reference {expected}")
+                mismatches += 1
+    if reference:
+        logger.warning(f"⚠️ {len(reference)} reference groups have no annotations here: {sorted(reference)[:5]}...")
+    logger.info(f"{'✅' if not mismatches else '❌'} {mismatches} mismatching values against {reference_path}")
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=TASKS)
+    parser.add_argument("--annotations", required=True, help="human annotations (JSON list or JSONL)")
+    parser.add_argument("--group-by", nargs="+", default=["model", "task"], choices=GROUP_FIELDS)
+    parser.add_argument("--out", default="human_auto_summary.json")
+    parser.add_argument("--check", default=None, help="published summary to compare against")
+    args = parser.parse_args()
+
+    rows = summarize(load_annotations(args.annotations), load_auto_scores(args.root, args.tasks), args.group_by)
+    with open(args.out, "w") as f:
+        json.dump(rows, f, indent=2)
+    logger.info(f"💾 Wrote {len(rows)} groups to {args.out}")
+    if args.check:
+        raise SystemExit(1 if compare(rows, args.check, args.group_by) else 0)
+
+
+if __name__ == "__main__":
+    main()
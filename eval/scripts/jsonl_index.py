@@ -0,0 +1,313 @@
+"""Byte-offset index and streaming reader for large JSONL files.
+
+Builds <file>.idx.sqlite with one row per line: its byte offset and length, plus
+the fields dashboards filter on (key, task, entry, topic, model). Lookups and
+filters then read only the matching lines through mmap instead of json.loads-ing
+the whole file into a list. Index building splits the file into newline-aligned
+byte ranges and parses them on a process pool.
+
+Works on any JSONL whose records carry an id ("request_id", "key", "id" or
+"entry_id") and/or task/entry/model fields, e.g. batch_score.py request and
+result files ("key": "TIG/TIG_A_000001|sdxl") or annotation exports. A single
+large JSON array (such as eval/results/human_eval.json once pulled from LFS) can
+be streamed to JSONL first with `convert`.
+
+    python eval/scripts/jsonl_index.py convert human_eval.json human_eval.jsonl
+    python eval/scripts/jsonl_index.py index   human_eval.jsonl --workers 8
+    python eval/scripts/jsonl_index.py get     human_eval.jsonl "TIG/TIG_A_000001|sdxl"
+    python eval/scripts/jsonl_index.py filter  human_eval.jsonl --task TIG --model sdxl gemini
+
+    idx = JsonlIndex("human_eval.jsonl"); idx.build()
+    for record in idx.iter(task="TIE", topic="A"): ...
+"""
+import argparse
+import json
+import logging
+import mmap
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from human_auto_summary import topic_from_entry
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELDS = ("request_id", "key", "id", "entry_id")
+FILTER_FIELDS = ("task", "topic", "model")
+ARRAY_DELIMITER = re.compile(r"[,\]]")  # what must follow an element of a JSON array
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS lines (
+    line INTEGER PRIMARY KEY, offset INTEGER NOT NULL, length INTEGER NOT NULL,
+    key TEXT, task TEXT, entry TEXT, topic TEXT, model TEXT
+);
+"""
+INDEXES = """
+CREATE INDEX IF NOT EXISTS lines_key ON lines (key);
+CREATE INDEX IF NOT EXISTS lines_filter ON lines (task, topic, model);
+"""
+
+
+def describe(record: Any) -> Tuple[Optional[str], ...]:
+    """(key, task, entry, topic, model) for one record; any of them may be None."""
+    if not isinstance(record, dict):
+        return None, None, None, None, None
+    key = next((str(record[f]) for f in KEY_FIELDS if record.get(f) is not None), None)
+    entry_id = record.get("entry_id") or (key.split("|", 1)[0] if key and "/" in key else None)
+    task, entry = (entry_id.split("/", 1) if entry_id and "/" in entry_id else (None, record.get("entry")))
+    task = task or record.get("task")
+    model = record.get("model") or (key.split("|", 1)[1] if key and "|" in key else None)
+    topic = record.get("topic") or (topic_from_entry(entry) if entry else None)
+    if key is None and task and entry:
+        key = f"{task}/{entry}" + (f"|{model}" if model else "")
+    return key, task, entry, topic, model
+
+
+def split_ranges(path: str, n: int) -> List[Tuple[int, int]]:
+    """n byte ranges whose boundaries sit just after a newline."""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, n):
+            f.seek(max(size * i // n, bounds[-1]))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds, bounds[1:]) if b > a]
+
+
+def scan_range(args: Tuple[str, int, int]) -> List[Tuple]:
+    """Parse every line starting in [start, end); returns (offset, length, key, task, entry, topic, model)."""
+    path, start, end = args
+    rows = []
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            nl = mm.find(b"\n", pos, end)
+            stop = end if nl == -1 else nl
+            line = mm[pos:stop]
+            if line.strip():
+                try:
+                    fields = describe(json.loads(line))
+                except json.JSONDecodeError:
+                    fields = (None,) * 5
+                    logger.warning(f"⚠️ Unparseable line at byte {pos} of {path}")
+                rows.append((pos, stop - pos, *fields))
+            pos = stop + 1
+    return rows
+
+
+class JsonlIndex:
+    def __init__(self, path: str, index_path: Optional[str] = None):
+        self.path = path
+        self.index_path = index_path or path + ".idx.sqlite"
+        self._db = sqlite3.connect(self.index_path)
+        self._db.executescript(SCHEMA)
+        self._file = None
+        self._mm = None
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = self._file = None
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Building ---
+    def _signature(self) -> str:
+        st = os.stat(self.path)
+        return f"{st.st_size}:{st.st_mtime_ns}"
+
+    def is_fresh(self) -> bool:
+        row = self._db.execute("SELECT value FROM meta WHERE name='signature'").fetchone()
+        return row is not None and row[0] == self._signature()
+
+    def build(self, workers: int = 1, force: bool = False) -> int:
+        """(Re)index the file if it changed since the last build; returns the line count."""
+        if not force and self.is_fresh():
+            return self._db.execute("SELECT COUNT(*) FROM lines").fetchone()[0]
+        start = time.perf_counter()
+        ranges = [(self.path, a, b) for a, b in split_ranges(self.path, max(1, workers) * 4)]
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                parts = list(pool.map(scan_range, ranges))
+        else:
+            parts = [scan_range(r) for r in ranges]
+
+        self._db.execute("DELETE FROM lines")
+        self._db.execute("DROP INDEX IF EXISTS lines_key")
+        self._db.execute("DROP INDEX IF EXISTS lines_filter")
+        line = 0
+        for rows in parts:
+            self._db.executemany("INSERT INTO lines VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                 [(line + i, *row) for i, row in enumerate(rows)])
+            line += len(rows)
+        self._db.executescript(INDEXES)
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('signature', ?)", (self._signature(),))
+        self._db.commit()
+        self._close_map()
+        logger.info(f"📇 Indexed {line} lines of {self.path} in {time.perf_counter() - start:.1f}s")
+        return line
+
+    # --- Reading ---
+    def _close_map(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = self._file = None
+
+    def _map(self) -> mmap.mmap:
+        if self._mm is None:
+            self._file = open(self.path, "rb")
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+    def _read(self, offset: int, length: int) -> Any:
+        return json.loads(self._map()[offset:offset + length])
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM lines").fetchone()[0]
+
+    def line(self, n: int) -> Any:
+        row = self._db.execute("SELECT offset, length FROM lines WHERE line=?", (n,)).fetchone()
+        if row is None:
+            raise IndexError(n)
+        return self._read(*row)
+
+    def get(self, key: str) -> Any:
+        """First record with this key."""
+        row = self._db.execute("SELECT offset, length FROM lines WHERE key=? ORDER BY line LIMIT 1", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self._read(*row)
+
+    def _where(self, filters: Dict[str, Any]) -> Tuple[str, list]:
+        clauses, args = [], []
+        for field, value in filters.items():
+            if field not in FILTER_FIELDS + ("entry", "key"):
+                raise ValueError(f"Can't filter on {field!r}")
+            if value is None:
+                continue
+            values = [value] if isinstance(value, str) else list(value)
+            clauses.append(f"{field} IN ({', '.join('?' * len(values))})")
+            args.extend(values)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", args
+
+    def count(self, **filters) -> int:
+        where, args = self._where(filters)
+        return self._db.execute(f"SELECT COUNT(*) FROM lines{where}", args).fetchone()[0]
+
+    def iter(self, **filters) -> Iterator[Any]:
+        """Records matching every filter (a value or a list of values per field), in file order."""
+        where, args = self._where(filters)
+        for offset, length in self._db.execute(f"SELECT offset, length FROM lines{where} ORDER BY line", args):
+            yield self._read(offset, length)
+
+    def values(self, field: str) -> List[Tuple[Any, int]]:
+        """Distinct values of an indexed field with their line counts."""
+        if field not in FILTER_FIELDS + ("entry",):
+            raise ValueError(f"Not an indexed field: {field!r}")
+        return self._db.execute(f"SELECT {field}, COUNT(*) FROM lines GROUP BY {field} ORDER BY {field}").fetchall()
+
+
+# --- JSON array -> JSONL ---
+def convert(src: str, dest: str, chunk_size: int = 1 << 20) -> int:
+    """Stream a top-level JSON array into JSONL without loading the whole array."""
+    decoder = json.JSONDecoder()
+    written = 0
+    with open(src, "r", encoding="utf-8") as f, open(dest, "w", encoding="utf-8") as out:
+        buf, eof = "", False
+        while not buf.strip() and not eof:
+            more = f.read(chunk_size)
+            eof = not more
+            buf += more
+        buf = buf.lstrip()
+        if not buf.startswith("["):
+            raise ValueError(f"{src} is not a JSON array")
+        buf = buf[1:]
+        while True:
+            buf = buf.lstrip().lstrip(",").lstrip()
+            if buf.startswith("]"):
+                break
+            try:
+                obj, end = decoder.raw_decode(buf)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+            # A number cut at the chunk boundary still decodes ("-6.5e" -> -6.5), so only trust
+            # a value once the "," or "]" after it is in the buffer
+            if end is None or (not eof and ARRAY_DELIMITER.search(buf, end) is None):
+                more = f.read(chunk_size)
+                eof = not more
+                buf += more
+                continue
+            out.write(json.dumps(obj, ensure_ascii=False) + "\n")
+            written += 1
+            buf = buf[end:]
+            if len(buf) < chunk_size and not eof:
+                more = f.read(chunk_size)
+                eof = not more
+                buf += more
+    logger.info(f"🔁 Wrote {written} records to {dest}")
+    return written
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("convert", help="stream a JSON array file into JSONL")
+    p.add_argument("src")
+    p.add_argument("dest")
+    p = sub.add_parser("index", help="build or refresh the byte-offset index")
+    p.add_argument("path")
+    p.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p.add_argument("--force", action="store_true")
+    p = sub.add_parser("get", help="print the record with this key")
+    p.add_argument("path")
+    p.add_argument("key")
+    p = sub.add_parser("filter", help="print matching records as JSONL")
+    p.add_argument("path")
+    for field in FILTER_FIELDS:
+        p.add_argument(f"--{field}", nargs="+", default=None)
+    p.add_argument("--count", action="store_true", help="only print the number of matches")
+    args = parser.parse_args(argv)
+
+    if args.command == "convert":
+        convert(args.src, args.dest)
+        return
+    with JsonlIndex(args.path) as idx:
+        if args.command == "index":
+            idx.build(args.workers, args.force)
+            return
+        if not idx.is_fresh():
+            idx.build(os.cpu_count() or 1)
+        if args.command == "get":
+            try:
+                print(json.dumps(idx.get(args.key), ensure_ascii=False))
+            except KeyError:
+                logger.error(f"❌ No record with key {args.key!r}")
+                raise SystemExit(1)
+            return
+        filters = {field: getattr(args, field) for field in FILTER_FIELDS}
+        if args.count:
+            print(idx.count(**filters))
+            return
+        for record in idx.iter(**filters):
+            print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
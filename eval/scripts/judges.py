@@ -0,0 +1,338 @@
+"""Judge backends for the scoring scripts.
+
+A judge turns one evaluation request into response text. A request is a list of
+parts: plain strings and `ImageRef`s, in the order the judge should see them.
+That request is built once by gemini_score.py, so every backend receives the
+same instruction, prompt and images. Backends:
+
+    gemini   Gemini through google-genai (images go through the upload cache)
+    openai   OpenAI chat completions, images inlined as base64 data URLs
+    local    a local vision-language model through transformers (no API quota)
+    mock     deterministic ratings derived from the image bytes and prompt, for
+             offline runs and benchmarks
+
+Each judge keeps its own request/token/latency counters. async_score.py can
+run several judges on the same job set with the same scheduler and print a
+side-by-side report (--judge mock gemini openai). Scores go under the judge's
+own top-level key of gemini_result.json ("gemini", "openai", ...), so judges
+never overwrite each other.
+
+    judge = make_judge("local", model="Qwen/Qwen2-VL-7B-Instruct")
+    reply = judge.generate(["Rate this image", ImageRef("model_output/sdxl.png")])
+"""
+import base64
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from telemetry import percentile
+from upload_cache import cached_upload, file_sha256
+
+DEFAULT_MODELS = {
+    "openai": "gpt-4o-mini",
+    "local": "Qwen/Qwen2-VL-7B-Instruct",
+    "mock": "mock-judge-v1",
+}
+# USD per 1M input / output tokens at the time of writing; pass price_in/price_out to override
+DEFAULT_PRICES = {
+    "gemini": (0.30, 2.50),
+    "openai": (0.15, 0.60),
+    "local": (0.0, 0.0),
+    "mock": (0.0, 0.0),
+}
+# Gemini bills an image (per 768x768 tile) as 258 input tokens; used where a backend doesn't report usage
+IMAGE_TOKENS = 258
+CRITERIA = ["prompt_relevance", "aesthetic_quality", "content_coherence", "artifacts"]
+
+
+@dataclass(frozen=True)
+class ImageRef:
+    path: str
+
+
+Part = Union[str, ImageRef]
+
+
+@dataclass
+class JudgeReply:
+    text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+    detail: str = ""  # finish reason / usage, for logging unparseable replies
+
+
+def estimate_input_tokens(parts: Sequence[Part]) -> int:
+    return sum(IMAGE_TOKENS if isinstance(p, ImageRef) else len(p) // 4 for p in parts)
+
+
+class JudgeStats:
+    """Thread-safe request, token and latency counters of one judge."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.latencies: List[float] = []
+        self._lock = threading.Lock()
+
+    def add(self, reply: Optional[JudgeReply], latency: float):
+        with self._lock:
+            self.requests += 1
+            if reply is None:
+                self.errors += 1
+                return
+            self.input_tokens += reply.input_tokens
+            self.output_tokens += reply.output_tokens
+            self.latencies.append(latency)
+
+
+class Judge:
+    """Base class: subclasses implement `_generate(parts, temperature) -> JudgeReply`."""
+
+    name = "base"
+
+    def __init__(self, model: str, price_in: Optional[float] = None, price_out: Optional[float] = None,
+                 result_field: Optional[str] = None):
+        self.model = model
+        default_in, default_out = DEFAULT_PRICES.get(self.name, (0.0, 0.0))
+        self.price_in = default_in if price_in is None else price_in
+        self.price_out = default_out if price_out is None else price_out
+        # Top-level key of gemini_result.json this judge's scores live under
+        self.result_field = result_field or self.name
+        self.stats = JudgeStats()
+
+    def _generate(self, parts: List[Part], temperature: float) -> JudgeReply:
+        raise NotImplementedError
+
+    def generate(self, parts: List[Part], temperature: float = 0.0) -> JudgeReply:
+        """One request; raises on API errors so `call_with_retry` can back off."""
+        start = time.perf_counter()
+        try:
+            reply = self._generate(list(parts), temperature)
+        except Exception:
+            self.stats.add(None, time.perf_counter() - start)
+            raise
+        self.stats.add(reply, time.perf_counter() - start)
+        return reply
+
+    def report(self, elapsed: Optional[float] = None) -> Dict[str, Any]:
+        s = self.stats
+        cost = (s.input_tokens * self.price_in + s.output_tokens * self.price_out) / 1e6
+        ok = s.requests - s.errors
+        return {
+            "judge": self.name, "model": self.model, "requests": s.requests, "errors": s.errors,
+            "input_tokens": s.input_tokens, "output_tokens": s.output_tokens, "cost_usd": round(cost, 6),
+            "latency_p50": percentile(s.latencies, 0.5), "latency_p95": percentile(s.latencies, 0.95),
+            "requests_per_s": ok / elapsed if elapsed else None,
+        }
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.model!r})"
+
+
+# --- Gemini ---
+def extract_text_from_response(resp) -> str:
+    """Be resilient: prefer resp.text; fall back to concatenating parts."""
+    # Fast path
+    try:
+        if getattr(resp, "text", None):
+            return resp.text
+    except Exception:
+        pass
+    # Fallback: join all text parts from first candidate
+    try:
+        if resp and resp.candidates:
+            parts = resp.candidates[0].content.parts or []
+            collected = []
+            for p in parts:
+                # p may have 'text' or 'inline_data' etc.; we only want text here
+                t = getattr(p, "text", None)
+                if t:
+                    collected.append(t)
+            return "\n".join(collected).strip()
+    except Exception:
+        return ""
+    return ""
+
+
+class GeminiJudge(Judge):
+    name = "gemini"
+
+    def __init__(self, client, model: str, **kwargs):
+        super().__init__(model, **kwargs)
+        self.client = client
+
+    def _generate(self, parts: List[Part], temperature: float) -> JudgeReply:
+        contents = [cached_upload(self.client, p.path) if isinstance(p, ImageRef) else p for p in parts]
+        resp = self.client.models.generate_content(
+            model=self.model,
+            contents=contents,
+            # Force strict JSON so json.loads won’t fail.
+            config={"response_mime_type": "application/json", "temperature": temperature},
+        )
+        text = extract_text_from_response(resp)
+        usage = getattr(resp, "usage_metadata", None)
+        try:
+            finish = getattr(resp.candidates[0], "finish_reason", None)
+        except (AttributeError, IndexError, TypeError):
+            finish = None
+        return JudgeReply(
+            text,
+            getattr(usage, "prompt_token_count", None) or estimate_input_tokens(parts),
+            getattr(usage, "candidates_token_count", None) or len(text) // 4,
+            f"finish_reason={finish}, usage={usage}",
+        )
+
+
+# --- OpenAI ---
+def data_url(path: str) -> str:
+    mime_type = mimetypes.guess_type(path)[0] or "image/png"
+    with open(path, "rb") as f:
+        return f"data:{mime_type};base64,{base64.b64encode(f.read()).decode()}"
+
+
+class OpenAIJudge(Judge):
+    name = "openai"
+
+    def __init__(self, client=None, model: str = DEFAULT_MODELS["openai"], **kwargs):
+        super().__init__(model, **kwargs)
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = client
+
+    def _generate(self, parts: List[Part], temperature: float) -> JudgeReply:
+        content = [
+            {"type": "image_url", "image_url": {"url": data_url(p.path)}} if isinstance(p, ImageRef)
+            else {"type": "text", "text": p}
+            for p in parts
+        ]
+        resp = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": content}],
+            temperature=temperature,
+            # JSON mode returns an object; multi-image arrays come back wrapped in one
+            response_format={"type": "json_object"},
+        )
+        choice = resp.choices[0]
+        text = choice.message.content or ""
+        usage = getattr(resp, "usage", None)
+        return JudgeReply(
+            text,
+            getattr(usage, "prompt_tokens", None) or estimate_input_tokens(parts),
+            getattr(usage, "completion_tokens", None) or len(text) // 4,
+            f"finish_reason={choice.finish_reason}, usage={usage}",
+        )
+
+
+# --- Local VLM ---
+class LocalVLMJudge(Judge):
+    """A chat-template VLM (e.g. Qwen2-VL) loaded once with transformers; requests run one at a time."""
+
+    name = "local"
+
+    def __init__(self, model: str = DEFAULT_MODELS["local"], device: str = "auto", max_new_tokens: int = 512,
+                 **kwargs):
+        super().__init__(model, **kwargs)
+        import torch
+        from transformers import AutoModelForVision2Seq, AutoProcessor
+
+        self._torch = torch
+        self.processor = AutoProcessor.from_pretrained(model)
+        self.vlm = AutoModelForVision2Seq.from_pretrained(model, torch_dtype="auto", device_map=device).eval()
+        self.max_new_tokens = max_new_tokens
+        self._lock = threading.Lock()
+
+    def _generate(self, parts: List[Part], temperature: float) -> JudgeReply:
+        from PIL import Image
+
+        content, images = [], []
+        for p in parts:
+            if isinstance(p, ImageRef):
+                content.append({"type": "image"})
+                images.append(Image.open(p.path).convert("RGB"))
+            else:
+                content.append({"type": "text", "text": p})
+        text = self.processor.apply_chat_template([{"role": "user", "content": content}], add_generation_prompt=True)
+        with self._lock:
+            inputs = self.processor(text=[text], images=images or None, return_tensors="pt").to(self.vlm.device)
+            sampling = {"do_sample": True, "temperature": temperature} if temperature > 0 else {"do_sample": False}
+            with self._torch.inference_mode():
+                out = self.vlm.generate(**inputs, max_new_tokens=self.max_new_tokens, **sampling)
+        n_in = inputs["input_ids"].shape[1]
+        reply = self.processor.batch_decode(out[:, n_in:], skip_special_tokens=True)[0]
+        return JudgeReply(reply, int(n_in), int(out.shape[1] - n_in), f"new_tokens={out.shape[1] - n_in}")
+
+
+# --- Mock ---
+class MockJudge(Judge):
+    """Deterministic offline judge: ratings are a hash of the image bytes and the prompt.
+
+    At temperature > 0 each call also mixes in a call counter, so repeated samples differ
+    (reproducibly for a given call order). Multi-image requests ("Image k:" before each image)
+    get a JSON array, like the real judges.
+    """
+
+    name = "mock"
+
+    def __init__(self, model: str = DEFAULT_MODELS["mock"], latency: float = 0.0, **kwargs):
+        super().__init__(model, **kwargs)
+        self.latency = latency
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def ratings(self, image_path: str, prompt: str, salt: str = "") -> Dict[str, int]:
+        h = hashlib.sha256(f"{file_sha256(image_path)}|{prompt}|{salt}".encode()).digest()
+        return {c: 1 + h[i] % 5 for i, c in enumerate(CRITERIA)}
+
+    def _generate(self, parts: List[Part], temperature: float) -> JudgeReply:
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self._calls += 1
+            salt = str(self._calls) if temperature > 0 else ""
+        prompt = next((p[len("Prompt: "):] for p in parts if isinstance(p, str) and p.startswith("Prompt: ")), "")
+        labelled, label = [], None
+        for p in parts:
+            if isinstance(p, str):
+                m = re.fullmatch(r"Image (\d+):", p.strip())
+                label = int(m.group(1)) if m else None
+            elif label is not None:
+                labelled.append({"image": label, **self.ratings(p.path, prompt, salt)})
+                label = None
+        if labelled:
+            text = json.dumps(labelled)
+        else:
+            image = next(p for p in reversed(parts) if isinstance(p, ImageRef))
+            text = json.dumps(self.ratings(image.path, prompt, salt))
+        return JudgeReply(text, estimate_input_tokens(parts), len(text) // 4)
+
+
+JUDGES = {"gemini": GeminiJudge, "openai": OpenAIJudge, "local": LocalVLMJudge, "mock": MockJudge}
+
+
+def make_judge(name: str, model: Optional[str] = None, client=None, **kwargs) -> Judge:
+    """Build a judge by backend name. `client` is required for gemini (a genai.Client or look-alike)."""
+    if name not in JUDGES:
+        raise ValueError(f"Unknown judge {name!r}; choose from {sorted(JUDGES)}")
+    if name == "gemini":
+        if client is None or model is None:
+            raise ValueError("The gemini judge needs a client and a model name")
+        return GeminiJudge(client, model, **kwargs)
+    if name == "openai":
+        return OpenAIJudge(client, model or DEFAULT_MODELS["openai"], **kwargs)
+    return JUDGES[name](model or DEFAULT_MODELS[name], **kwargs)
+
+
+def as_judge(client, model: str) -> Judge:
+    """Judges pass through; anything else is treated as a genai client for `model`."""
+    return client if isinstance(client, Judge) else GeminiJudge(client, model)
@@ -0,0 +1,149 @@
+"""Content-addressed cache of Gemini scores, shared by the scoring scripts.
+
+A score is keyed by everything that determines it: the SHA-256 of the image
+bytes, the prompt, the hashes of the reference images, the hash of the
+evaluation instruction and the judge model name. Identical requests (the same
+image scored twice, a re-run after a crash, a copied tree) are answered from
+the cache. The key a score was produced under is also stored next to it in
+gemini_result.json (under "gemini_keys"), so a score whose image, prompt,
+references, instruction or judge has since changed is recognized as stale and
+re-scored. How the request was made (grouped with other outputs, sampled) is
+not part of that key: changing the mode doesn't re-score anything, and only
+the cache tells the modes apart (`request_key`).
+
+File digests are memoized by (path, size, mtime), so re-runs only stat files
+that haven't changed.
+
+    from score_cache import ScoreCache
+    cache = ScoreCache()
+    key = cache.key(image_path, prompt, cond_image_paths, EVALUATION_INSTRUCTION, MODEL_NAME)
+    scores = cache.get(key)          # None on a miss
+    cache.put(key, scores)
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from upload_cache import file_sha256
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "IMAGENWORLD_SCORE_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "imagenworld", "gemini_scores.sqlite")
+)
+# Bump when the key layout changes so old entries stop matching
+KEY_VERSION = 1
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, digest TEXT NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            " key TEXT PRIMARY KEY, scores TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._lock = threading.Lock()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # --- Keys ---
+    def file_digest(self, path: str) -> str:
+        st = os.stat(path)
+        abspath = os.path.abspath(path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT digest FROM files WHERE path=? AND size=? AND mtime_ns=?", (abspath, st.st_size, st.st_mtime_ns)
+            ).fetchone()
+        if row:
+            return row[0]
+        digest = file_sha256(path)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+                             (abspath, st.st_size, st.st_mtime_ns, digest))
+        return digest
+
+    def key(self, image_path: str, prompt: str, cond_image_paths: Sequence[str], instruction: str,
+            model_name: str, extra: Optional[Dict[str, Any]] = None) -> str:
+        """Cache key of one scoring request. Missing reference images are left out, as the scorer skips them.
+
+        `extra` holds any other setting that changes the scores (e.g. self-consistency sampling);
+        see also `request_key`.
+        """
+        parts = {
+            "v": KEY_VERSION,
+            "image": self.file_digest(image_path),
+            "prompt": prompt,
+            "cond": [self.file_digest(p) for p in cond_image_paths if os.path.exists(p)],
+            "instruction": text_sha256(instruction),
+            "model": model_name,
+        }
+        if extra:
+            parts["extra"] = extra
+        return text_sha256(json.dumps(parts, sort_keys=True))
+
+    @staticmethod
+    def request_key(key: str, extra: Optional[Dict[str, Any]] = None) -> str:
+        """`key` of the inputs, narrowed to how they were scored (multi-image request, sampling, ...).
+
+        gemini_result.json records the plain input key, so switching modes doesn't make old
+        scores stale; the cache stores each mode's scores under its own request key.
+        """
+        if not extra:
+            return key
+        return text_sha256(json.dumps({"key": key, "extra": extra}, sort_keys=True))
+
+    # --- Scores ---
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT scores FROM scores WHERE key=?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE scores SET last_used=? WHERE key=?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key: str, scores: Dict[str, Any]):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?)", (key, json.dumps(scores), now, now))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+
+_default_cache: Optional[ScoreCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> ScoreCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            # Read the env var here too, so it can be redirected after import
+            _default_cache = ScoreCache(os.getenv("IMAGENWORLD_SCORE_CACHE", DEFAULT_CACHE_PATH))
+        return _default_cache
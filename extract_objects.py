@@ -3,8 +3,11 @@ import os
 from io import BytesIO
 from PIL import Image
 from google import genai
-import time
 import logging
+from upload_cache import cached_upload
+from rate_control import AdaptiveRateLimiter, call_with_retry
+from manifest import Manifest
+from telemetry import report as report_telemetry, stage
 import re
 
 
@@ -17,6 +20,8 @@ logger = logging.getLogger(__name__)
 key = 'YOUR-GEMINI-KEY'
 client = genai.Client(api_key=key)
 model = "gemini-2.5-flash-preview-05-20"
+# Paces requests and backs off on 429/5xx instead of sleeping a fixed time per entry
+limiter = AdaptiveRateLimiter(requests_per_minute=60)
 
 # --- Task Definitions ---
 TASK_DEFINITIONS = {
@@ -65,6 +70,15 @@ id_to_topic = {
     "T": "Textual Graphics"
 }
 # --- Prompt Builder ---
+OBJECT_GUIDELINES = (
+    "**Guidelines:**\n"
+    "- **Do not** explain how the image is generated or edited.\n"
+    "- **Do not** describe editing steps or transformations.\n"
+    "- **Only output the final visual content.**\n"
+    "- **List at most 10 items**. If more objects could be extracted, include only the 10 most important or visually dominant ones."
+    "- If spatial or positional details are specified (e.g., 'on the left', 'in front of'), retain them in the list.\n"
+    "- **If the prompt says to remove or delete something, list that object as well and write: (should not be present).**\n\n"
+)
 
 def build_instruction(task, topic, original_prompt, image_count):
 
@@ -82,13 +96,7 @@ def build_instruction(task, topic, original_prompt, image_count):
         f"**Conditioning Images:** {image_count}\n\n"
         f"**Your Goal:**\n"
         f"List the **objects, elements, or visual components that must appear in the final output image.**\n\n"
-        f"**Guidelines:**\n"
-        f"- **Do not** explain how the image is generated or edited.\n"
-        f"- **Do not** describe editing steps or transformations.\n"
-        f"- **Only output the final visual content.**\n"
-        f"- **List at most 10 items**. If more objects could be extracted, include only the 10 most important or visually dominant ones."
-        f"- If spatial or positional details are specified (e.g., 'on the left', 'in front of'), retain them in the list.\n"
-        f"- **If the prompt says to remove or delete something, list that object as well and write: (should not be present).**\n\n"
+        + OBJECT_GUIDELINES
     )
 
     if has_images:
@@ -135,12 +143,13 @@ def flag_weak_prompt(prompt):
 # --- Image Loader ---
 def load_image(path):
     try:
-        return client.files.upload(file=path)
+        return cached_upload(client, path)
     except Exception as e:
         logger.info(f"⚠️ Failed to load image {path}: {e}")
         return None
 
 # --- Gemini Call ---
+@stage("find_objects")
 def find_objects(task, topic, prompt, image_paths,json_path):
     instruction = build_instruction(task, topic, prompt, len(image_paths))
     contents = [instruction]
@@ -152,9 +161,11 @@ def find_objects(task, topic, prompt, image_paths,json_path):
 
     try:
         logger.info(f"model: {model}" )
-        response = client.models.generate_content(
+        response = call_with_retry(
+            client.models.generate_content,
             model=model,
             contents=contents,
+            limiter=limiter,
         )
         return response.text.strip()
         
@@ -193,11 +204,14 @@ def process_json_file(json_path, output_path=None):
         json.dump(data, f, indent=2)
     logger.info(f"output: {model_output}")
     logger.info(f"✅ Saved objects to {output_path}")
-    time.sleep(10)
 
 # --- Batch Process Folder ---
-def batch_process(folder_path):
+def batch_process(folder_path, manifest=None):
     logger.info(f"Start processing {folder_path}")
+    if manifest is not None:
+        for json_path in manifest.pending_objects(os.path.basename(os.path.normpath(folder_path))):
+            process_json_file(json_path)
+        return
     for root, dirs, files in sorted(os.walk(folder_path), key=lambda x: x[0]):
         for file in sorted(files):
             if file.endswith("metadata.json"):
@@ -207,6 +221,9 @@ def batch_process(folder_path):
 if __name__ == "__main__":
     root = 'YOUR-DATA-ROOT'
     tasks = ['TIE','TIG','SRIG','SRIE','MRIG','MRIE']
+    manifest = Manifest(root)
+    manifest.refresh(tasks)
     for task in tasks:
         logger.info(f'processing {task}')
-        batch_process(f'{root}/{task}')
+        batch_process(f'{root}/{task}', manifest)
+    report_telemetry()
@@ -0,0 +1,243 @@
+"""Offline stand-in for `genai.Client`, for exercising the pipeline without API calls.
+
+Only the surface the scripts use is implemented: `client.files.upload/download`,
+`client.models.generate_content(model=..., contents=..., config=...)` and
+`client.batches.create/get`. Every call sleeps for `latency` seconds so
+concurrency/rate limiting behaves like it would against the real endpoint;
+batch jobs report JOB_STATE_RUNNING until `batch_latency` seconds have passed.
+With `image_output=True`, generate_content answers like an image model.
+
+`FakeOpenAIClient` does the same for `client.images.generate/edit`, and
+`DummyModel` stands in for an imagen_hub model (with its own failure rate).
+"""
+import base64
+import json
+import os
+import random
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from types import SimpleNamespace
+
+
+def tiny_png(rgb=(128, 128, 128), size=8) -> bytes:
+    """A solid-color PNG, built without PIL."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    row = b"\x00" + bytes(rgb) * size
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", size, size, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(row * size)) + chunk(b"IEND", b""))
+
+
+def isolate_caches() -> str:
+    """Point the upload and score caches at a fresh temp dir, so fake results never reach the shared ones.
+
+    Must run before the first `get_default_cache()` call. Returns the directory.
+    """
+    cache_dir = tempfile.mkdtemp(prefix="imagenworld_fake_cache_")
+    os.environ["IMAGENWORLD_UPLOAD_CACHE"] = os.path.join(cache_dir, "gemini_uploads.sqlite")
+    os.environ["IMAGENWORLD_SCORE_CACHE"] = os.path.join(cache_dir, "gemini_scores.sqlite")
+    return cache_dir
+
+
+class FakeAPIError(Exception):
+    """Mimics `google.genai.errors.APIError`, which carries the HTTP status in `.code`."""
+
+    def __init__(self, code, message=""):
+        super().__init__(f"{code} {message}".strip())
+        self.code = code
+
+
+class _FakeFiles:
+    def __init__(self, client):
+        self._client = client
+
+    def upload(self, file, config=None):
+        self._client._tick("uploads", self._client.upload_latency)
+        name = f"files/{abs(hash(file)) % 10**10}"
+        self._client._files[name] = file
+        return SimpleNamespace(name=name, uri=f"fake://{file}", mime_type="image/png")
+
+    def download(self, file):
+        with open(self._client._files[file], "rb") as f:
+            return f.read()
+
+
+class _FakeBatches:
+    def __init__(self, client):
+        self._client = client
+        self._jobs = {}
+
+    def create(self, model, src, config=None):
+        with open(self._client._files[src], "r") as f:
+            lines = [json.loads(line) for line in f if line.strip()]
+        name = f"batches/{len(self._jobs) + 1:06d}"
+        self._jobs[name] = {"created": time.monotonic(), "lines": lines, "dest": None}
+        return self.get(name)
+
+    def get(self, name):
+        job = self._jobs[name]
+        if time.monotonic() - job["created"] < self._client.batch_latency:
+            return SimpleNamespace(name=name, state=SimpleNamespace(name="JOB_STATE_RUNNING"), dest=None)
+        if job["dest"] is None:
+            job["dest"] = self._run(job["lines"])
+        return SimpleNamespace(
+            name=name, state=SimpleNamespace(name="JOB_STATE_SUCCEEDED"), dest=SimpleNamespace(file_name=job["dest"])
+        )
+
+    def _run(self, lines):
+        fd, path = tempfile.mkstemp(suffix=".jsonl", prefix="fake_batch_")
+        with os.fdopen(fd, "w") as out:
+            for line in lines:
+                if self._client._roll() < self._client.failure_rate:
+                    result = {"key": line["key"], "error": {"code": 500, "message": "INTERNAL"}}
+                else:
+                    parts = line["request"]["contents"][0]["parts"]
+                    text = self._client.responder(parts) if self._client.responder else self._client._score_text()
+                    result = {
+                        "key": line["key"],
+                        "response": {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"},
+                                                     "finish_reason": "STOP"}]},
+                    }
+                out.write(json.dumps(result) + "\n")
+        name = f"files/{os.path.basename(path)}"
+        self._client._files[name] = path
+        return name
+
+
+class _FakeModels:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents, config=None):
+        self._client._tick("requests", self._client.latency)
+        if self._client._roll() < self._client.failure_rate:
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED")
+
+        text = self._client.responder(contents) if self._client.responder else self._client._score_text()
+        prompt_tokens = sum(len(c) // 4 if isinstance(c, str) else 258 for c in contents)
+        output_tokens = len(text) // 4
+        parts = [SimpleNamespace(text=text, inline_data=None)]
+        if self._client.image_output:
+            png = tiny_png(tuple(self._client._randint(0, 255) for _ in range(3)))
+            parts.append(SimpleNamespace(text=None, inline_data=SimpleNamespace(data=png, mime_type="image/png")))
+            output_tokens += 1290
+        return SimpleNamespace(
+            text=text,
+            candidates=[SimpleNamespace(content=SimpleNamespace(parts=parts), finish_reason="STOP")],
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=prompt_tokens,
+                candidates_token_count=output_tokens,
+                total_token_count=prompt_tokens + output_tokens,
+            ),
+        )
+
+
+class FakeGeminiClient:
+    """`genai.Client` look-alike with configurable latency and 429 failure rate.
+
+    `responder(contents) -> str` overrides the response text; by default a
+    random score JSON in the scorer's schema is returned.
+    """
+
+    def __init__(self, latency=0.5, upload_latency=0.0, failure_rate=0.0, responder=None, seed=0,
+                 batch_latency=1.0, image_output=False):
+        self.latency = latency
+        self.image_output = image_output
+        self.upload_latency = upload_latency
+        self.failure_rate = failure_rate
+        self.responder = responder
+        self.batch_latency = batch_latency
+        self.files = _FakeFiles(self)
+        self.models = _FakeModels(self)
+        self.batches = _FakeBatches(self)
+        self._files = {}
+        self.counts = {"uploads": 0, "requests": 0}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _tick(self, counter, delay):
+        with self._lock:
+            self.counts[counter] += 1
+        if delay:
+            time.sleep(delay)
+
+    def _roll(self):
+        with self._lock:
+            return self._rng.random()
+
+    def _randint(self, a, b):
+        with self._lock:
+            return self._rng.randint(a, b)
+
+    def _score_text(self):
+        keys = ["prompt_relevance", "aesthetic_quality", "content_coherence", "artifacts"]
+        return json.dumps({k: self._randint(1, 5) for k in keys})
+
+
+class _FakeImages:
+    def __init__(self, client):
+        self._client = client
+
+    def _create(self):
+        self._client._tick("requests", self._client.latency)
+        if self._client._roll() < self._client.failure_rate:
+            raise FakeAPIError(429, "rate_limit_exceeded")
+        png = tiny_png(tuple(self._client._randint(0, 255) for _ in range(3)))
+        return SimpleNamespace(data=[SimpleNamespace(b64_json=base64.b64encode(png).decode())])
+
+    def generate(self, model, prompt, **kwargs):
+        return self._create()
+
+    def edit(self, model, image, prompt, **kwargs):
+        for f in image if isinstance(image, list) else [image]:
+            f.read()
+        return self._create()
+
+
+class FakeOpenAIClient(FakeGeminiClient):
+    """`openai.OpenAI` look-alike for the image endpoints, with the same latency/failure knobs."""
+
+    def __init__(self, latency=0.5, failure_rate=0.0, seed=0):
+        super().__init__(latency=latency, failure_rate=failure_rate, seed=seed)
+        self.images = _FakeImages(self)
+
+
+class DummyModel:
+    """Stands in for an imagen_hub model: returns a flat image after `delay` seconds.
+
+    A `failure_rate` fraction of calls raise RuntimeError, like a CUDA OOM would.
+    """
+
+    def __init__(self, delay: float = 0.0, size: int = 64, failure_rate: float = 0.0, seed: int = 0):
+        self.delay = delay
+        self.size = size
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _maybe_fail(self):
+        if not self.failure_rate:
+            return
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.failure_rate:
+            raise RuntimeError("CUDA out of memory (simulated)")
+
+    def infer_one_image(self, prompt=None, instruct_prompt=None, src_image=None, input_images=None, **kwargs):
+        from PIL import Image
+        if self.delay:
+            time.sleep(self.delay)
+        self._maybe_fail()
+        text = prompt or instruct_prompt or ""
+        color = tuple((hash(text) >> shift) & 0xFF for shift in (0, 8, 16))
+        return Image.new("RGB", (self.size, self.size), color)
+
+    def infer_batch(self, prompts, input_images=None, **kwargs):
+        # One delay per batch, like a real batched forward pass
+        if self.delay:
+            time.sleep(self.delay)
+        self._maybe_fail()
+        return [DummyModel(0.0, self.size).infer_one_image(prompt=p) for p in prompts]
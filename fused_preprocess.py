@@ -0,0 +1,181 @@
+"""Single-pass preprocessing: prompt refinement + object extraction in one call.
+
+gemini_preprocess.py and extract_objects.py each walk the whole tree, upload
+the same cond images and make one call per metadata.json. This stage asks for
+both `prompt_refined` and `objects` in a single structured-JSON response, and
+only falls back to the two separate calls when that response can't be parsed.
+"""
+import json
+import logging
+import os
+import re
+
+import extract_objects
+import gemini_preprocess
+from extract_objects import OBJECT_GUIDELINES, parse_bullet_list
+from gemini_preprocess import build_rewrite_guidelines, flag_weak_prompt, load_image
+from manifest import Manifest
+from telemetry import report as report_telemetry, stage
+from rate_control import call_with_retry
+
+logger = logging.getLogger(__name__)
+
+client = gemini_preprocess.client
+model = gemini_preprocess.model
+limiter = gemini_preprocess.limiter
+# Fallback calls should share the same client and pacing
+extract_objects.client = client
+extract_objects.limiter = limiter
+
+MAX_OBJECTS = 10
+
+
+# --- Prompt Builder ---
+def build_fused_instruction(task, topic, original_prompt, image_count):
+    instruction = build_rewrite_guidelines(task, topic, original_prompt, image_count)
+    instruction += (
+        "\nThen, for your rewritten prompt, list the **objects, elements, or visual components "
+        "that must appear in the final output image.**\n\n"
+        + OBJECT_GUIDELINES
+    )
+    if image_count > 0:
+        instruction += "- Consider the content of the provided images or reference images if relevant.\n"
+    instruction += (
+        "\n**Output Format:**\n"
+        "Return a single JSON object exactly like this:\n\n"
+        '{"prompt_refined": "<the rewritten prompt>", "objects": ["red sports car", "highway", "sunset sky"]}\n\n'
+        "**Do not include any explanations or extra text outside the JSON object.**\n"
+    )
+    logger.info(instruction)
+    return instruction
+
+
+def parse_fused_response(text):
+    """Return (prompt_refined, objects); either is None if missing or malformed."""
+    if not text:
+        return None, None
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text.strip(), flags=re.IGNORECASE)
+    m = re.search(r"\{[\s\S]*\}", text)
+    if not m:
+        return None, None
+    try:
+        data = json.loads(m.group(0))
+    except json.JSONDecodeError:
+        return None, None
+    if not isinstance(data, dict):
+        return None, None
+
+    refined = data.get("prompt_refined")
+    refined = refined.strip() if isinstance(refined, str) and refined.strip() else None
+
+    objects = data.get("objects")
+    if isinstance(objects, str):
+        objects = parse_bullet_list(objects)
+    if isinstance(objects, list):
+        objects = [o.strip() for o in objects if isinstance(o, str) and o.strip()][:MAX_OBJECTS]
+    if not objects:
+        objects = None
+    return refined, objects
+
+
+# --- Gemini Call ---
+@stage("refine_and_extract")
+def refine_and_extract(task, topic, prompt, image_paths, json_path):
+    instruction = build_fused_instruction(task, topic, prompt, len(image_paths))
+    contents = [instruction]
+
+    for path in image_paths:
+        img = load_image(path)
+        if img is not None:
+            contents.append(img)
+
+    try:
+        logger.info(f"model: {model}")
+        response = call_with_retry(
+            client.models.generate_content,
+            model=model,
+            contents=contents,
+            config={"response_mime_type": "application/json"},
+            limiter=limiter,
+        )
+        return parse_fused_response(response.text)
+    except Exception as e:
+        logger.info(f"❌ Gemini API error: {e} {json_path}")
+        return None, None
+
+
+# --- Process Single JSON ---
+def process_json_file(json_path, output_path=None):
+    with open(json_path, 'r') as f:
+        data = json.load(f)
+
+    has_refined = bool(data.get("prompt_refined", "").strip())
+    has_objects = bool(data.get("objects"))
+    if has_refined and has_objects:
+        logger.info(f"⏭️ Already processed {json_path}. Skipping.")
+        return
+
+    task = data.get("task", "")
+    topic = data.get("topic", "")
+    prompt = data.get("prompt", "").strip()
+    cond_images = data.get("cond_images", [])
+    image_dir = os.path.dirname(json_path)
+    image_paths = [os.path.join(image_dir, img) for img in cond_images]
+
+    if not prompt:
+        logger.info(f"⚠️ No prompt in {json_path}. Skipping.")
+        return
+
+    if flag_weak_prompt(prompt):
+        logger.info(f"🔍 Weak prompt in {json_path}: '{prompt}'")
+
+    if has_refined:
+        # Only the object list is missing; that's one call either way
+        refined, objects = data["prompt_refined"].strip(), None
+    else:
+        refined, objects = refine_and_extract(task, topic, prompt, image_paths, json_path)
+        if refined is None:
+            logger.info(f"↩️ Fused response unusable for {json_path}; falling back to separate calls")
+            refined = gemini_preprocess.clarify_prompt(task, topic, prompt, image_paths, json_path)
+            objects = None
+        data["prompt_refined"] = refined
+
+    if has_objects:
+        objects = data["objects"]
+    elif objects is None and refined:
+        model_output = extract_objects.find_objects(task, topic, refined, image_paths, json_path)
+        objects = parse_bullet_list(model_output)
+    data["objects"] = objects or []
+
+    output_path = output_path or json_path
+    with open(output_path, 'w') as f:
+        json.dump(data, f, indent=2)
+    logger.info(f"✅ Saved refined prompt and {len(data['objects'])} objects to {output_path}")
+    logger.info(f"Modified: {refined}")
+
+
+# --- Batch Process Folder ---
+def batch_process(folder_path, manifest=None):
+    logger.info(f"Start processing {folder_path}")
+    if manifest is not None:
+        task = os.path.basename(os.path.normpath(folder_path))
+        pending = set(manifest.pending_prompt_refined(task)) | set(manifest.pending_objects(task))
+        for json_path in sorted(pending):
+            process_json_file(json_path)
+        return
+    for root, dirs, files in sorted(os.walk(folder_path), key=lambda x: x[0]):
+        for file in sorted(files):
+            if file.endswith("metadata.json"):
+                process_json_file(os.path.join(root, file))
+
+
+# --- Example usage ---
+if __name__ == "__main__":
+    root = 'YOUR-DATA-ROOT'
+    tasks = ['TIE','TIG','SRIG','SRIE','MRIG','MRIE']
+    manifest = Manifest(root)
+    manifest.refresh(tasks)
+    for task in tasks:
+        logger.info(f'processing {task}')
+        batch_process(f'{root}/{task}', manifest)
+    report_telemetry()
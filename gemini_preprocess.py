@@ -3,8 +3,11 @@ import os
 from io import BytesIO
 from PIL import Image
 from google import genai
-import time
 import logging
+from upload_cache import cached_upload
+from rate_control import AdaptiveRateLimiter, call_with_retry
+from manifest import Manifest
+from telemetry import report as report_telemetry, stage
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,6 +18,8 @@ logger = logging.getLogger(__name__)
 key = 'YOUR-GEMINI-KEY'
 client = genai.Client(api_key=key)
 model = "gemini-2.5-flash-preview-05-20"
+# Paces requests and backs off on 429/5xx instead of sleeping a fixed time per entry
+limiter = AdaptiveRateLimiter(requests_per_minute=60)
 
 # --- Task Definitions ---
 TASK_DEFINITIONS = {
@@ -64,7 +69,7 @@ id_to_topic = {
 }
 # --- Prompt Builder ---
 
-def build_instruction(task, topic, original_prompt, image_count):
+def build_rewrite_guidelines(task, topic, original_prompt, image_count):
     definition = TASK_DEFINITIONS.get(id_to_task[task], "No formal definition provided.")
     if definition == "No formal definition provided.":
         logger.warning("Oops")
@@ -96,6 +101,10 @@ def build_instruction(task, topic, original_prompt, image_count):
         instruction += "- Clearly specify which image is the source image for editing.\n"
 
     instruction += "- **Do NOT change the original intent or visual outcome described by the prompt**\n\n"
+    return instruction
+
+def build_instruction(task, topic, original_prompt, image_count):
+    instruction = build_rewrite_guidelines(task, topic, original_prompt, image_count)
     instruction += "\nReturn only the rewritten prompt."
     logger.info(instruction)
     return instruction
@@ -109,12 +118,13 @@ def flag_weak_prompt(prompt):
 # --- Image Loader ---
 def load_image(path):
     try:
-        return client.files.upload(file=path)
+        return cached_upload(client, path)
     except Exception as e:
         logger.info(f"⚠️ Failed to load image {path}: {e}")
         return None
 
 # --- Gemini Call ---
+@stage("clarify_prompt")
 def clarify_prompt(task, topic, prompt, image_paths,json_path):
     instruction = build_instruction(task, topic, prompt, len(image_paths))
     contents = [instruction]
@@ -126,9 +136,11 @@ def clarify_prompt(task, topic, prompt, image_paths,json_path):
 
     try:
         logger.info(f"model: {model}" )
-        response = client.models.generate_content(
+        response = call_with_retry(
+            client.models.generate_content,
             model=model,
             contents=contents,
+            limiter=limiter,
         )
         return response.text.strip()
         
@@ -167,11 +179,14 @@ def process_json_file(json_path, output_path=None):
         json.dump(data, f, indent=2)
     logger.info(f"✅ Saved refined prompt to {output_path}")
     logger.info(f"Modified: { refined}")
-    time.sleep(10)
 
 # --- Batch Process Folder ---
-def batch_process(folder_path):
+def batch_process(folder_path, manifest=None):
     logger.info(f"Start processing {folder_path}")
+    if manifest is not None:
+        for json_path in manifest.pending_prompt_refined(os.path.basename(os.path.normpath(folder_path))):
+            process_json_file(json_path)
+        return
     for root, dirs, files in sorted(os.walk(folder_path), key=lambda x: x[0]):
         for file in sorted(files):
             if file.endswith("metadata.json"):
@@ -181,7 +196,10 @@ def batch_process(folder_path):
 if __name__ == "__main__":
     root = 'YOUR-DATA-ROOT'
     tasks = ['TIE','TIG','SRIG','SRIE','MRIG','MRIE']
+    manifest = Manifest(root)
+    manifest.refresh(tasks)
     for task in tasks:
         logger.info(f'processing {task}')
-        batch_process(f'{root}/{task}')
+        batch_process(f'{root}/{task}', manifest)
+    report_telemetry()
     #batch_process("/home/samin/ImagenHub2_data/ishengfang")
@@ -0,0 +1,688 @@
+"""Provider-agnostic generation engine shared by the inference scripts.
+
+Every generator, whether an image API (gpt-image-1, Gemini) or an imagen_hub
+model, is an adapter with the same small surface: where its output goes, how
+one benchmark entry becomes an image, and how that image is written. The
+engine owns everything else, for every generator at once:
+
+- scheduling: each generator gets its own worker pool and rate limiter, and all
+  generators run side by side, so one invocation covers many models;
+- prefetch and batching: metadata and conditioning images are loaded ahead of
+  the workers, and compatible entries are grouped for models with `infer_batch`;
+- caching: an entry's metadata and decoded images are loaded once and shared by
+  every generator that needs them;
+- resume: outputs are written through a temp file, and entries whose output
+  already exists are skipped, so a sweep can be stopped and restarted;
+- metrics: images, failures, skips and request latency per generator.
+
+Generators are named "<kind>[:<model>[:<output name>]]", e.g. "gpt",
+"gemini:gemini-2.5-flash-image-preview", "hub:UltraEdit:ultraedit.png", "dummy".
+
+    python generation.py --generators gpt gemini hub:UltraEdit hub:OmniGen2 --root YOUR-DATA-ROOT
+    python generation.py --generators gpt gemini dummy --root /tmp/fake-tree --fake-latency 1
+
+    engine = GenerationEngine([make_generator("gpt"), make_generator("hub:UltraEdit")], root, ["TIG"])
+    report = asyncio.run(engine.run())
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional
+
+from batching import Batcher, group_key, supports_batching
+from manifest import Manifest
+from rate_control import AdaptiveRateLimiter, call_with_retry
+from telemetry import percentile, report as report_telemetry, stage
+
+logger = logging.getLogger(__name__)
+
+TASKS = ["TIG", "TIE", "SRIG", "SRIE", "MRIG", "MRIE"]
+JSON_NAME = "metadata.json"
+
+ID_TO_TASK = {
+    "TIG": "Text-guided Image Generation",
+    "TIE": "Text-guided Image Editing",
+    "SRIG": "Single Reference-guided Image Generation",
+    "SRIE": "Single Reference-guided Image Editing",
+    "MRIG": "Multiple References-guided Image Generation",
+    "MRIE": "Multiple References-guided Image Editing"
+}
+
+TASK_DEFINITIONS = {
+    "Text-guided Image Generation": (
+        "Generate a completely new image based only on a descriptive text prompt. "
+        "No source or reference images are provided."
+    ),
+    "Text-guided Image Editing": (
+        "Edit an existing image using a descriptive text prompt. "
+        "Decide what to modify in the image based on the prompt. No mask or marked region is given."
+    ),
+    "Single Reference-guided Image Generation": (
+        "Create a new image by combining visual cues from one reference image "
+        "with instructions from a descriptive text prompt."
+    ),
+    "Single Reference-guided Image Editing": (
+        "Edit an existing image using both a reference image and a text prompt. "
+        "Use the reference image to guide the style or content of the edits."
+    ),
+    "Multiple References-guided Image Generation": (
+        "Generate a new image using several reference images along with a text prompt. "
+        "The new image should reflect visual elements from the references and follow the prompt’s description."
+    ),
+    "Multiple References-guided Image Editing": (
+        "Modify an existing image using multiple reference images and a descriptive text prompt. "
+        "The edits should be guided by both the style or content of the references and the instructions in the prompt."
+    )
+}
+
+ID_TO_TOPIC = {
+    "I": "Information Graphics",
+    "A": "Artworks",
+    "S": "Screenshots",
+    "CG": "Computer Graphics",
+    "P": "Photorealistic Images",
+    "T": "Textual Graphics"
+}
+
+# Metadata + decoded cond images of this many entries are kept for the other generators
+JOB_CACHE_SIZE = 128
+PREFETCH_DEPTH = 4
+LOAD_WORKERS = 4
+WRITE_WORKERS = 2
+LOG_EVERY = 10
+
+
+# --- Entries ---
+def load_metadata(json_path):
+    try:
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"❌ Failed to load JSON: {json_path}: {e}")
+        return None
+
+
+def load_images(image_names, folder_path):
+    from PIL import Image
+    images = []
+    for img_name in image_names:
+        img_path = os.path.join(folder_path, img_name)
+        if os.path.exists(img_path):
+            try:
+                images.append(Image.open(img_path).convert("RGB"))
+            except Exception as e:
+                logger.error(f"❌ Failed to load image {img_path}: {e}")
+    return images
+
+
+def build_prompt(task_name, topic, user_prompt):
+    task_definition = TASK_DEFINITIONS.get(task_name, "")
+    topic_description = ID_TO_TOPIC.get(topic, topic)
+    return (
+        f"You are an expert visual generation assistant.\n\n"
+        f"Task: {task_name}\n"
+        f"Task Definition: {task_definition}\n"
+        f"Visual Domain: {topic_description}\n"
+        f"User Objective: {user_prompt}\n\n"
+        f"Please generate an image that fulfills the user's objective, adheres to the task definition, "
+        f"and fits within the specified visual domain."
+    )
+
+
+def infer_task_name(input_path):
+    for tid, name in ID_TO_TASK.items():
+        if tid in input_path:
+            return name
+    return None
+
+
+@dataclass
+class Job:
+    """One benchmark entry, as every generator sees it."""
+    entry_path: str
+    task_name: str
+    metadata: Dict[str, Any]
+    images: Optional[List[Any]] = None  # decoded cond images, loaded by generators that need them
+
+    @property
+    def cond_images(self) -> List[str]:
+        return self.metadata.get("cond_images", [])
+
+    @property
+    def cond_paths(self) -> List[str]:
+        paths = [os.path.join(self.entry_path, name) for name in self.cond_images]
+        return [p for p in paths if os.path.exists(p)]
+
+    def prompt(self, prep: bool = True) -> str:
+        """The task-framed prompt (API models), or the bare refined prompt (prep=False)."""
+        user_prompt = self.metadata.get("prompt_refined", "")
+        if not prep:
+            return user_prompt
+        return build_prompt(self.task_name, self.metadata.get("topic", "General"), user_prompt)
+
+    def decoded_images(self) -> List[Any]:
+        if self.images is None:
+            self.images = load_images(self.cond_images, self.entry_path)
+        return self.images
+
+
+def load_job(entry_path: str) -> Optional[Job]:
+    task_name = infer_task_name(entry_path)
+    if not task_name:
+        logger.error(f"❌ Could not infer task name from path: {entry_path}")
+        return None
+    metadata = load_metadata(os.path.join(entry_path, JSON_NAME))
+    if not metadata:
+        return None
+    return Job(entry_path, task_name, metadata)
+
+
+def write_image(path: str, output: Any, reencode: bool = False):
+    """Write PNG bytes or a PIL image via a temp file, so an interrupted write never looks finished."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    if isinstance(output, (bytes, bytearray)) and not reencode:
+        with open(tmp, "wb") as f:
+            f.write(output)
+    else:
+        from PIL import Image
+        image = Image.open(BytesIO(output)) if isinstance(output, (bytes, bytearray)) else output
+        image.save(tmp, format="PNG")
+    os.replace(tmp, path)
+
+
+# --- Metrics ---
+@dataclass
+class GeneratorStats:
+    saved: int = 0
+    failed: int = 0
+    skipped: int = 0
+    requests: int = 0
+    latencies: List[float] = field(default_factory=list)
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        return {
+            "saved": self.saved,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "requests": self.requests,
+            "latency_p50": round(percentile(self.latencies, 0.5), 3),
+            "latency_p95": round(percentile(self.latencies, 0.95), 3),
+            "images_per_min": round(self.saved / elapsed * 60, 2) if elapsed else 0.0,
+            "elapsed": round(elapsed, 2),
+        }
+
+
+# --- Generators ---
+class Generator:
+    """One model or API. Subclasses implement `generate`; the engine does the rest."""
+
+    kind = "generator"
+
+    def __init__(self, model: str, output_name: str, in_model_output: bool = True, concurrency: int = 1,
+                 batch_size: int = 1, max_wait: float = 2.0, prep_prompt: bool = True, reencode: bool = False):
+        self.model_name = model
+        self.output_name = output_name
+        self.in_model_output = in_model_output
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.prep_prompt = prep_prompt
+        self.reencode = reencode
+        self.stats = GeneratorStats()
+
+    @property
+    def name(self) -> str:
+        return f"{self.kind}:{self.model_name}"
+
+    def output_path(self, entry_path: str) -> str:
+        if self.in_model_output:
+            return os.path.join(entry_path, "model_output", self.output_name)
+        return os.path.join(entry_path, self.output_name)
+
+    def prepare(self, job: Job):
+        """Runs on the loader threads ahead of `generate`."""
+
+    def generate(self, job: Job) -> Any:
+        """PNG bytes or a PIL image for one entry; raises on failure."""
+        raise NotImplementedError
+
+    def generate_batch(self, jobs: List[Job]) -> List[Any]:
+        outputs = []
+        for job in jobs:
+            try:
+                outputs.append(self.generate(job))
+            except Exception as e:
+                logger.error(f"🚫 {self.name}: error in {job.entry_path}: {e}")
+                outputs.append(None)
+        return outputs
+
+    def save(self, entry_path: str, output: Any):
+        write_image(self.output_path(entry_path), output, self.reencode)
+
+
+class OpenAIGenerator(Generator):
+    kind = "gpt"
+
+    def __init__(self, client, model: str = "gpt-image-1", output_name: str = "gpt-image-1.png",
+                 limiter: Optional[AdaptiveRateLimiter] = None, concurrency: int = 4, quality: str = "medium"):
+        super().__init__(model, output_name, in_model_output=False, concurrency=concurrency)
+        self.client = client
+        # Image generation quotas are low; start slow and let AIMD find the real limit
+        self.limiter = limiter or AdaptiveRateLimiter(requests_per_minute=10)
+        self.quality = quality
+
+    def generate(self, job: Job) -> bytes:
+        prompt = job.prompt(self.prep_prompt)
+        image_inputs = [open(p, "rb") for p in job.cond_paths]
+        try:
+            def edit(**kwargs):
+                # The SDK consumes the file handles; rewind them for each attempt
+                for f in image_inputs:
+                    f.seek(0)
+                return self.client.images.edit(image=image_inputs, **kwargs)
+
+            # call_with_retry labels telemetry by the callable's name: "edit" or "generate"
+            request = edit if image_inputs else self.client.images.generate
+            result = call_with_retry(
+                request, limiter=self.limiter, model=self.model_name, prompt=prompt, quality=self.quality,
+            )
+            return base64.b64decode(result.data[0].b64_json)
+        finally:
+            for f in image_inputs:
+                f.close()
+
+
+class GeminiGenerator(Generator):
+    kind = "gemini"
+
+    def __init__(self, client, model: str = "gemini-2.5-flash-image-preview", output_name: str = "gemini.png",
+                 limiter: Optional[AdaptiveRateLimiter] = None, concurrency: int = 4):
+        super().__init__(model, output_name, in_model_output=False, concurrency=concurrency, reencode=True)
+        self.client = client
+        self.limiter = limiter or AdaptiveRateLimiter(requests_per_minute=10)
+
+    def generate(self, job: Job) -> bytes:
+        from google.genai import types
+        from upload_cache import cached_upload
+        contents = [job.prompt(self.prep_prompt)] + [cached_upload(self.client, p) for p in job.cond_paths]
+        response = call_with_retry(
+            self.client.models.generate_content,
+            limiter=self.limiter,
+            model=self.model_name,
+            contents=contents,
+            config=types.GenerateContentConfig(response_modalities=['TEXT', 'IMAGE']),
+        )
+        for part in response.candidates[0].content.parts:
+            if part.inline_data is not None:
+                return part.inline_data.data
+        raise RuntimeError("no image in the response")
+
+
+# Per-model sampling settings: (text only, with cond images)
+HUB_KWARGS = {
+    "OmniGen2": (
+        dict(text_guidance_scale=4.0, image_guidance_scale=1.0, max_sequence_length=4096),
+        dict(text_guidance_scale=5.0, image_guidance_scale=2.8, max_sequence_length=4096),
+    ),
+    "BagelGenration": ({}, dict(cfg_text_scale=4, cfg_img_scale=1.3)),
+}
+# Models that take no `input_images` when given several cond images
+HUB_PROMPT_ONLY_MULTI = {"BagelGenration"}
+
+
+def hub_kwargs(model_name: str, has_images: bool) -> Dict[str, Any]:
+    return dict(HUB_KWARGS.get(model_name, ({}, {}))[int(has_images)])
+
+
+def hub_infer(model, model_name: str, prompt: str, images: List[Any]):
+    """One imagen_hub call, with each model's calling convention for 0, 1 or several cond images."""
+    with stage("infer_one_image", model=model_name):
+        return _hub_infer(model, model_name, prompt, images)
+
+
+def _hub_infer(model, model_name: str, prompt: str, images: List[Any]):
+    if not images:
+        return model.infer_one_image(prompt=prompt, **hub_kwargs(model_name, False))
+    if len(images) == 1:
+        return model.infer_one_image(instruct_prompt=prompt, src_image=images[0])
+    if model_name in HUB_PROMPT_ONLY_MULTI:
+        return model.infer_one_image(prompt=prompt, **hub_kwargs(model_name, True))
+    return model.infer_one_image(prompt=prompt, input_images=images, **hub_kwargs(model_name, True))
+
+
+class HubGenerator(Generator):
+    """An imagen_hub model, loaded on first use. One worker: the model owns the device."""
+
+    kind = "hub"
+
+    def __init__(self, model_name: str, output_name: Optional[str] = None, model=None, batch_size: int = 1,
+                 max_wait: float = 2.0, prep_prompt: bool = False, device: Optional[str] = None):
+        super().__init__(model_name, output_name or f"{model_name.lower()}.png", batch_size=batch_size,
+                         max_wait=max_wait, prep_prompt=prep_prompt)
+        self.model = model
+        self.device = device
+        self._load_lock = threading.Lock()
+
+    def bind_device(self):
+        """CUDA's current device is per thread; point the calling thread at this model's GPU."""
+        if self.device and self.device.startswith("cuda:"):
+            import torch
+            torch.cuda.set_device(int(self.device.split(":", 1)[1]))
+
+    def load(self):
+        self.bind_device()
+        with self._load_lock:
+            if self.model is None:
+                import imagen_hub
+                logger.info(f"📦 Loading {self.model_name}")
+                self.model = imagen_hub.load(self.model_name)
+        return self.model
+
+    def prepare(self, job: Job):
+        job.decoded_images()
+
+    def generate(self, job: Job):
+        return hub_infer(self.load(), self.model_name, job.prompt(self.prep_prompt), job.decoded_images())
+
+    def generate_batch(self, jobs: List[Job]) -> List[Any]:
+        model = self.load()  # also binds this worker thread to the model's device
+        if len(jobs) > 1 and supports_batching(model):
+            has_images = bool(jobs[0].decoded_images())
+            try:
+                with stage("infer_batch", model=self.model_name):
+                    outputs = model.infer_batch(
+                        prompts=[job.prompt(self.prep_prompt) for job in jobs],
+                        input_images=[job.decoded_images() for job in jobs] if has_images else None,
+                        **hub_kwargs(self.model_name, has_images),
+                    )
+                if len(outputs) == len(jobs):
+                    return outputs
+                logger.warning(f"⚠️ infer_batch returned {len(outputs)} images for {len(jobs)} prompts; "
+                               f"falling back to per-item")
+            except Exception as e:
+                logger.warning(f"⚠️ Batched inference failed ({e}); falling back to per-item")
+        return super().generate_batch(jobs)
+
+
+# --- Registry ---
+GENERATORS = {"gpt": OpenAIGenerator, "gemini": GeminiGenerator, "hub": HubGenerator, "dummy": HubGenerator}
+API_KEY_ENV = {"gpt": "OPENAI_API_KEY", "gemini": "GOOGLE_API_KEY"}
+
+
+def make_generator(spec: str, concurrency: Optional[int] = None, rpm: Optional[float] = None,
+                   batch_size: int = 1, fake_latency: Optional[float] = None,
+                   fake_failure_rate: float = 0.0) -> Generator:
+    """Build a generator from "<kind>[:<model>[:<output name>]]".
+
+    With `fake_latency`, API generators use the offline fake clients and "dummy"
+    models take that many seconds per call; `fake_failure_rate` applies to both.
+    """
+    kind, _, rest = spec.partition(":")
+    model, _, output_name = rest.partition(":")
+    if kind not in GENERATORS:
+        raise ValueError(f"Unknown generator {kind!r}; expected one of {sorted(GENERATORS)}")
+    if kind in ("hub", "dummy"):
+        if kind == "hub" and not model:
+            raise ValueError("hub generators need a model name, e.g. hub:UltraEdit")
+        instance = None
+        if kind == "dummy":
+            from fake_client import DummyModel
+            instance = DummyModel(fake_latency or 0.0, failure_rate=fake_failure_rate)
+        return HubGenerator(model or "Dummy", output_name or None, model=instance, batch_size=batch_size)
+
+    if fake_latency is not None:
+        from fake_client import FakeGeminiClient, FakeOpenAIClient, isolate_caches
+        isolate_caches()
+        if kind == "gpt":
+            client = FakeOpenAIClient(latency=fake_latency, failure_rate=fake_failure_rate)
+        else:
+            client = FakeGeminiClient(latency=fake_latency, failure_rate=fake_failure_rate, image_output=True)
+    else:
+        api_key = os.getenv(API_KEY_ENV[kind], "").strip()
+        if not api_key:
+            raise RuntimeError(f"❌ {API_KEY_ENV[kind]} environment variable not set.")
+        if kind == "gpt":
+            from openai import OpenAI
+            client = OpenAI(api_key=api_key)
+        else:
+            from google import genai
+            client = genai.Client(api_key=api_key)
+    kwargs = {}
+    if model:
+        kwargs["model"] = model
+    if output_name:
+        kwargs["output_name"] = output_name
+    if rpm:
+        kwargs["limiter"] = AdaptiveRateLimiter(requests_per_minute=rpm, max_rpm=rpm)
+    if concurrency:
+        kwargs["concurrency"] = concurrency
+    return GENERATORS[kind](client, **kwargs)
+
+
+# --- Engine ---
+class GenerationEngine:
+    def __init__(self, generators: List[Generator], root: str, tasks: Optional[List[str]] = None,
+                 manifest: Optional[Manifest] = None):
+        names = [(g.in_model_output, g.output_name) for g in generators]
+        if len(set(names)) != len(names):
+            raise ValueError("Two generators would write the same output file")
+        self.generators = generators
+        self.root = root
+        self.tasks = tasks or TASKS
+        self.manifest = manifest
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._jobs_lock = threading.Lock()
+
+    def pending(self, gen: Generator) -> Iterator[str]:
+        """Entry dirs with metadata.json and no output from `gen` yet."""
+        for task in self.tasks:
+            task_dir = os.path.join(self.root, task)
+            if not os.path.isdir(task_dir):
+                logger.warning(f"⚠️ Missing task folder {task_dir}")
+                continue
+            if self.manifest is not None:
+                entries = self.manifest.pending_outputs(gen.output_name, task, gen.in_model_output)
+            else:
+                entries = [os.path.join(task_dir, e) for e in sorted(os.listdir(task_dir))]
+            for entry_path in entries:
+                if not os.path.exists(os.path.join(entry_path, JSON_NAME)):
+                    continue
+                if os.path.exists(gen.output_path(entry_path)):
+                    gen.stats.skipped += 1
+                    continue
+                yield entry_path
+
+    def job(self, entry_path: str) -> Optional[Job]:
+        """Load an entry once for all generators (LRU of the last JOB_CACHE_SIZE entries)."""
+        with self._jobs_lock:
+            if entry_path in self._jobs:
+                self._jobs.move_to_end(entry_path)
+                return self._jobs[entry_path]
+        job = load_job(entry_path)
+        if job is None:
+            return None
+        with self._jobs_lock:
+            job = self._jobs.setdefault(entry_path, job)
+            while len(self._jobs) > JOB_CACHE_SIZE:
+                self._jobs.popitem(last=False)
+        return job
+
+    def _prepare(self, gen: Generator, entry_path: str) -> Optional[Job]:
+        job = self.job(entry_path)
+        if job is not None:
+            gen.prepare(job)
+        return job
+
+    async def _feed(self, gen: Generator, queue: asyncio.Queue, loader: ThreadPoolExecutor):
+        """Load entries PREFETCH_DEPTH ahead of the workers and queue them in compatible batches."""
+        loop = asyncio.get_running_loop()
+        batcher = Batcher(gen.batch_size, gen.max_wait)
+        loading = deque()
+
+        async def flush(batches: List[List[Job]]):
+            for jobs in batches:
+                await queue.put(jobs)
+
+        async def take():
+            # A stalled load must not hold back a partial batch past max_wait; asyncio.wait
+            # (unlike wait_for) leaves the load running when it times out
+            while not (await asyncio.wait([loading[0]], timeout=batcher.timeout()))[0]:
+                await flush(batcher.expired())
+            job = loading.popleft().result()
+            if job is None:
+                gen.stats.failed += 1
+                return
+            ready = batcher.add(group_key(job.task_name, job.images or []), job)
+            await flush(([ready] if ready else []) + batcher.expired())
+
+        for entry_path in self.pending(gen):
+            loading.append(loop.run_in_executor(loader, self._prepare, gen, entry_path))
+            if len(loading) >= PREFETCH_DEPTH:
+                await take()
+        while loading:
+            await take()
+        await flush(batcher.drain())
+
+    @staticmethod
+    def _generate(gen: Generator, jobs: List[Job]) -> List[Any]:
+        with stage(f"generate/{gen.kind}", model=gen.model_name):
+            return gen.generate_batch(jobs)
+
+    def _save(self, gen: Generator, job: Job, output: Any) -> bool:
+        try:
+            gen.save(job.entry_path, output)
+        except Exception as e:
+            logger.error(f"🚫 {gen.name}: failed to save {job.entry_path}: {e}")
+            return False
+        logger.info(f"✅ {gen.name}: saved {gen.output_path(job.entry_path)}")
+        return True
+
+    @staticmethod
+    def _count_save(gen: Generator, future: asyncio.Future):
+        # Runs on the event loop, so the counters are only touched from one thread
+        if not future.cancelled() and future.result():
+            gen.stats.saved += 1
+        else:
+            gen.stats.failed += 1
+
+    async def _worker(self, gen: Generator, queue: asyncio.Queue, executor: ThreadPoolExecutor,
+                      writer: ThreadPoolExecutor, writes: List[asyncio.Future], start: float):
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs = await queue.get()
+            if jobs is None:
+                return
+            # Another run (or a serial script) may have produced it since we listed the entry
+            todo = [job for job in jobs if not os.path.exists(gen.output_path(job.entry_path))]
+            gen.stats.skipped += len(jobs) - len(todo)
+            if not todo:
+                continue
+            t0 = time.perf_counter()
+            try:
+                outputs = await loop.run_in_executor(executor, self._generate, gen, todo)
+            except Exception as e:
+                logger.error(f"🚫 {gen.name}: error in {todo[0].entry_path}: {e}")
+                outputs = [None] * len(todo)
+            gen.stats.requests += 1
+            gen.stats.latencies.append(time.perf_counter() - t0)
+            for job, output in zip(todo, outputs):
+                if output is None:
+                    gen.stats.failed += 1
+                    continue
+                # Written right away (on the writer pool) so finished work survives an interruption
+                write = loop.run_in_executor(writer, self._save, gen, job, output)
+                write.add_done_callback(lambda f, gen=gen: self._count_save(gen, f))
+                writes.append(write)
+            if gen.stats.requests % LOG_EVERY == 0:
+                rate = gen.stats.saved / max(time.perf_counter() - start, 1e-9) * 60
+                pacing = f", pacing at {gen.limiter.rpm:.0f} requests/min" if hasattr(gen, "limiter") else ""
+                logger.info(f"📈 {gen.name}: {gen.stats.saved} saved, {gen.stats.failed} failed "
+                            f"(~{rate:.1f} images/min{pacing})")
+
+    async def _run_generator(self, gen: Generator, loader: ThreadPoolExecutor,
+                             writer: ThreadPoolExecutor) -> Dict[str, Any]:
+        start = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=gen.concurrency * 2)
+        writes: List[asyncio.Future] = []
+        with ThreadPoolExecutor(max_workers=gen.concurrency) as executor:
+            workers = [asyncio.create_task(self._worker(gen, queue, executor, writer, writes, start))
+                       for _ in range(gen.concurrency)]
+            await self._feed(gen, queue, loader)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        await asyncio.gather(*writes)
+        report = gen.stats.report(time.perf_counter() - start)
+        logger.info(f"🏁 {gen.name}: {report['saved']} saved, {report['failed']} failed, "
+                    f"{report['skipped']} already done in {report['elapsed']:.1f}s")
+        return report
+
+    async def run(self) -> Dict[str, Dict[str, Any]]:
+        # Generators have independent quotas/devices, so they run side by side
+        with ThreadPoolExecutor(LOAD_WORKERS) as loader, ThreadPoolExecutor(WRITE_WORKERS) as writer:
+            reports = await asyncio.gather(*(self._run_generator(g, loader, writer) for g in self.generators))
+        return {g.name: r for g, r in zip(self.generators, reports)}
+
+
+def generate_task(generators: List[Generator], task_dir: str, manifest: Optional[Manifest] = None):
+    """Run the engine over one <root>/<task> folder (the scripts' process_all)."""
+    task_dir = os.path.normpath(task_dir)
+    engine = GenerationEngine(generators, os.path.dirname(task_dir), [os.path.basename(task_dir)], manifest)
+    return asyncio.run(engine.run())
+
+
+def print_report(reports: Dict[str, Dict[str, Any]]):
+    header = f"{'generator':<40} {'saved':>6} {'failed':>6} {'skipped':>7} {'p50 s':>7} {'p95 s':>7} {'img/min':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, r in reports.items():
+        print(f"{name:<40} {r['saved']:>6} {r['failed']:>6} {r['skipped']:>7} "
+              f"{r['latency_p50']:>7.2f} {r['latency_p95']:>7.2f} {r['images_per_min']:>8.1f}")
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--generators", nargs="+", required=True,
+                        help="<kind>[:<model>[:<output name>]], kind one of " + ", ".join(sorted(GENERATORS)))
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=TASKS)
+    parser.add_argument("--concurrency", type=int, default=None, help="in-flight requests per API generator")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="requests/min ceiling per API generator (default: adaptive, starting at 10)")
+    parser.add_argument("--batch-size", type=int, default=1, help="entries per infer_batch call for hub models")
+    parser.add_argument("--no-manifest", action="store_true", help="walk the tree instead of using the job manifest")
+    parser.add_argument("--fake-latency", type=float, default=None,
+                        help="use offline fake clients / dummy models that take this many seconds per image")
+    parser.add_argument("--fake-failure-rate", type=float, default=0.0, help="fraction of fake calls that return 429")
+    parser.add_argument("--report", default=None, help="write the per-generator metrics to this JSON file")
+    args = parser.parse_args()
+
+    generators = [
+        make_generator(spec, args.concurrency, args.rpm, args.batch_size, args.fake_latency, args.fake_failure_rate)
+        for spec in args.generators
+    ]
+    manifest = None
+    if not args.no_manifest:
+        manifest = Manifest(args.root)
+        manifest.refresh(args.tasks)
+    reports = asyncio.run(GenerationEngine(generators, args.root, args.tasks, manifest).run())
+    print_report(reports)
+    report_telemetry()
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
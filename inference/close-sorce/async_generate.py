@@ -0,0 +1,61 @@
+"""Async driver for the closed-source generators (gpt_generate_output.py, gemini_generate_output.py).
+
+Runs many entries at once instead of one blocking 10-60s call after another.
+A thin front end over the shared engine in generation.py: each provider gets
+its own worker pool (--concurrency) and AIMD rate limiter, 429/5xx answers are
+retried with backoff, every image is written as soon as it arrives (through a
+temp file), and entries whose OUTPUT_NAME already exists are skipped, so a
+sweep can be stopped and resumed. `generation.py --generators` does the same
+for any mix of API and imagen_hub models.
+
+    python inference/close-sorce/async_generate.py --providers gpt gemini --root YOUR-DATA-ROOT --concurrency 8
+    python inference/close-sorce/async_generate.py --providers gpt --rpm 20 --tasks TIG TIE
+    python inference/close-sorce/async_generate.py --providers gpt gemini --root /tmp/fake-tree --fake-latency 2
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from generation import TASKS, GenerationEngine, make_generator, print_report
+from telemetry import report as report_telemetry
+from manifest import Manifest
+
+PROVIDERS = ["gpt", "gemini"]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--providers", nargs="+", choices=PROVIDERS, default=["gpt"])
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=TASKS)
+    parser.add_argument("--concurrency", type=int, default=4, help="in-flight requests per provider")
+    parser.add_argument("--rpm", type=float, default=None,
+                        help="requests/min ceiling per provider (default: adaptive, starting at 10)")
+    parser.add_argument("--gpt-model", default=None)
+    parser.add_argument("--gemini-model", default=None)
+    parser.add_argument("--no-manifest", action="store_true", help="walk the tree instead of using the job manifest")
+    parser.add_argument("--fake-latency", type=float, default=None,
+                        help="generate with offline fake clients that take this many seconds per image")
+    parser.add_argument("--fake-failure-rate", type=float, default=0.0, help="fraction of fake calls that return 429")
+    args = parser.parse_args()
+
+    generators = []
+    for name in args.providers:
+        model = getattr(args, f"{name}_model")
+        spec = f"{name}:{model}" if model else name
+        generators.append(make_generator(spec, args.concurrency, args.rpm, fake_latency=args.fake_latency,
+                                         fake_failure_rate=args.fake_failure_rate))
+    manifest = None
+    if not args.no_manifest:
+        manifest = Manifest(args.root)
+        manifest.refresh(args.tasks)
+    print_report(asyncio.run(GenerationEngine(generators, args.root, args.tasks, manifest).run()))
+    report_telemetry()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Co-schedule several open-source (imagen_hub) models on one pool of devices.
+
+Instead of one MODEL per open_generate_ouput.py invocation, give the pool a list
+of models and a per-device memory budget. Each model is loaded once per run
+and does all of its pending entries (every task) before anything else
+replaces it. Models that fit on a device together run side by side, each on
+its own thread through the shared generation engine. Models with nothing
+left to do are never loaded.
+
+Placement order: models already resident first, then the largest first, so
+big models aren't starved by fragmentation; smaller ones backfill the gaps.
+When a model doesn't fit, idle resident models are evicted in LRU order.
+Residents stay hot after they finish, so repeated `ModelPool.run` calls (or
+models that come back with new work) skip the load.
+
+Footprints come from MODEL_MEMORY_GB (peak: weights + activations) or
+--memory, and are raised to the measured allocation after a CUDA load if that
+turns out larger.
+
+    python inference/open-source/model_pool.py --models UltraEdit OmniGen2 BagelGenration:bagel.png --tasks TIE
+    python inference/open-source/model_pool.py --models A B C D --dummy --dummy-load-time 3 --devices cpu \\
+        --budget-gb 40 --memory A=20 B=20 C=30 D=10 --root /tmp/fake-tree
+"""
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from devices import detect_devices
+from generation import TASKS, GenerationEngine, HubGenerator
+from manifest import Manifest
+from telemetry import report as report_telemetry
+
+logger = logging.getLogger(__name__)
+
+# Rough peak footprints in GB (bf16 weights + activations at benchmark resolution)
+MODEL_MEMORY_GB = {
+    "UltraEdit": 12,
+    "OmniGen2": 22,
+    "BagelGenration": 34,
+}
+DEFAULT_MEMORY_GB = 24
+
+
+@dataclass
+class PoolModel:
+    name: str
+    output_name: str
+    memory_gb: float
+    pending: int = 0
+    device: Optional[str] = None
+    load_s: float = 0.0
+    report: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Resident:
+    model: Any
+    memory_gb: float
+    busy: bool = True
+
+
+class DeviceSlot:
+    def __init__(self, name: str, budget_gb: float):
+        self.name = name
+        self.budget_gb = budget_gb
+        # model name -> Resident, least recently used first
+        self.resident: "OrderedDict[str, Resident]" = OrderedDict()
+        # One load at a time per device, so load-time measurements don't overlap
+        self.load_lock = threading.Lock()
+
+    @property
+    def free_gb(self) -> float:
+        return self.budget_gb - sum(r.memory_gb for r in self.resident.values())
+
+    def idle(self) -> List[str]:
+        return [name for name, r in self.resident.items() if not r.busy]
+
+
+def parse_model(spec: str, memory: Dict[str, float]) -> PoolModel:
+    """"Name[:output name]" -> PoolModel; the output name defaults to name.lower() + ".png"."""
+    name, _, output_name = spec.partition(":")
+    mem = memory.get(name, MODEL_MEMORY_GB.get(name, DEFAULT_MEMORY_GB))
+    return PoolModel(name, output_name or f"{name.lower()}.png", mem)
+
+
+def cuda_index(device: str) -> Optional[int]:
+    return int(device.split(":", 1)[1]) if device.startswith("cuda:") else None
+
+
+def load_hub_model(name: str, device: str):
+    """imagen_hub.load with the loading thread bound to `device`."""
+    return HubGenerator(name, device=device).load()
+
+
+def allocated_gb(device: str) -> Optional[float]:
+    index = cuda_index(device)
+    if index is None:
+        return None
+    try:
+        import torch
+        return torch.cuda.memory_allocated(index) / 1024 ** 3
+    except Exception:
+        return None
+
+
+def release_memory(device: str):
+    gc.collect()
+    if cuda_index(device) is not None:
+        import torch
+        torch.cuda.empty_cache()
+
+
+class ModelPool:
+    def __init__(self, devices: List[str], budget_gb: float, root: str, tasks: Optional[List[str]] = None,
+                 use_manifest: bool = True, batch_size: int = 1,
+                 loader: Callable[[str, str], Any] = load_hub_model):
+        self.slots = [DeviceSlot(d, budget_gb) for d in devices]
+        self.root = root
+        self.tasks = tasks or TASKS
+        self.use_manifest = use_manifest
+        self.batch_size = batch_size
+        self.loader = loader
+        self.stats = {"loads": 0, "evictions": 0, "load_s": 0.0}
+        self._cond = threading.Condition()
+
+    # --- Planning ---
+    def _manifest(self) -> Optional[Manifest]:
+        # SQLite connections are per thread, so every engine run opens its own
+        return Manifest(self.root) if self.use_manifest else None
+
+    def count_pending(self, pm: PoolModel) -> int:
+        engine = GenerationEngine([HubGenerator(pm.name, pm.output_name)], self.root, self.tasks, self._manifest())
+        return sum(1 for _ in engine.pending(engine.generators[0]))
+
+    def _resident_on(self, name: str) -> Optional[DeviceSlot]:
+        return next((slot for slot in self.slots if name in slot.resident), None)
+
+    def order(self, models: List[PoolModel]) -> List[PoolModel]:
+        """Resident models first (no load), then largest first."""
+        return sorted(models, key=lambda pm: (self._resident_on(pm.name) is None, -pm.memory_gb))
+
+    def _place(self, pm: PoolModel, todo: List[PoolModel]) -> Optional[Tuple[DeviceSlot, bool]]:
+        """Reserve a device for `pm`; returns (slot, needs_load) or None if nothing fits right now."""
+        slot = self._resident_on(pm.name)
+        if slot is not None:
+            if slot.resident[pm.name].busy:
+                return None
+            slot.resident[pm.name].busy = True
+            slot.resident.move_to_end(pm.name)
+            return slot, False
+        # Prefer evicting models nobody is waiting for
+        wanted = {other.name for other in todo}
+        for slot in sorted(self.slots, key=lambda s: -s.free_gb):
+            if slot.free_gb >= pm.memory_gb:
+                break
+            idle = slot.idle()
+            victims = [n for n in idle if n not in wanted] + [n for n in idle if n in wanted]
+            reclaimable = sum(slot.resident[n].memory_gb for n in victims)
+            if slot.free_gb + reclaimable < pm.memory_gb:
+                continue
+            for victim in victims:
+                if slot.free_gb >= pm.memory_gb:
+                    break
+                self._evict(slot, victim)
+            break
+        else:
+            return None
+        slot.resident[pm.name] = Resident(None, pm.memory_gb)
+        return slot, True
+
+    def _evict(self, slot: DeviceSlot, name: str):
+        slot.resident.pop(name)
+        release_memory(slot.name)
+        self.stats["evictions"] += 1
+        logger.info(f"🧹 Evicted {name} from {slot.name} ({slot.free_gb:.0f} GB free)")
+
+    # --- Running ---
+    def _load(self, pm: PoolModel, slot: DeviceSlot):
+        with slot.load_lock:
+            before = allocated_gb(slot.name)
+            start = time.perf_counter()
+            model = self.loader(pm.name, slot.name)
+            pm.load_s = time.perf_counter() - start
+            after = allocated_gb(slot.name)
+        with self._cond:
+            resident = slot.resident[pm.name]
+            resident.model = model
+            if before is not None and after is not None and after - before > resident.memory_gb:
+                logger.warning(f"📏 {pm.name} takes {after - before:.1f} GB on {slot.name}, "
+                               f"more than the {resident.memory_gb:.0f} GB estimate")
+                resident.memory_gb = pm.memory_gb = after - before
+            self.stats["loads"] += 1
+            self.stats["load_s"] += pm.load_s
+        logger.info(f"📦 Loaded {pm.name} on {slot.name} in {pm.load_s:.1f}s")
+        return model
+
+    def _run_model(self, pm: PoolModel, slot: DeviceSlot, needs_load: bool):
+        pm.device = slot.name
+        try:
+            model = self._load(pm, slot) if needs_load else slot.resident[pm.name].model
+            gen = HubGenerator(pm.name, pm.output_name, model=model, batch_size=self.batch_size, device=slot.name)
+            engine = GenerationEngine([gen], self.root, self.tasks, self._manifest())
+            pm.report = asyncio.run(engine.run())[gen.name]
+        except Exception as e:
+            logger.error(f"🚫 {pm.name} on {slot.name}: {e}")
+            pm.report = {"error": str(e)}
+            with self._cond:
+                if needs_load and slot.resident.get(pm.name) and slot.resident[pm.name].model is None:
+                    slot.resident.pop(pm.name)
+        finally:
+            with self._cond:
+                if pm.name in slot.resident:
+                    slot.resident[pm.name].busy = False
+                    slot.resident.move_to_end(pm.name)
+                self._cond.notify_all()
+
+    def run(self, models: List[PoolModel]) -> Dict[str, Dict[str, Any]]:
+        start = time.perf_counter()
+        for pm in models:
+            pm.pending = self.count_pending(pm)
+        todo = self.order([pm for pm in models if pm.pending])
+        logger.info(f"📋 {len(todo)} of {len(models)} models have pending entries: "
+                    + ", ".join(f"{pm.name} ({pm.pending}, {pm.memory_gb:.0f} GB)" for pm in todo))
+        threads: List[threading.Thread] = []
+        with self._cond:
+            while todo:
+                started = False
+                for pm in list(todo):
+                    placement = self._place(pm, todo)
+                    if placement is None:
+                        continue
+                    todo.remove(pm)
+                    slot, needs_load = placement
+                    logger.info(f"🚀 {pm.name} -> {slot.name} ({'load' if needs_load else 'resident'}, "
+                                f"{slot.free_gb:.0f} GB left)")
+                    thread = threading.Thread(target=self._run_model, args=(pm, slot, needs_load), daemon=True)
+                    thread.start()
+                    threads.append(thread)
+                    started = True
+                if not todo:
+                    break
+                if not started and not any(r.busy for s in self.slots for r in s.resident.values()):
+                    for pm in todo:
+                        logger.error(f"❌ {pm.name} needs {pm.memory_gb:.0f} GB; no device has that budget")
+                        pm.report = {"error": "does not fit"}
+                    break
+                if not started:
+                    self._cond.wait()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        logger.info(f"🏁 {len(models)} models in {elapsed:.1f}s: {self.stats['loads']} loads "
+                    f"({self.stats['load_s']:.1f}s), {self.stats['evictions']} evictions")
+        return {pm.name: dict(pm.report, device=pm.device, load_s=round(pm.load_s, 2), pending=pm.pending)
+                for pm in models}
+
+
+def device_budget(devices: List[str], budget_gb: Optional[float]) -> float:
+    """--budget-gb, or the smallest GPU's total memory."""
+    if budget_gb:
+        return budget_gb
+    totals = []
+    for device in devices:
+        index = cuda_index(device)
+        if index is None:
+            continue
+        import torch
+        totals.append(torch.cuda.get_device_properties(index).total_memory / 1024 ** 3)
+    if not totals:
+        raise SystemExit("❌ --budget-gb is required when not running on CUDA devices")
+    return min(totals)
+
+
+def parse_memory(items: List[str]) -> Dict[str, float]:
+    memory = {}
+    for item in items:
+        name, _, gb = item.partition("=")
+        memory[name] = float(gb)
+    return memory
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", nargs="+", required=True, help="imagen_hub model names, Name[:output name]")
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=TASKS)
+    parser.add_argument("--devices", nargs="+", default=None, help="e.g. cuda:0 cuda:1 (default: all visible GPUs)")
+    parser.add_argument("--budget-gb", type=float, default=None, help="memory budget per device (default: GPU size)")
+    parser.add_argument("--memory", nargs="*", default=[], help="footprint overrides, Name=GB")
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--no-manifest", action="store_true", help="walk the tree instead of using the job manifest")
+    parser.add_argument("--dummy", action="store_true", help="use DummyModel instead of imagen_hub (CPU test)")
+    parser.add_argument("--dummy-load-time", type=float, default=2.0, help="seconds a dummy model takes to load")
+    parser.add_argument("--dummy-delay", type=float, default=0.1, help="seconds per dummy image")
+    args = parser.parse_args()
+
+    devices = args.devices or detect_devices()
+    models = [parse_model(spec, parse_memory(args.memory)) for spec in args.models]
+    loader = load_hub_model
+    if args.dummy:
+        from fake_client import DummyModel
+
+        def load_dummy(name, device):
+            time.sleep(args.dummy_load_time)
+            return DummyModel(args.dummy_delay)
+        loader = load_dummy
+    if not args.no_manifest:
+        Manifest(args.root).refresh(args.tasks)
+    pool = ModelPool(devices, device_budget(devices, args.budget_gb), args.root, args.tasks,
+                     not args.no_manifest, args.batch_size, loader)
+    reports = pool.run(models)
+    for name, r in reports.items():
+        print(f"{name:<20} {str(r.get('device')):<8} pending={r['pending']:<5} saved={r.get('saved', 0):<5} "
+              f"failed={r.get('failed', 0):<4} load={r['load_s']:.1f}s {r.get('error', '')}")
+    report_telemetry()
+
+
+if __name__ == "__main__":
+    main()
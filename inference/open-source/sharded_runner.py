@@ -0,0 +1,199 @@
+"""Multi-process / multi-GPU sharded runner for open_generate_ouput.py.
+
+Spawns one worker per device slot; each worker loads its own model instance and
+walks the pending entries starting with its own deterministic shard
+(entries[rank::world]) before helping with the others. An entry is claimed by
+atomically creating model_output/.<IMAGE_NAME>.claim, so two workers never
+generate the same image and no lock server is needed. The owner touches its
+claim every CLAIM_HEARTBEAT seconds, so only claims of dead workers go stale,
+however long one inference takes. The existing
+skip-if-output-exists check still applies, so re-running resumes.
+
+    python inference/open-source/sharded_runner.py --model UltraEdit --image-name ultraedit.png --tasks TIE
+    python inference/open-source/sharded_runner.py --model Dummy --image-name dummy.png --dummy --workers 4   # CPU test
+"""
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import socket
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from devices import bind_device, detect_devices
+from fake_client import DummyModel
+from manifest import Manifest
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+CLAIM_TTL = 600
+CLAIM_HEARTBEAT = 60
+
+
+def claim_path(entry_path: str, image_name: str) -> str:
+    return os.path.join(entry_path, "model_output", f".{image_name}.claim")
+
+
+def try_claim(entry_path: str, image_name: str, ttl: float = CLAIM_TTL) -> bool:
+    """Atomically create the claim file; take over claims older than `ttl` (crashed workers)."""
+    path = claim_path(entry_path, image_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for _ in range(2):
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            try:
+                age = time.time() - os.stat(path).st_mtime
+            except FileNotFoundError:
+                continue
+            if age < ttl:
+                return False
+            # Only one worker wins the rename, so only one takes over a stale claim.
+            try:
+                os.rename(path, f"{path}.stale.{os.getpid()}")
+                os.remove(f"{path}.stale.{os.getpid()}")
+            except FileNotFoundError:
+                return False
+            continue
+        with os.fdopen(fd, "w") as f:
+            f.write(f"{socket.gethostname()}:{os.getpid()}:{time.time():.0f}\n")
+        return True
+    return False
+
+
+@contextmanager
+def hold_claim(entry_path: str, image_name: str, interval: float = CLAIM_HEARTBEAT):
+    """Keep a claim fresh while the body runs, then release it."""
+    path = claim_path(entry_path, image_name)
+    done = threading.Event()
+
+    def heartbeat():
+        while not done.wait(interval):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                return
+
+    thread = threading.Thread(target=heartbeat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        done.set()
+        thread.join()
+        release_claim(entry_path, image_name)
+
+
+def release_claim(entry_path: str, image_name: str):
+    try:
+        os.remove(claim_path(entry_path, image_name))
+    except FileNotFoundError:
+        pass
+
+
+def shard_order(entries: List[str], rank: int, world: int) -> Iterator[str]:
+    """Own shard first, then the other shards in rank order (work stealing)."""
+    for k in range(world):
+        yield from entries[(rank + k) % world::world]
+
+
+def list_pending(root: str, tasks: List[str], image_name: str, use_manifest: bool = True) -> List[str]:
+    if use_manifest:
+        manifest = Manifest(root)
+        manifest.refresh(tasks)
+        return [p for task in tasks for p in manifest.pending_outputs(image_name, task)]
+    pending = []
+    for task in tasks:
+        task_dir = os.path.join(root, task)
+        for entry in sorted(os.listdir(task_dir)):
+            entry_path = os.path.join(task_dir, entry)
+            if os.path.isdir(entry_path) and not os.path.exists(os.path.join(entry_path, "model_output", image_name)):
+                pending.append(entry_path)
+    return pending
+
+
+def load_generator(model_name: str, image_name: str, dummy: bool, dummy_delay: float = 0.0):
+    """Import open_generate_ouput in this process and point its globals at our model."""
+    import open_generate_ouput as gen
+    gen.MODEL = model_name
+    gen.IMAGE_NAME = image_name
+    if dummy:
+        gen.model = DummyModel(dummy_delay)
+    else:
+        import imagen_hub
+        gen.model = imagen_hub.load(model_name)
+    return gen
+
+
+def worker(rank: int, world: int, device: str, entries: List[str], args: argparse.Namespace, results):
+    bind_device(device)
+    gen = load_generator(args.model, args.image_name, args.dummy, args.dummy_delay)
+    logging.info(f"🧵 worker {rank}/{world} on {device}: {len(entries[rank::world])} entries in its shard")
+
+    done = skipped = 0
+    start = time.perf_counter()
+    for entry_path in shard_order(entries, rank, world):
+        out_path = os.path.join(entry_path, "model_output", args.image_name)
+        if os.path.exists(out_path) or not try_claim(entry_path, args.image_name, args.claim_ttl):
+            skipped += 1
+            continue
+        with hold_claim(entry_path, args.image_name, min(CLAIM_HEARTBEAT, args.claim_ttl / 4)):
+            gen.process_single_example(entry_path)
+            done += os.path.exists(out_path)
+    elapsed = time.perf_counter() - start
+    logging.info(f"🏁 worker {rank} generated {done} images in {elapsed:.1f}s ({skipped} skipped/claimed elsewhere)")
+    results.put((rank, done, elapsed))
+
+
+def run(args: argparse.Namespace) -> int:
+    devices = args.devices or detect_devices()
+    world = args.workers or len(devices)
+    entries = list_pending(args.root, args.tasks, args.image_name, not args.no_manifest)
+    logging.info(f"📋 {len(entries)} pending entries for {args.model}; {world} workers on {devices}")
+    if not entries:
+        return 0
+
+    ctx = mp.get_context("spawn")
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(rank, world, devices[rank % len(devices)], entries, args, results))
+        for rank in range(world)
+    ]
+    start = time.perf_counter()
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    total = 0
+    while not results.empty():
+        _, done, _ = results.get()
+        total += done
+    elapsed = time.perf_counter() - start
+    failed = [i for i, p in enumerate(procs) if p.exitcode != 0]
+    if failed:
+        logging.warning(f"⚠️ workers {failed} exited abnormally; re-run to pick up their entries")
+    logging.info(f"✅ {total} images in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.2f} img/s)")
+    return total
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", required=True, help="imagen_hub model name, e.g. UltraEdit")
+    parser.add_argument("--image-name", required=True, help="output file name in model_output/, e.g. ultraedit.png")
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=["TIE", "TIG", "SRIG", "SRIE", "MRIG", "MRIE"])
+    parser.add_argument("--devices", nargs="+", default=None, help="e.g. cuda:0 cuda:1, or cpu (default: all GPUs)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per device)")
+    parser.add_argument("--claim-ttl", type=float, default=CLAIM_TTL, help="seconds without a heartbeat before a claim counts as stale")
+    parser.add_argument("--no-manifest", action="store_true")
+    parser.add_argument("--dummy", action="store_true", help="use a CPU dummy model instead of imagen_hub.load")
+    parser.add_argument("--dummy-delay", type=float, default=0.0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
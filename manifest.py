@@ -0,0 +1,343 @@
+"""Persistent job manifest for the YOUR-DATA-ROOT/<task>/<entry> tree.
+
+Every stage decides what's left by walking the tree and opening each
+metadata.json / gemini_result.json or stat-ing each output. The manifest keeps
+that state in SQLite (<root>/.manifest.sqlite) and re-reads a file or
+re-lists a directory only when its mtime changed, so a resumed run gets its
+pending work set from a few indexed queries.
+
+    python manifest.py --root YOUR-DATA-ROOT            # refresh + per-stage status
+    m = Manifest(root); m.refresh(); m.pending_scores("TIG")
+    m = Manifest(root); m.pending_scores("TIG")        # refreshes TIG on first query
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+TASKS = ["TIG", "TIE", "SRIG", "SRIE", "MRIG", "MRIE"]
+IMAGE_EXTS = (".png", ".jpg", ".jpeg")
+MANIFEST_NAME = ".manifest.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stamps (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS entries (
+    entry_id TEXT PRIMARY KEY, task TEXT NOT NULL, topic TEXT,
+    has_prompt INTEGER NOT NULL DEFAULT 0, has_prompt_refined INTEGER NOT NULL DEFAULT 0,
+    has_objects INTEGER NOT NULL DEFAULT 0, cond_images TEXT NOT NULL DEFAULT '[]'
+);
+CREATE INDEX IF NOT EXISTS entries_task ON entries (task);
+-- kind: 'entry' (files directly in the entry dir), 'output' (model_output/ images),
+-- 'som' (SoM/<model>/<file>, stored as '<model>/<file>')
+CREATE TABLE IF NOT EXISTS files (
+    entry_id TEXT NOT NULL, kind TEXT NOT NULL, name TEXT NOT NULL, stem TEXT NOT NULL,
+    PRIMARY KEY (entry_id, kind, name)
+);
+CREATE TABLE IF NOT EXISTS scores (entry_id TEXT NOT NULL, model_key TEXT NOT NULL, PRIMARY KEY (entry_id, model_key));
+-- input_signature of entries whose stored scores were last found up to date
+CREATE TABLE IF NOT EXISTS score_checks (entry_id TEXT PRIMARY KEY, signature TEXT NOT NULL);
+"""
+
+
+def _mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class Manifest:
+    def __init__(self, root: str, db_path: Optional[str] = None):
+        self.root = root
+        self.db_path = db_path or os.path.join(root, MANIFEST_NAME)
+        self._prefix = os.path.join(root, "")  # root + separator, for the hot path's string concatenation
+        # Callers may hand the instance to a worker thread (async_score plans off the event
+        # loop); it is still meant to be used by one thread at a time
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+        self._fresh: Set[str] = set()  # tasks refreshed by this instance
+
+    def close(self):
+        self._db.close()
+
+    # --- Incremental refresh ---
+    # Relative paths are built by concatenation: on a warm refresh os.path.join costs more than the stats
+    def _changed(self, rel: str, stamps: Dict[str, int]) -> Tuple[bool, Optional[int]]:
+        mtime = _mtime(self._prefix + rel)
+        return stamps.get(rel) != mtime, mtime
+
+    def _stamp(self, rel: str, mtime: Optional[int]):
+        if mtime is None:
+            self._db.execute("DELETE FROM stamps WHERE path=?", (rel,))
+        else:
+            self._db.execute("INSERT OR REPLACE INTO stamps VALUES (?, ?)", (rel, mtime))
+
+    def _set_files(self, entry_id: str, kind: str, names: Iterable[str], prefix: Optional[str] = None):
+        if prefix is None:
+            self._db.execute("DELETE FROM files WHERE entry_id=? AND kind=?", (entry_id, kind))
+        else:
+            self._db.execute("DELETE FROM files WHERE entry_id=? AND kind=? AND substr(name, 1, ?)=?",
+                             (entry_id, kind, len(prefix) + 1, prefix + "/"))
+        self._db.executemany(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            [(entry_id, kind, name, os.path.splitext(os.path.basename(name))[0]) for name in names],
+        )
+
+    def _refresh_entry(self, task: str, entry_id: str, stamps: Dict[str, int], som_known: Set[str]) -> bool:
+        updated = False
+        changed, mtime = self._changed(entry_id, stamps)
+        if changed:
+            names = os.listdir(os.path.join(self.root, entry_id)) if mtime is not None else []
+            self._set_files(entry_id, "entry", names)
+            self._stamp(entry_id, mtime)
+            updated = True
+
+        meta_rel = entry_id + os.sep + "metadata.json"
+        changed, mtime = self._changed(meta_rel, stamps)
+        if changed:
+            data = {}
+            if mtime is not None:
+                try:
+                    with open(os.path.join(self.root, meta_rel), "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except Exception as e:
+                    logger.warning(f"⚠️ Unreadable metadata {meta_rel}: {e}")
+                    mtime = None  # re-read next time
+            self._db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (entry_id, task, data.get("topic"), int(bool(data.get("prompt", "").strip())),
+                 int(bool(data.get("prompt_refined", "").strip())), int(bool(data.get("objects"))),
+                 json.dumps(data.get("cond_images", []))),
+            )
+            self._stamp(meta_rel, mtime)
+            updated = True
+
+        result_rel = entry_id + os.sep + "gemini_result.json"
+        changed, mtime = self._changed(result_rel, stamps)
+        if changed:
+            scored = []
+            if mtime is not None:
+                try:
+                    with open(os.path.join(self.root, result_rel), "r") as f:
+                        scored = list(json.load(f).get("gemini", {}))
+                except Exception:
+                    mtime = None
+            self._db.execute("DELETE FROM scores WHERE entry_id=?", (entry_id,))
+            self._db.executemany("INSERT INTO scores VALUES (?, ?)", [(entry_id, k) for k in scored])
+            self._stamp(result_rel, mtime)
+            updated = True
+
+        output_rel = entry_id + os.sep + "model_output"
+        changed, mtime = self._changed(output_rel, stamps)
+        if changed:
+            names = []
+            if mtime is not None:
+                names = [n for n in os.listdir(os.path.join(self.root, output_rel)) if n.lower().endswith(IMAGE_EXTS)]
+            self._set_files(entry_id, "output", names)
+            self._stamp(output_rel, mtime)
+            updated = True
+
+        # SoM/<model>/ dirs are stamped individually: adding a preview only bumps the model dir
+        som_rel = entry_id + os.sep + "SoM"
+        changed, mtime = self._changed(som_rel, stamps)
+        som_models = set(som_known)
+        if changed:
+            if mtime is not None:
+                som_models |= {d for d in os.listdir(os.path.join(self.root, som_rel))
+                               if os.path.isdir(os.path.join(self.root, som_rel, d))}
+            self._stamp(som_rel, mtime)
+            updated = True
+        for model_dir in som_models:
+            rel = som_rel + os.sep + model_dir
+            changed, mtime = self._changed(rel, stamps)
+            if not changed:
+                continue
+            names = []
+            if mtime is not None:
+                names = [f"{model_dir}/{n}" for n in os.listdir(os.path.join(self.root, rel))
+                         if n.lower().endswith(IMAGE_EXTS)]
+            self._set_files(entry_id, "som", names, prefix=model_dir)
+            self._stamp(rel, mtime)
+            updated = True
+        return updated
+
+    def _forget_entry(self, entry_id: str):
+        for table in ("entries", "files", "scores", "score_checks"):
+            self._db.execute(f"DELETE FROM {table} WHERE entry_id=?", (entry_id,))
+        self._db.execute("DELETE FROM stamps WHERE path=? OR path LIKE ?", (entry_id, entry_id + os.sep + "%"))
+
+    def refresh(self, tasks: Iterable[str] = TASKS) -> Dict[str, int]:
+        """Bring the index up to date with the tree; only changed files are re-read."""
+        tasks = list(tasks)
+        start = time.perf_counter()
+        stamps = dict(self._db.execute("SELECT path, mtime_ns FROM stamps"))
+        som_known = defaultdict(set)
+        som_marker = os.sep + "SoM" + os.sep
+        for path in stamps:
+            if som_marker not in path:
+                continue
+            parts = path.split(os.sep)
+            if len(parts) == 4 and parts[2] == "SoM":
+                som_known[os.path.join(parts[0], parts[1])].add(parts[3])
+        stats = {"entries": 0, "updated": 0, "removed": 0}
+        with self._db:
+            for task in tasks:
+                task_dir = os.path.join(self.root, task)
+                present = set()
+                if os.path.isdir(task_dir):
+                    with os.scandir(task_dir) as it:  # is_dir() comes from the listing, no extra stat
+                        present = {e.name for e in it if e.is_dir()}
+                for entry in sorted(present):
+                    entry_id = task + os.sep + entry
+                    stats["entries"] += 1
+                    stats["updated"] += self._refresh_entry(task, entry_id, stamps, som_known.get(entry_id, set()))
+                for (entry_id,) in self._db.execute("SELECT entry_id FROM entries WHERE task=?", (task,)).fetchall():
+                    if os.path.basename(entry_id) not in present:
+                        self._forget_entry(entry_id)
+                        stats["removed"] += 1
+        self._fresh.update(tasks)
+        logger.info(f"📇 Manifest refreshed in {time.perf_counter() - start:.2f}s: {stats}")
+        return stats
+
+    # --- Pending work queries ---
+    def _paths(self, rows) -> List[str]:
+        return [os.path.join(self.root, r[0]) for r in rows]
+
+    def _ensure_fresh(self, task: Optional[str]):
+        """Refresh tasks this instance hasn't refreshed yet, so a fresh Manifest never answers from stale state."""
+        missing = [t for t in ([task] if task else TASKS) if t not in self._fresh]
+        if missing:
+            self.refresh(missing)
+
+    def _task_filter(self, task: Optional[str], column: str = "e.task") -> Tuple[str, tuple]:
+        self._ensure_fresh(task)
+        return (f" AND {column}=?", (task,)) if task else ("", ())
+
+    def pending_prompt_refined(self, task: Optional[str] = None) -> List[str]:
+        """Metadata paths still missing `prompt_refined`."""
+        where, args = self._task_filter(task)
+        rows = self._db.execute(
+            f"SELECT e.entry_id FROM entries e WHERE e.has_prompt=1 AND e.has_prompt_refined=0{where} ORDER BY e.entry_id",
+            args,
+        )
+        return [os.path.join(p, "metadata.json") for p in self._paths(rows)]
+
+    def pending_objects(self, task: Optional[str] = None) -> List[str]:
+        """Metadata paths still missing `objects`."""
+        where, args = self._task_filter(task)
+        rows = self._db.execute(
+            f"SELECT e.entry_id FROM entries e WHERE e.has_objects=0 AND (e.has_prompt=1 OR e.has_prompt_refined=1)"
+            f"{where} ORDER BY e.entry_id",
+            args,
+        )
+        return [os.path.join(p, "metadata.json") for p in self._paths(rows)]
+
+    def pending_outputs(self, output_name: str, task: Optional[str] = None, in_model_output: bool = True) -> List[str]:
+        """Entry dirs without `output_name` (in model_output/, or directly in the entry dir)."""
+        where, args = self._task_filter(task)
+        kind = "output" if in_model_output else "entry"
+        rows = self._db.execute(
+            f"SELECT e.entry_id FROM entries e WHERE NOT EXISTS (SELECT 1 FROM files f WHERE f.entry_id=e.entry_id"
+            f" AND f.kind=? AND f.name=?){where} ORDER BY e.entry_id",
+            (kind, output_name) + args,
+        )
+        return self._paths(rows)
+
+    def pending_scores(self, task: Optional[str] = None) -> List[str]:
+        """Entry dirs with at least one model output that has no Gemini score yet."""
+        where, args = self._task_filter(task)
+        rows = self._db.execute(
+            f"SELECT DISTINCT e.entry_id FROM entries e JOIN files f ON f.entry_id=e.entry_id AND f.kind='output'"
+            f" WHERE NOT EXISTS (SELECT 1 FROM scores s WHERE s.entry_id=e.entry_id AND s.model_key=f.stem)"
+            f" AND NOT (f.stem='uno' AND e.task LIKE '%IE'){where} ORDER BY e.entry_id",
+            args,
+        )
+        return self._paths(rows)
+
+    def input_signature(self, entry_path: str, tag: str = "") -> str:
+        """Stat fingerprint of what an entry's scores depend on: metadata.json, cond images, model outputs.
+
+        `tag` covers the rest (instruction, judge model), so changing it invalidates every entry.
+        """
+        entry_id = os.path.relpath(entry_path, self.root)
+        row = self._db.execute("SELECT cond_images FROM entries WHERE entry_id=?", (entry_id,)).fetchone()
+        outputs = self._db.execute(
+            "SELECT name FROM files WHERE entry_id=? AND kind='output' ORDER BY name", (entry_id,)
+        ).fetchall()
+        parts: List = [tag]
+        for rel in ["metadata.json", *json.loads(row[0] if row else "[]"), *(f"model_output/{n}" for n, in outputs)]:
+            try:
+                st = os.stat(os.path.join(entry_path, rel))
+                parts.append([rel, st.st_size, st.st_mtime_ns])
+            except OSError:
+                parts.append([rel, None])
+        return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+    def pending_score_checks(self, task: str, tag: str = "") -> List[str]:
+        """Entry dirs to visit when stored scores may be stale.
+
+        That is `pending_scores`, plus entries whose `input_signature` changed since
+        `mark_score_checked` (or that were never checked).
+        """
+        pending = set(self.pending_scores(task))  # also refreshes `task` if needed
+        checked = dict(self._db.execute(
+            "SELECT c.entry_id, c.signature FROM score_checks c JOIN entries e ON e.entry_id=c.entry_id WHERE e.task=?",
+            (task,),
+        ))
+        visit = []
+        for path in self._paths(self._db.execute("SELECT entry_id FROM entries WHERE task=? ORDER BY entry_id", (task,))):
+            entry_id = os.path.relpath(path, self.root)
+            if path in pending or checked.get(entry_id) != self.input_signature(path, tag):
+                visit.append(path)
+        return visit
+
+    def mark_score_checked(self, entry_path: str, signature: str):
+        """Record that every score of the entry was current for inputs with this `input_signature`."""
+        with self._db:
+            self._db.execute("INSERT OR REPLACE INTO score_checks VALUES (?, ?)",
+                             (os.path.relpath(entry_path, self.root), signature))
+
+    def pending_som(self, task: Optional[str] = None) -> List[Tuple[str, str]]:
+        """(model_output dir, filename) pairs without a SoM preview."""
+        where, args = self._task_filter(task)
+        rows = self._db.execute(
+            f"SELECT e.entry_id, f.name FROM entries e JOIN files f ON f.entry_id=e.entry_id AND f.kind='output'"
+            f" WHERE NOT EXISTS (SELECT 1 FROM files s WHERE s.entry_id=e.entry_id AND s.kind='som'"
+            f" AND s.name=f.stem || '/' || f.name){where} ORDER BY e.entry_id, f.name",
+            args,
+        )
+        return [(os.path.join(self.root, entry_id, "model_output"), name) for entry_id, name in rows]
+
+    def status(self) -> List[Tuple]:
+        return self._db.execute(
+            "SELECT e.task, COUNT(*), SUM(e.has_prompt_refined), SUM(e.has_objects),"
+            " (SELECT COUNT(*) FROM files f JOIN entries x ON x.entry_id=f.entry_id WHERE f.kind='output' AND x.task=e.task),"
+            " (SELECT COUNT(*) FROM scores s JOIN entries x ON x.entry_id=s.entry_id WHERE x.task=e.task),"
+            " (SELECT COUNT(*) FROM files f JOIN entries x ON x.entry_id=f.entry_id WHERE f.kind='som' AND x.task=e.task)"
+            " FROM entries e GROUP BY e.task ORDER BY e.task"
+        ).fetchall()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=TASKS)
+    args = parser.parse_args()
+
+    manifest = Manifest(args.root)
+    manifest.refresh(args.tasks)
+    print(f"{'task':<6} {'entries':>8} {'refined':>8} {'objects':>8} {'outputs':>8} {'scored':>8} {'som':>8}")
+    for row in manifest.status():
+        print(f"{row[0]:<6} " + " ".join(f"{v or 0:>8}" for v in row[1:]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Compact, memory-mappable store for SoM masks.
+
+`som.add_marks` leaves one .npz of dense masks next to every SoM preview, so
+~50K images turn into ~50K small files. A MaskStore keeps all of a task's
+arrays in a few append-only chunk files under <root>/.som_masks/<task>/, with
+an SQLite index keyed by (entry_id, model, source .npz, array name):
+
+- boolean arrays are bit-packed one mask at a time (ceil(H*W/8) bytes each),
+  so mask i of an (N, H, W) stack sits at a fixed offset and can be read
+  without touching the others (`masks()` presents any bool array as (N, H, W));
+- every other array is stored raw and comes back as a read-only view of the
+  memory-mapped chunk (no copy).
+
+    python mask_store.py pack   --root YOUR-DATA-ROOT --tasks TIG [--delete-npz]
+    python mask_store.py unpack --root YOUR-DATA-ROOT --tasks TIG
+    python mask_store.py stats  --root YOUR-DATA-ROOT
+
+    store = MaskStore(root, "TIG")
+    store.mask("TIG/TIG_A_000001", "sdxl", 3)   # (H, W) bool, only that mask is read
+
+Writes assume a single writer per task store (the `pack` command).
+"""
+import argparse
+import json
+import logging
+import os
+import sqlite3
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+TASKS = ["TIG", "TIE", "SRIG", "SRIE", "MRIG", "MRIE"]
+STORE_DIR = ".som_masks"
+INDEX_NAME = "index.sqlite"
+CHUNK_BYTES = 1 << 30
+# Raw arrays are aligned so views of any dtype are properly aligned
+ALIGN = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS arrays (
+    entry_id TEXT NOT NULL, model TEXT NOT NULL, name TEXT NOT NULL,
+    source TEXT NOT NULL, chunk INTEGER NOT NULL, offset INTEGER NOT NULL, nbytes INTEGER NOT NULL,
+    dtype TEXT NOT NULL, shape TEXT NOT NULL, packed INTEGER NOT NULL,
+    PRIMARY KEY (entry_id, model, source, name)
+);
+"""
+
+
+def mask_stride(shape: Tuple[int, ...]) -> int:
+    """Bytes per bit-packed mask: masks are the last two axes."""
+    return (int(np.prod(shape[-2:])) + 7) // 8
+
+
+class MaskStore:
+    def __init__(self, root: str, task: str, chunk_bytes: int = CHUNK_BYTES):
+        self.root = root
+        self.dir = os.path.join(root, STORE_DIR, task)
+        self.chunk_bytes = chunk_bytes
+        os.makedirs(self.dir, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(self.dir, INDEX_NAME))
+        self._db.executescript(SCHEMA)
+        self._migrate()
+        self._maps: Dict[int, np.memmap] = {}
+
+    def _migrate(self):
+        # Stores written before `source` joined the key let two .npz files overwrite each other's arrays
+        pk = {name for _, name, _, _, _, pos in self._db.execute("PRAGMA table_info(arrays)") if pos}
+        if "source" not in pk:
+            with self._db:
+                self._db.execute("ALTER TABLE arrays RENAME TO arrays_old")
+                self._db.executescript(SCHEMA)
+                self._db.execute("INSERT INTO arrays SELECT * FROM arrays_old")
+                self._db.execute("DROP TABLE arrays_old")
+
+    def close(self):
+        self._maps.clear()
+        self._db.close()
+
+    def _chunk_path(self, chunk: int) -> str:
+        return os.path.join(self.dir, f"chunk_{chunk:05d}.bin")
+
+    # --- Writing ---
+    def _append(self, data: bytes) -> Tuple[int, int]:
+        """Append to the newest chunk (or start a new one); returns (chunk, offset)."""
+        row = self._db.execute("SELECT MAX(chunk) FROM arrays").fetchone()
+        chunk = row[0] or 0
+        path = self._chunk_path(chunk)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size and size + len(data) > self.chunk_bytes:
+            chunk, size = chunk + 1, 0
+            path = self._chunk_path(chunk)
+        with open(path, "ab") as f:
+            pad = -size % ALIGN
+            f.write(b"\0" * pad + data)
+        # The chunk grew, so any existing map of it is stale
+        self._maps.pop(chunk, None)
+        return chunk, size + pad
+
+    def put(self, entry_id: str, model: str, name: str, array: np.ndarray, source: str = ""):
+        """Store one array; `source` is the .npz it came from, so several files per model can coexist."""
+        array = np.asarray(array)
+        if array.dtype == object:
+            raise ValueError(f"Object arrays can't be stored ({entry_id} {model} {name})")
+        packed = array.dtype == bool and array.ndim >= 2
+        if packed:
+            masks = array.reshape(-1, int(np.prod(array.shape[-2:])))
+            data = np.packbits(masks, axis=1).tobytes()
+        else:
+            data = np.ascontiguousarray(array).tobytes()
+        chunk, offset = self._append(data)
+        # The original shape is kept, so array() and export_npz give back exactly what was stored
+        self._db.execute(
+            "INSERT OR REPLACE INTO arrays (entry_id, model, name, source, chunk, offset, nbytes, dtype, shape, packed)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (entry_id, model, name, source, chunk, offset, len(data), array.dtype.str,
+             json.dumps(array.shape), int(packed)),
+        )
+
+    def commit(self):
+        self._db.commit()
+
+    def import_npz(self, npz_path: str, entry_id: str, model: str):
+        with np.load(npz_path, allow_pickle=False) as npz:
+            for name in npz.files:
+                self.put(entry_id, model, name, npz[name], source=os.path.basename(npz_path))
+        self.commit()
+
+    # --- Reading ---
+    # Reads take an optional `source` (.npz name); by default the first one by name is used,
+    # which is the only one for trees with one mask file per image.
+    def sources(self, entry_id: str, model: str) -> List[str]:
+        rows = self._db.execute("SELECT DISTINCT source FROM arrays WHERE entry_id=? AND model=? ORDER BY source",
+                                (entry_id, model))
+        return [source for (source,) in rows]
+
+    def _source(self, entry_id: str, model: str, source: Optional[str]) -> str:
+        if source is not None:
+            return source
+        sources = self.sources(entry_id, model)
+        if not sources:
+            raise KeyError(f"Nothing stored for {entry_id} / {model}")
+        return sources[0]
+
+    def _row(self, entry_id: str, model: str, name: str, source: Optional[str] = None):
+        source = self._source(entry_id, model, source)
+        row = self._db.execute(
+            "SELECT chunk, offset, nbytes, dtype, shape, packed FROM arrays"
+            " WHERE entry_id=? AND model=? AND source=? AND name=?",
+            (entry_id, model, source, name),
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No array {name!r} for {entry_id} / {model} ({source or 'no source'})")
+        chunk, offset, nbytes, dtype, shape, packed = row
+        return chunk, offset, nbytes, np.dtype(dtype), tuple(json.loads(shape)), bool(packed)
+
+    def _bytes(self, chunk: int, offset: int, nbytes: int) -> np.ndarray:
+        if chunk not in self._maps:
+            self._maps[chunk] = np.memmap(self._chunk_path(chunk), dtype=np.uint8, mode="r")
+        return self._maps[chunk][offset:offset + nbytes]
+
+    def names(self, entry_id: str, model: str, source: Optional[str] = None) -> List[str]:
+        source = self._source(entry_id, model, source)
+        rows = self._db.execute("SELECT name FROM arrays WHERE entry_id=? AND model=? AND source=? ORDER BY name",
+                                (entry_id, model, source))
+        return [name for (name,) in rows]
+
+    def keys(self) -> Iterator[Tuple[str, str]]:
+        yield from self._db.execute("SELECT DISTINCT entry_id, model FROM arrays ORDER BY entry_id, model")
+
+    def stats(self) -> Tuple[int, int]:
+        """(number of entry/model pairs, stored bytes)."""
+        n_keys, n_bytes = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(n), 0) FROM (SELECT SUM(nbytes) AS n FROM arrays GROUP BY entry_id, model)"
+        ).fetchone()
+        return n_keys, n_bytes
+
+    def __contains__(self, key: Tuple[str, ...]) -> bool:
+        """(entry_id, model) or (entry_id, model, source)."""
+        where = " AND source=?" if len(key) == 3 else ""
+        return self._db.execute(f"SELECT 1 FROM arrays WHERE entry_id=? AND model=?{where} LIMIT 1",
+                                tuple(key)).fetchone() is not None
+
+    def array(self, entry_id: str, model: str, name: str, source: Optional[str] = None) -> np.ndarray:
+        """Raw arrays are zero-copy views; packed masks are unpacked (a copy). Shapes are as stored."""
+        chunk, offset, nbytes, dtype, shape, packed = self._row(entry_id, model, name, source)
+        data = self._bytes(chunk, offset, nbytes)
+        if not packed:
+            return data.view(dtype).reshape(shape)
+        count = int(np.prod(shape[-2:]))
+        bits = data.reshape(-1, mask_stride(shape))
+        return np.unpackbits(bits, axis=1, count=count).astype(bool).reshape(shape)
+
+    def masks(self, entry_id: str, model: str, source: Optional[str] = None) -> np.ndarray:
+        """The (N, H, W) boolean mask stack ("masks", else the first packed array by name).
+
+        A single stored (H, W) mask comes back with N=1, higher-rank stacks flattened to N.
+        """
+        source = self._source(entry_id, model, source)
+        stack = self.array(entry_id, model, self._mask_name(entry_id, model, source), source)
+        return stack.reshape(-1, *stack.shape[-2:])
+
+    def packed_mask(self, entry_id: str, model: str, index: int, name: Optional[str] = None,
+                    source: Optional[str] = None) -> np.ndarray:
+        """Zero-copy view of one bit-packed mask (np.unpackbits(..., count=H*W) to expand)."""
+        source = self._source(entry_id, model, source)
+        name = name or self._mask_name(entry_id, model, source)
+        chunk, offset, nbytes, dtype, shape, packed = self._row(entry_id, model, name, source)
+        if not packed:
+            raise ValueError(f"{name!r} for {entry_id} / {model} isn't a packed mask stack")
+        stride = mask_stride(shape)
+        n = nbytes // stride
+        if not -n <= index < n:
+            raise IndexError(f"mask {index} out of range for {n} masks")
+        return self._bytes(chunk, offset + (index % n) * stride, stride)
+
+    def mask(self, entry_id: str, model: str, index: int, name: Optional[str] = None,
+             source: Optional[str] = None) -> np.ndarray:
+        """One (H, W) boolean mask, reading only its own bytes."""
+        source = self._source(entry_id, model, source)
+        name = name or self._mask_name(entry_id, model, source)
+        shape = self._row(entry_id, model, name, source)[4]
+        h, w = shape[-2:]
+        bits = self.packed_mask(entry_id, model, index, name, source)
+        return np.unpackbits(bits, count=h * w).astype(bool).reshape(h, w)
+
+    def _mask_name(self, entry_id: str, model: str, source: str) -> str:
+        row = self._db.execute(
+            "SELECT name FROM arrays WHERE entry_id=? AND model=? AND source=? AND packed=1"
+            " ORDER BY name != 'masks', name LIMIT 1",
+            (entry_id, model, source),
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"No packed masks for {entry_id} / {model}")
+        return row[0]
+
+    def export_npz(self, entry_id: str, model: str, dest_dir: str) -> List[str]:
+        """Write the arrays back as the per-image .npz files they were packed from; returns their paths."""
+        paths = []
+        os.makedirs(dest_dir, exist_ok=True)
+        for source in self.sources(entry_id, model):
+            path = os.path.join(dest_dir, source or f"{model}.npz")
+            arrays = {name: self.array(entry_id, model, name, source) for name in self.names(entry_id, model, source)}
+            np.savez_compressed(path, **arrays)
+            paths.append(path)
+        if not paths:
+            raise KeyError(f"Nothing stored for {entry_id} / {model}")
+        return paths
+
+
+# --- Tree conversion ---
+def iter_npz(root: str, task: str) -> Iterator[Tuple[str, str, str]]:
+    """(entry_id, model, npz path) for every mask file under <entry>/SoM/<model>/."""
+    task_dir = os.path.join(root, task)
+    if not os.path.isdir(task_dir):
+        return
+    for entry in sorted(os.listdir(task_dir)):
+        som_dir = os.path.join(task_dir, entry, "SoM")
+        if not os.path.isdir(som_dir):
+            continue
+        for model in sorted(os.listdir(som_dir)):
+            model_dir = os.path.join(som_dir, model)
+            if not os.path.isdir(model_dir):
+                continue
+            for filename in sorted(os.listdir(model_dir)):
+                if filename.endswith(".npz"):
+                    yield f"{task}/{entry}", model, os.path.join(model_dir, filename)
+
+
+def pack(root: str, task: str, delete_npz: bool = False) -> int:
+    store = MaskStore(root, task)
+    packed = 0
+    for entry_id, model, npz_path in iter_npz(root, task):
+        if (entry_id, model, os.path.basename(npz_path)) in store:
+            if delete_npz:
+                os.remove(npz_path)
+            continue
+        try:
+            store.import_npz(npz_path, entry_id, model)
+        except Exception as e:
+            logger.error(f"❌ Failed to pack {npz_path}: {e}")
+            continue
+        packed += 1
+        if delete_npz:
+            os.remove(npz_path)
+    store.close()
+    logger.info(f"📦 {task}: packed {packed} mask files")
+    return packed
+
+
+def unpack(root: str, task: str) -> int:
+    store = MaskStore(root, task)
+    written = 0
+    for entry_id, model in list(store.keys()):
+        dest_dir = os.path.join(root, entry_id, "SoM", model)
+        paths = store.export_npz(entry_id, model, dest_dir)
+        written += len(paths)
+        logger.debug(f"Wrote {paths}")
+    store.close()
+    logger.info(f"📂 {task}: wrote {written} mask files")
+    return written
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["pack", "unpack", "stats"])
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=TASKS)
+    parser.add_argument("--delete-npz", action="store_true", help="remove each .npz once it is in the store")
+    args = parser.parse_args()
+
+    for task in args.tasks:
+        if args.command == "pack":
+            pack(args.root, task, args.delete_npz)
+        elif args.command == "unpack":
+            unpack(args.root, task)
+        else:
+            store = MaskStore(args.root, task)
+            n_keys, n_bytes = store.stats()
+            store.close()
+            print(f"{task:<6} {n_keys:>8} images {n_bytes / 2**20:>10.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
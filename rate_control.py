@@ -0,0 +1,192 @@
+"""Client-side rate limiting shared by the Gemini/OpenAI scripts.
+
+`RateLimiter` paces requests with token buckets (requests/min, tokens/min).
+`AdaptiveRateLimiter` additionally moves its requests/min with AIMD: a little
+faster after every success, halved when the API answers 429/5xx. `call_with_retry`
+wraps an API call with pacing plus jittered exponential backoff on those errors,
+and records latency, retries and token usage into the active telemetry stage.
+"""
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Token bucket refilling `rate_per_minute` tokens per minute, up to `capacity`.
+
+    `reserve` never blocks: it takes the tokens right away (the bucket may go
+    into debt) and returns how many seconds the caller has to wait before using
+    them, so concurrent callers are served in the order they asked.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None, clock=time.monotonic):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute must be positive")
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self._clock = clock
+        self._tokens = self.capacity
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def set_rate(self, rate_per_minute: float, drain: bool = False):
+        """Change the refill rate, scaling the burst capacity with it."""
+        with self._lock:
+            self._refill()
+            new_rate = rate_per_minute / 60.0
+            self.capacity = self.capacity * new_rate / self.rate
+            self.rate = new_rate
+            self._tokens = min(self._tokens, 0.0 if drain else self.capacity)
+
+    def reserve(self, amount: float = 1.0) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+class RateLimiter:
+    """Requests-per-minute and tokens-per-minute limits; `None` means unlimited."""
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+    def reserve(self, tokens: float = 0) -> float:
+        wait = 0.0
+        if self.requests:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return wait
+
+    def acquire(self, tokens: float = 0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens: float = 0):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def record_success(self):
+        pass
+
+    def record_throttle(self):
+        pass
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """RateLimiter whose requests/min follow AIMD on the responses it is told about.
+
+    Each success adds `increase` requests/min (up to `max_rpm`); a throttle
+    multiplies the rate by `decrease` (down to `min_rpm`) and drains the bucket.
+    Throttles within `cooldown` seconds of the last cut count as the same event,
+    so one burst of 429s from concurrent requests halves the rate only once.
+    `clock` drives both the bucket and the cooldown (tests pass a fake one).
+    """
+
+    def __init__(self, requests_per_minute: float = 60, tokens_per_minute: Optional[float] = None,
+                 min_rpm: float = 1, max_rpm: float = 2000, increase: float = 1.0, decrease: float = 0.5,
+                 burst_seconds: float = 5.0, cooldown: float = 5.0, clock=time.monotonic):
+        super().__init__(None, tokens_per_minute)
+        self.rpm = requests_per_minute
+        self.min_rpm = min_rpm
+        self.max_rpm = max_rpm
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.requests = TokenBucket(requests_per_minute, capacity=max(1.0, requests_per_minute / 60.0 * burst_seconds),
+                                    clock=clock)
+        self._clock = clock
+        self._last_cut = float("-inf")
+        self._lock = threading.Lock()
+
+    def record_success(self):
+        with self._lock:
+            if self.rpm >= self.max_rpm:
+                return
+            self.rpm = min(self.max_rpm, self.rpm + self.increase)
+            self.requests.set_rate(self.rpm)
+
+    def record_throttle(self):
+        with self._lock:
+            now = self._clock()
+            if now - self._last_cut < self.cooldown:
+                return
+            self._last_cut = now
+            self.rpm = max(self.min_rpm, self.rpm * self.decrease)
+            self.requests.set_rate(self.rpm, drain=True)
+        logger.warning(f"🐢 Throttled by the API; pacing at {self.rpm:.1f} requests/min")
+
+
+def status_code(exc: BaseException) -> Optional[int]:
+    """HTTP status of an SDK error (`google.genai` uses `.code`, `openai` uses `.status_code`)."""
+    for attr in ("code", "status_code"):
+        code = getattr(exc, attr, None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    code = status_code(exc)
+    if code is not None:
+        return code in RETRYABLE_STATUS
+    text = str(exc)
+    return "RESOURCE_EXHAUSTED" in text or "UNAVAILABLE" in text or isinstance(exc, (TimeoutError, ConnectionError))
+
+
+def backoff_delay(attempt: int, base_delay: float = 1.0, max_delay: float = 60.0) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(max_delay, base * 2**attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def call_with_retry(fn: Callable, *args, limiter: Optional[RateLimiter] = None, tokens: float = 0,
+                    max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0, **kwargs):
+    """Call `fn(*args, **kwargs)` paced by `limiter`, retrying 429/5xx with jittered backoff.
+
+    Non-retryable errors, and the last retryable one, are re-raised to the caller.
+    """
+    fn_name = getattr(fn, "__name__", "api")
+    model = kwargs.get("model") or getattr(getattr(fn, "__self__", None), "model", None)
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire(tokens)
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if not is_retryable(e) or attempt == max_retries:
+                telemetry.record_error(fn_name, e)
+                if limiter and is_retryable(e):
+                    limiter.record_throttle()
+                raise
+            if limiter:
+                limiter.record_throttle()
+            telemetry.record_retry(fn_name, status_code(e) == 429 or "RESOURCE_EXHAUSTED" in str(e))
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"🔁 Retryable API error ({e}); retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+        telemetry.record_api_call(fn_name, time.perf_counter() - start, result, model)
+        if limiter:
+            limiter.record_success()
+        return result
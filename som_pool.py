@@ -0,0 +1,168 @@
+"""Worker-pool mode for add_som.py.
+
+Each worker process binds to one device, builds its own SoM instance once and
+then pulls whole entries (one model_output dir and its pending images) from a
+shared queue, so a slow entry never holds up a fixed shard. The parent logs
+progress, throughput and an ETA. add_som.process_image does the actual work, so
+already-processed images are still skipped and re-running resumes.
+
+    python som_pool.py --root YOUR-DATA-ROOT --devices cuda:0 cuda:1 --workers-per-device 2
+    python som_pool.py --root /tmp/fake-tree --dummy --workers-per-device 4   # CPU test
+"""
+import argparse
+import logging
+import multiprocessing as mp
+import os
+import queue
+import random
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from devices import bind_device
+from manifest import Manifest
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+TASKS = ["TIG", "TIE", "SRIG", "SRIE", "MRIG", "MRIE"]
+IMAGE_EXTS = {"jpg", "jpeg", "png"}
+
+
+class DummySoM:
+    """Stands in for imagen_hub's SoM: returns the input image after `delay` seconds.
+
+    A `failure_rate` fraction of calls raise RuntimeError.
+    """
+
+    def __init__(self, delay: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.delay = delay
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+
+    def add_marks(self, image_path=None, save_dir=None, **kwargs):
+        from PIL import Image
+        if self.delay:
+            time.sleep(self.delay)
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise RuntimeError("SoM segmentation failed (simulated)")
+        return Image.open(image_path).convert("RGB"), None
+
+
+def list_pending(root: str, tasks: List[str], use_manifest: bool = True) -> List[Tuple[str, List[str]]]:
+    """(model_output dir, [filenames]) per entry that still has images without a SoM preview."""
+    by_dir: Dict[str, List[str]] = defaultdict(list)
+    if use_manifest:
+        manifest = Manifest(root)
+        manifest.refresh(tasks)
+        for task in tasks:
+            for model_output_dir, filename in manifest.pending_som(task):
+                by_dir[model_output_dir].append(filename)
+        return sorted(by_dir.items())
+    for task in tasks:
+        task_dir = os.path.join(root, task)
+        if not os.path.isdir(task_dir):
+            continue
+        for entry in sorted(os.listdir(task_dir)):
+            model_output_dir = os.path.join(task_dir, entry, "model_output")
+            if not os.path.isdir(model_output_dir):
+                continue
+            for filename in sorted(os.listdir(model_output_dir)):
+                stem, ext = os.path.splitext(filename)
+                if ext[1:].lower() not in IMAGE_EXTS:
+                    continue
+                som_path = os.path.join(task_dir, entry, "SoM", stem, filename)
+                if not os.path.exists(som_path):
+                    by_dir[model_output_dir].append(filename)
+    return sorted(by_dir.items())
+
+
+def worker(rank: int, device: str, jobs, results, dummy: bool, dummy_delay: float):
+    bind_device(device)
+    import add_som
+    add_som.som = DummySoM(dummy_delay) if dummy else add_som.load_som()
+    logging.info(f"🧵 SoM worker {rank} ready on {device}")
+    while True:
+        item = jobs.get()
+        if item is None:
+            break
+        model_output_dir, filenames = item
+        for filename in filenames:
+            results.put((rank, add_som.process_image(model_output_dir, filename)))
+    results.put((rank, "exit"))
+
+
+def run(args: argparse.Namespace) -> Dict[str, int]:
+    entries = list_pending(args.root, args.tasks, not args.no_manifest)
+    total = sum(len(filenames) for _, filenames in entries)
+    devices = args.devices or ["cuda:0"]
+    slots = [device for device in devices for _ in range(args.workers_per_device)]
+    logging.info(f"📋 {total} images in {len(entries)} entries; {len(slots)} SoM workers on {devices}")
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+    if not entries:
+        return counts
+
+    ctx = mp.get_context("spawn")
+    jobs, results = ctx.Queue(), ctx.Queue()
+    for item in entries:
+        jobs.put(item)
+    for _ in slots:
+        jobs.put(None)
+    procs = [
+        ctx.Process(target=worker, args=(rank, device, jobs, results, args.dummy, args.dummy_delay))
+        for rank, device in enumerate(slots)
+    ]
+    for p in procs:
+        p.start()
+
+    start = last_log = time.perf_counter()
+    running = len(procs)
+    while running:
+        try:
+            _, status = results.get(timeout=1.0)
+        except queue.Empty:
+            if not any(p.is_alive() for p in procs):
+                break
+            continue
+        if status == "exit":
+            running -= 1
+            continue
+        counts[status] += 1
+        now = time.perf_counter()
+        if now - last_log >= args.log_every:
+            last_log = now
+            finished = sum(counts.values())
+            rate = counts["done"] / (now - start)
+            eta = (total - finished) / rate if rate else float("inf")
+            logging.info(
+                f"📈 {finished}/{total} ({counts['done']} done, {counts['skipped']} skipped, {counts['failed']} failed)"
+                f" | {rate:.2f} img/s | ETA {eta / 60:.1f} min"
+            )
+    for p in procs:
+        p.join()
+
+    elapsed = time.perf_counter() - start
+    failed = [i for i, p in enumerate(procs) if p.exitcode != 0]
+    if failed:
+        logging.warning(f"⚠️ workers {failed} exited abnormally; re-run to pick up their entries")
+    logging.info(
+        f"🏁 {counts['done']} SoM previews in {elapsed:.1f}s ({counts['done'] / elapsed if elapsed else 0:.2f} img/s),"
+        f" {counts['skipped']} skipped, {counts['failed']} failed"
+    )
+    return counts
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=TASKS)
+    parser.add_argument("--devices", nargs="+", default=None, help="e.g. cuda:0 cuda:1, or cpu (default: cuda:0)")
+    parser.add_argument("--workers-per-device", type=int, default=1)
+    parser.add_argument("--log-every", type=float, default=30.0, help="seconds between progress lines")
+    parser.add_argument("--no-manifest", action="store_true")
+    parser.add_argument("--dummy", action="store_true", help="use a CPU dummy SoM instead of imagen_hub's")
+    parser.add_argument("--dummy-delay", type=float, default=0.0)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
@@ -0,0 +1,224 @@
+"""Re-render SoM previews from saved masks, without re-running segmentation.
+
+When only `alpha`, `anno_mode` or `text_size` of the add_marks call changes,
+the semantic-SAM masks are still valid. This script reloads them (from the
+MaskStore if the task was packed, else from the .npz next to each preview),
+composites the overlay on model_output/<model>.png with NumPy and overwrites
+SoM/<model>/<model>.png. Mark numbers keep the stored mask order, so mark k
+still refers to the same region.
+
+    python som_render.py --root YOUR-DATA-ROOT --alpha 0.4 --anno-mode Mask Mark --text-size 640
+"""
+import argparse
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+from mask_store import STORE_DIR, MaskStore, iter_npz
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+TASKS = ["TIG", "TIE", "SRIG", "SRIE", "MRIG", "MRIE"]
+ANNO_MODES = ("Mask", "Box", "Mark")
+# Label font size at a shorter image side of `text_size` px; scales with the image
+BASE_FONT = 18
+
+
+def palette(n: int, seed: int = 0) -> np.ndarray:
+    """(n, 3) uint8 colors, stable for a given n."""
+    rng = np.random.default_rng(seed)
+    return rng.integers(40, 256, size=(n, 3), dtype=np.uint8)
+
+
+def fit_masks(masks: np.ndarray, height: int, width: int) -> np.ndarray:
+    """Nearest-neighbour resize of an (N, h, w) stack to the image size."""
+    n, h, w = masks.shape
+    if (h, w) == (height, width):
+        return masks
+    rows = (np.arange(height) * h // height)
+    cols = (np.arange(width) * w // width)
+    return masks[:, rows[:, None], cols[None, :]]
+
+
+def label_map(masks: np.ndarray) -> np.ndarray:
+    """(H, W) index of the smallest mask covering each pixel, -1 where none does.
+
+    Smaller masks win so they aren't hidden under the large regions they sit in.
+    """
+    n = masks.shape[0]
+    if n == 0:
+        return np.full(masks.shape[1:], -1, dtype=np.int32)
+    areas = masks.reshape(n, -1).sum(axis=1)
+    order = np.argsort(-areas, kind="stable")         # largest first ...
+    stacked = masks[order][::-1]                      # ... so the smallest is first here
+    top = np.argmax(stacked, axis=0)
+    labels = order[::-1][top].astype(np.int32)
+    labels[~stacked.any(axis=0)] = -1
+    return labels
+
+
+def boundaries(labels: np.ndarray) -> np.ndarray:
+    edge = np.zeros(labels.shape, dtype=bool)
+    edge[:-1] |= labels[:-1] != labels[1:]
+    edge[1:] |= labels[:-1] != labels[1:]
+    edge[:, :-1] |= labels[:, :-1] != labels[:, 1:]
+    edge[:, 1:] |= labels[:, :-1] != labels[:, 1:]
+    return edge & (labels >= 0)
+
+
+def boxes(masks: np.ndarray) -> np.ndarray:
+    """(N, 4) x0, y0, x1, y1 of each mask (all zeros for an empty mask)."""
+    rows, cols = masks.any(axis=2), masks.any(axis=1)
+    h, w = masks.shape[1:]
+    y0, x0 = rows.argmax(axis=1), cols.argmax(axis=1)
+    y1, x1 = h - 1 - rows[:, ::-1].argmax(axis=1), w - 1 - cols[:, ::-1].argmax(axis=1)
+    return np.stack([x0, y0, x1, y1], axis=1) * masks.any(axis=(1, 2))[:, None]
+
+
+def mark_points(masks: np.ndarray, labels: np.ndarray) -> np.ndarray:
+    """(N, 2) x, y per mask: its centroid, or its first visible pixel if the centroid falls outside it."""
+    n, h, w = masks.shape
+    # Row/column projections give the centroid without an (N, H*W) float copy of the masks
+    col_counts, row_counts = masks.sum(axis=1), masks.sum(axis=2)
+    area = np.maximum(col_counts.sum(axis=1), 1)
+    cx = (col_counts @ np.arange(w)) / area
+    cy = (row_counts @ np.arange(h)) / area
+    points = np.stack([cx, cy], axis=1).round().astype(int)
+    inside = labels[points[:, 1].clip(0, h - 1), points[:, 0].clip(0, w - 1)] == np.arange(n)
+    # First pixel of each label in the label map, in row-major order
+    shown, first = np.unique(labels.ravel(), return_index=True)
+    keep = shown >= 0
+    first_pixel = np.full(n, -1)
+    first_pixel[shown[keep]] = first[keep]
+    for i in np.flatnonzero(~inside & (first_pixel >= 0)):
+        y, x = divmod(int(first_pixel[i]), w)
+        points[i] = (x, y)
+    return points
+
+
+def load_font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1
+        return ImageFont.load_default()
+
+
+def render(image: Image.Image, masks: np.ndarray, alpha: float = 0.6,
+           anno_mode: Sequence[str] = ("Mask", "Mark"), text_size: int = 800) -> Image.Image:
+    rgb = np.asarray(image.convert("RGB"))
+    h, w = rgb.shape[:2]
+    masks = fit_masks(masks.astype(bool, copy=False), h, w)
+    colors = palette(len(masks))
+    labels = label_map(masks)
+
+    out = rgb.astype(np.float32)
+    if "Mask" in anno_mode and len(masks):
+        covered = labels >= 0
+        out[covered] = out[covered] * (1 - alpha) + colors[labels[covered]] * alpha
+        edge = boundaries(labels)
+        out[edge] = colors[labels[edge]]
+    preview = Image.fromarray(out.round().clip(0, 255).astype(np.uint8))
+
+    if ("Box" in anno_mode or "Mark" in anno_mode) and len(masks):
+        draw = ImageDraw.Draw(preview)
+        if "Box" in anno_mode:
+            for color, box in zip(colors, boxes(masks)):
+                if box.any():
+                    draw.rectangle(box.tolist(), outline=tuple(int(c) for c in color), width=2)
+        if "Mark" in anno_mode:
+            font = load_font(max(8, round(BASE_FONT * min(h, w) / text_size)))
+            visible = np.zeros(len(masks), dtype=bool)
+            visible[np.unique(labels[labels >= 0])] = True
+            for i, (x, y) in enumerate(mark_points(masks, labels)):
+                if not visible[i]:
+                    continue
+                text = str(i + 1)
+                left, top, right, bottom = draw.textbbox((x, y), text, font=font, anchor="mm")
+                draw.rectangle((left - 2, top - 2, right + 2, bottom + 2), fill=(0, 0, 0))
+                draw.text((x, y), text, fill=(255, 255, 255), font=font, anchor="mm")
+    return preview
+
+
+# --- Tree walk ---
+def iter_saved(root: str, task: str) -> Iterator[Tuple[str, str, Optional[str]]]:
+    """(entry_id, model, npz path or None if the masks live in the store)."""
+    seen = set()
+    if os.path.isdir(os.path.join(root, STORE_DIR, task)):
+        store = MaskStore(root, task)
+        for entry_id, model in store.keys():
+            seen.add((entry_id, model))
+            yield entry_id, model, None
+        store.close()
+    for entry_id, model, npz_path in iter_npz(root, task):
+        if (entry_id, model) not in seen:
+            yield entry_id, model, npz_path
+
+
+def load_masks(npz_path: str) -> np.ndarray:
+    with np.load(npz_path, allow_pickle=False) as npz:
+        stacks = [name for name in npz.files if npz[name].dtype == bool and npz[name].ndim == 3]
+        if not stacks:
+            raise ValueError(f"No (N, H, W) boolean masks in {npz_path}")
+        name = "masks" if "masks" in stacks else stacks[0]
+        return npz[name]
+
+
+def find_output(root: str, entry_id: str, model: str) -> Optional[str]:
+    for ext in (".png", ".jpg", ".jpeg"):
+        path = os.path.join(root, entry_id, "model_output", model + ext)
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def rerender_task(root: str, task: str, alpha: float, anno_mode: Sequence[str], text_size: int,
+                  workers: int = 4) -> int:
+    # SQLite handles can't cross threads, so each worker opens its own store
+    local = threading.local()
+
+    def one(item):
+        entry_id, model, npz_path = item
+        src = find_output(root, entry_id, model)
+        if src is None:
+            logging.warning(f"⚠️ No model output for {entry_id} / {model}")
+            return False
+        try:
+            if npz_path is None:
+                if not hasattr(local, "store"):
+                    local.store = MaskStore(root, task)
+                masks = local.store.masks(entry_id, model)
+            else:
+                masks = load_masks(npz_path)
+            preview = render(Image.open(src), masks, alpha, anno_mode, text_size)
+            preview.save(os.path.join(root, entry_id, "SoM", model, os.path.basename(src)))
+            return True
+        except Exception as e:
+            logging.warning(f"Failed to re-render {entry_id} / {model}: {e}")
+            return False
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        done = sum(pool.map(one, iter_saved(root, task)))
+    logging.info(f"🎨 {task}: re-rendered {done} SoM previews")
+    return done
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default="YOUR-DATA-ROOT")
+    parser.add_argument("--tasks", nargs="+", default=TASKS)
+    parser.add_argument("--alpha", type=float, default=0.6)
+    parser.add_argument("--anno-mode", nargs="+", default=["Mask", "Mark"], choices=ANNO_MODES)
+    parser.add_argument("--text-size", type=int, default=800)
+    parser.add_argument("--workers", type=int, default=4)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    for task in args.tasks:
+        rerender_task(args.root, task, args.alpha, args.anno_mode, args.text_size, args.workers)
@@ -0,0 +1,326 @@
+"""Per-stage telemetry shared by the pipeline scripts.
+
+Every script names its stages (clarify_prompt, find_objects,
+evaluate_generated_image, infer_one_image, add_marks, ...); `call_with_retry`
+and `cached_upload` then record into whichever stage is active on the calling
+thread, so the hot paths need no bookkeeping of their own. Per stage:
+
+- seconds:           wall time of the whole stage (uploads + API + retries, or the model call)
+- api_seconds:       one successful API attempt, by model
+- upload_seconds:    one Files API upload (cache misses only)
+- calls / errors, retries / throttles, upload_hits / upload_misses
+- input_tokens / output_tokens from `usage_metadata` (or the judge reply)
+
+Latencies keep count/sum/min/max exactly and a bounded reservoir for the
+percentiles, so a long sweep doesn't grow memory.
+
+    from telemetry import stage, report
+    with stage("clarify_prompt"):
+        response = call_with_retry(client.models.generate_content, model=model, contents=contents)
+    @stage("find_objects")   # or as a decorator
+    def find_objects(...): ...
+    report()   # summary table at the end of the run
+
+IMAGENWORLD_TELEMETRY_JSONL streams every observation as one JSON line
+(processes can append to the same file, e.g. the som_pool / sharded_runner
+workers), and IMAGENWORLD_TELEMETRY_PROM names a Prometheus text-format file
+that `report()` (re)writes.
+
+    python telemetry.py summary run.jsonl             # merge the events of a (multi-process) run
+    python telemetry.py prometheus run.jsonl > run.prom
+"""
+import argparse
+import contextlib
+import contextvars
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+JSONL_PATH = os.getenv("IMAGENWORLD_TELEMETRY_JSONL")
+PROM_PATH = os.getenv("IMAGENWORLD_TELEMETRY_PROM")
+RESERVOIR_SIZE = 10_000
+QUANTILES = (0.5, 0.95, 0.99)
+
+_stage: contextvars.ContextVar = contextvars.ContextVar("telemetry_stage", default=None)
+
+Key = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+
+
+def _key(stage_name: str, metric: str, labels: Dict[str, Any]) -> Key:
+    return stage_name, metric, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank quantile, `q` in [0, 1]; 0.0 for no values. Shared by every latency report."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class Series:
+    """Exact count/sum/min/max plus a reservoir sample for quantiles."""
+
+    def __init__(self, size: int = RESERVOIR_SIZE, seed: int = 0):
+        self.count = 0
+        self.sum = 0.0
+        self.min = float("inf")
+        self.max = float("-inf")
+        self.sample: List[float] = []
+        self._size = size
+        self._rng = random.Random(seed)
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self.sample) < self._size:
+            self.sample.append(value)
+        else:
+            i = self._rng.randrange(self.count)
+            if i < self._size:
+                self.sample[i] = value
+
+    def quantile(self, q: float) -> float:
+        return percentile(self.sample, q)
+
+
+class Telemetry:
+    def __init__(self, jsonl_path: Optional[str] = None):
+        self.series: Dict[Key, Series] = {}
+        self.counters: Dict[Key, float] = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._jsonl = open(jsonl_path, "a", encoding="utf-8", buffering=1) if jsonl_path else None
+
+    def _emit(self, kind: str, key: Key, value: float):
+        if self._jsonl is None:
+            return
+        stage_name, metric, labels = key
+        line = json.dumps({"t": round(time.time(), 3), "pid": os.getpid(), "type": kind, "stage": stage_name,
+                           "metric": metric, "value": value, "labels": dict(labels)})
+        with self._lock:
+            self._jsonl.write(line + "\n")
+
+    def observe(self, stage_name: str, metric: str, value: float, **labels):
+        key = _key(stage_name, metric, labels)
+        with self._lock:
+            self.series.setdefault(key, Series()).add(value)
+        self._emit("observe", key, value)
+
+    def count(self, stage_name: str, metric: str, value: float = 1, **labels):
+        if not value:
+            return
+        key = _key(stage_name, metric, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+        self._emit("count", key, value)
+
+    # --- Reports ---
+    def _stage_total(self, table: Dict[Key, Any], stage_name: str, metric: str) -> List[Any]:
+        return [v for (s, m, _), v in table.items() if s == stage_name and m == metric]
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """One row per stage, labels (e.g. model) folded together."""
+        with self._lock:
+            stages = sorted({s for s, _, _ in list(self.series) + list(self.counters)})
+            rows = []
+            for name in stages:
+                merged = {}
+                for metric in ("seconds", "api_seconds", "upload_seconds"):
+                    series = Series()
+                    for part in self._stage_total(self.series, name, metric):
+                        series.count += part.count
+                        series.sum += part.sum
+                        series.sample.extend(part.sample)
+                    merged[metric] = series
+                counts = {m: sum(v for (s, mm, _), v in self.counters.items() if s == name and mm == m)
+                          for m in ("calls", "errors", "retries", "throttles", "upload_hits", "upload_misses",
+                                    "input_tokens", "output_tokens")}
+                wall, api, upload = merged["seconds"], merged["api_seconds"], merged["upload_seconds"]
+                rows.append({
+                    "stage": name,
+                    "calls": int(counts["calls"] or wall.count or api.count),
+                    "errors": int(counts["errors"]),
+                    "retries": int(counts["retries"]),
+                    "throttles": int(counts["throttles"]),
+                    "total_s": round(wall.sum or api.sum, 2),
+                    "p50_s": round((wall if wall.count else api).quantile(0.5), 3),
+                    "p95_s": round((wall if wall.count else api).quantile(0.95), 3),
+                    "api_p50_s": round(api.quantile(0.5), 3),
+                    "api_p95_s": round(api.quantile(0.95), 3),
+                    "upload_s": round(upload.sum, 2),
+                    "upload_hits": int(counts["upload_hits"]),
+                    "upload_misses": int(counts["upload_misses"]),
+                    "input_tokens": int(counts["input_tokens"]),
+                    "output_tokens": int(counts["output_tokens"]),
+                })
+        return rows
+
+    def summary_table(self) -> str:
+        header = (f"{'stage':<28} {'calls':>6} {'errors':>6} {'retries':>7} {'total s':>9} {'p50 s':>7} "
+                  f"{'p95 s':>7} {'api p95':>7} {'upload s':>8} {'tok in':>10} {'tok out':>9}")
+        lines = [header, "-" * len(header)]
+        for r in self.summary():
+            lines.append(f"{r['stage']:<28} {r['calls']:>6} {r['errors']:>6} {r['retries']:>7} {r['total_s']:>9.1f} "
+                         f"{r['p50_s']:>7.2f} {r['p95_s']:>7.2f} {r['api_p95_s']:>7.2f} {r['upload_s']:>8.1f} "
+                         f"{r['input_tokens']:>10} {r['output_tokens']:>9}")
+        return "\n".join(lines)
+
+    def to_prometheus(self, prefix: str = "imagenworld") -> str:
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}" if items else ""
+
+        lines = []
+        with self._lock:
+            by_metric: Dict[str, List[Tuple[Tuple, Any]]] = {}
+            for (s, m, labels), series in sorted(self.series.items()):
+                by_metric.setdefault(m, []).append(((("stage", s),) + labels, series))
+            for metric, items in by_metric.items():
+                name = f"{prefix}_{metric}"
+                lines.append(f"# TYPE {name} summary")
+                for labels, series in items:
+                    for q in QUANTILES:
+                        lines.append(f"{name}{fmt(labels, [('quantile', q)])} {series.quantile(q):.6f}")
+                    lines.append(f"{name}_sum{fmt(labels)} {series.sum:.6f}")
+                    lines.append(f"{name}_count{fmt(labels)} {series.count}")
+            by_metric = {}
+            for (s, m, labels), value in sorted(self.counters.items()):
+                by_metric.setdefault(m, []).append(((("stage", s),) + labels, value))
+            for metric, items in by_metric.items():
+                name = f"{prefix}_{metric}_total"
+                lines.append(f"# TYPE {name} counter")
+                for labels, value in items:
+                    lines.append(f"{name}{fmt(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        # Atomic, so a node_exporter textfile collector never reads half a file
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus())
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def from_jsonl(cls, path: str) -> "Telemetry":
+        telemetry = cls()
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                record = telemetry.observe if event["type"] == "observe" else telemetry.count
+                record(event["stage"], event["metric"], event["value"], **event.get("labels", {}))
+        return telemetry
+
+
+_default: Optional[Telemetry] = None
+_default_lock = threading.Lock()
+
+
+def get_telemetry() -> Telemetry:
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = Telemetry(JSONL_PATH)
+        return _default
+
+
+# --- Recording ---
+def current_stage() -> Optional[str]:
+    return _stage.get()
+
+
+@contextlib.contextmanager
+def stage(name: str, **labels) -> Iterator[None]:
+    """Make `name` the active stage on this thread and record its wall time, calls and errors."""
+    token = _stage.set(name)
+    telemetry = get_telemetry()
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        # API errors are already counted where they were raised
+        if not getattr(e, "_telemetry_recorded", False):
+            telemetry.count(name, "errors", **labels)
+        raise
+    finally:
+        _stage.reset(token)
+        telemetry.observe(name, "seconds", time.perf_counter() - start, **labels)
+        telemetry.count(name, "calls", **labels)
+
+
+def usage_tokens(result: Any) -> Tuple[int, int]:
+    """(input, output) tokens of a genai response, an OpenAI response or a JudgeReply."""
+    usage = getattr(result, "usage_metadata", None)
+    if usage is not None:
+        return getattr(usage, "prompt_token_count", 0) or 0, getattr(usage, "candidates_token_count", 0) or 0
+    if hasattr(result, "input_tokens"):
+        return result.input_tokens or 0, result.output_tokens or 0
+    usage = getattr(result, "usage", None)
+    if usage is not None:
+        return (getattr(usage, "input_tokens", None) or getattr(usage, "prompt_tokens", 0) or 0,
+                getattr(usage, "output_tokens", None) or getattr(usage, "completion_tokens", 0) or 0)
+    return 0, 0
+
+
+def record_api_call(fn_name: str, seconds: float, result: Any, model: Optional[str] = None):
+    name = current_stage() or fn_name
+    telemetry = get_telemetry()
+    telemetry.observe(name, "api_seconds", seconds, model=model)
+    tokens_in, tokens_out = usage_tokens(result)
+    telemetry.count(name, "input_tokens", tokens_in, model=model)
+    telemetry.count(name, "output_tokens", tokens_out, model=model)
+
+
+def record_error(fn_name: str, exc: BaseException):
+    get_telemetry().count(current_stage() or fn_name, "errors")
+    try:
+        exc._telemetry_recorded = True
+    except AttributeError:
+        pass
+
+
+def record_retry(fn_name: str, throttled: bool):
+    name = current_stage() or fn_name
+    get_telemetry().count(name, "retries")
+    if throttled:
+        get_telemetry().count(name, "throttles")
+
+
+def report(log: bool = True) -> List[Dict[str, Any]]:
+    """Print the per-stage summary and refresh the Prometheus file, if configured."""
+    telemetry = get_telemetry()
+    rows = telemetry.summary()
+    if log and rows:
+        print(telemetry.summary_table())
+    if PROM_PATH:
+        telemetry.write_prometheus(PROM_PATH)
+        logger.info(f"📊 Wrote Prometheus metrics to {PROM_PATH}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["summary", "prometheus", "json"])
+    parser.add_argument("jsonl", help="event file written via IMAGENWORLD_TELEMETRY_JSONL")
+    args = parser.parse_args()
+    telemetry = Telemetry.from_jsonl(args.jsonl)
+    if args.command == "summary":
+        print(telemetry.summary_table())
+    elif args.command == "prometheus":
+        print(telemetry.to_prometheus(), end="")
+    else:
+        print(json.dumps(telemetry.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
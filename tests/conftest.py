@@ -0,0 +1,8 @@
+import os
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+# The scripts import each other as top-level modules
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "eval", "scripts"))
+sys.path.insert(0, os.path.join(ROOT, "inference", "open-source"))
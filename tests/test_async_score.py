@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+from async_score import OUTPUT_TOKENS, AsyncScorer
+from benchmark import make_tree
+from gemini_score import EVALUATION_INSTRUCTION
+from judges import ImageRef, MockJudge, estimate_input_tokens
+from score_cache import ScoreCache
+
+
+def test_mock_judge_scores_one_entry_end_to_end(tmp_path):
+    make_tree(str(tmp_path), entries=1, tasks=["SRIG"], models=3)
+    entry = next((tmp_path / "SRIG").iterdir())
+    metadata = json.loads((entry / "metadata.json").read_text())
+    outputs = sorted((entry / "model_output").iterdir())
+
+    judge = MockJudge()
+    cache = ScoreCache(str(tmp_path / "scores.sqlite"))
+    scorer = AsyncScorer(judge, concurrency=2, cache=cache)
+    paced = []
+    acquire = scorer.limiter.acquire
+    scorer.limiter.acquire = lambda tokens=0: paced.append(tokens) or acquire(tokens)
+    stats = asyncio.run(scorer.run([str(tmp_path / "SRIG")]))
+
+    assert (stats["scored"], stats["failed"]) == (3, 0)
+    results = json.loads((entry / "gemini_result.json").read_text())
+    assert results["mock"] == {p.stem: judge.ratings(str(p), metadata["prompt"]) for p in outputs}
+    assert set(results["mock_keys"]) == {p.stem for p in outputs}
+    assert len(cache) == 3
+    # Each request is paced by the shared estimator: instruction, prompt, references and the output
+    images = [ImageRef(str(entry / name)) for name in metadata["cond_images"]] + [ImageRef(str(outputs[0]))]
+    expected = estimate_input_tokens([EVALUATION_INSTRUCTION, metadata["prompt"], *images]) + OUTPUT_TOKENS
+    assert paced == [expected] * 3
+
+    # A second run finds nothing left to score
+    stats = asyncio.run(AsyncScorer(judge, cache=cache).run([str(tmp_path / "SRIG")]))
+    assert stats["scored"] + stats["failed"] == 0
@@ -0,0 +1,166 @@
+import json
+import os
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+import upload_cache
+from batch_score import load_state, merge_results, prepare, submit, wait
+from benchmark import make_tree
+from fake_client import FakeGeminiClient
+from gemini_score import EVALUATION_INSTRUCTION
+from judges import CRITERIA
+from score_cache import ScoreCache
+
+TASK = "SRIG"
+
+
+@pytest.fixture(autouse=True)
+def uploads(tmp_path, monkeypatch):
+    """A fresh upload cache per test, so fake file handles never reach the shared one."""
+    monkeypatch.setattr(upload_cache, "_default_cache", upload_cache.UploadCache(str(tmp_path / "uploads.sqlite")))
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = str(tmp_path / "data")
+    make_tree(root, entries=2, tasks=[TASK], models=3, image_size=8)
+    return root
+
+
+def entries(root):
+    task_dir = os.path.join(root, TASK)
+    return sorted(os.listdir(task_dir))
+
+
+def results(root, entry):
+    with open(os.path.join(root, TASK, entry, "gemini_result.json")) as f:
+        return json.load(f)
+
+
+def read_jsonl(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def rated(value):
+    return {c: value for c in CRITERIA}
+
+
+def response(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finish_reason": "STOP"}]}
+
+
+# --- prepare ---
+def test_prepare_writes_one_request_per_pending_output(tree, tmp_path):
+    work = str(tmp_path / "work")
+    cache = ScoreCache(str(tmp_path / "scores.sqlite"))
+    assert prepare(FakeGeminiClient(latency=0), tree, [TASK], work, max_requests=4, cache=cache) == 6
+
+    state = load_state(work)
+    assert state["root"] == tree
+    assert [b["n"] for b in state["batches"]] == [4, 2]
+    lines = [line for b in state["batches"] for line in read_jsonl(b["jsonl"])]
+    keys = [line["key"] for line in lines]
+    assert keys == [f"{TASK}/{e}|{m}" for e in entries(tree) for m in ("bagel", "sdxl", "uno")]
+    assert set(state["cache_keys"]) == set(keys)
+
+    entry = os.path.join(tree, TASK, entries(tree)[0])
+    metadata = json.load(open(os.path.join(entry, "metadata.json")))
+    request = lines[0]["request"]
+    parts = request["contents"][0]["parts"]
+    assert [p.get("text") for p in parts] == [
+        EVALUATION_INSTRUCTION, f"Prompt: {metadata['prompt']}", "Reference images:", None,
+        "Output Image to be Evaluated:", None,
+    ]
+    assert parts[3]["file_data"]["file_uri"] == "fake://" + os.path.join(entry, metadata["cond_images"][0])
+    assert parts[5]["file_data"]["file_uri"] == "fake://" + os.path.join(entry, "model_output", "bagel.png")
+    assert request["generation_config"] == {"response_mime_type": "application/json", "temperature": 0.0}
+
+    # Queued requests aren't written twice, and a work dir stays tied to its root
+    assert prepare(FakeGeminiClient(latency=0), tree, [TASK], work, cache=cache) == 0
+    with pytest.raises(RuntimeError):
+        prepare(FakeGeminiClient(latency=0), str(tmp_path / "other"), [TASK], work, cache=cache)
+
+
+# --- merge ---
+@pytest.mark.parametrize("item, scored", [
+    ({"response": response(json.dumps(rated(4)))}, True),
+    ({"response": response("```json\n" + json.dumps(rated(4)) + "\n```")}, True),
+    ({"error": {"code": 500, "message": "INTERNAL"}}, False),
+    ({"response": response("I can't rate this image.")}, False),
+    ({"response": response(json.dumps({"prompt_relevance": 4, "aesthetic_quality": 4}))}, False),
+    ({"response": {"candidates": []}}, False),
+    ({"response": {}}, False),
+])
+def test_merge_results_lines(tree, tmp_path, item, scored):
+    entry = entries(tree)[0]
+    key = f"{TASK}/{entry}|sdxl"
+    cache = ScoreCache(str(tmp_path / "scores.sqlite"))
+    cache_keys = {key: "k1"}
+    stats = merge_results(tree, [json.dumps(dict(item, key=key)), ""], cache_keys, cache)
+    assert stats == {"scored": int(scored), "failed": int(not scored)}
+    path = os.path.join(tree, TASK, entry, "gemini_result.json")
+    if scored:
+        assert results(tree, entry) == {"gemini": {"sdxl": rated(4)}, "gemini_keys": {"sdxl": "k1"}}
+        assert cache.get("k1") == rated(4)
+        assert cache_keys == {}
+    else:
+        assert not os.path.exists(path)
+        assert cache_keys == {key: "k1"}  # kept for a requeued request
+
+
+def test_merge_results_keeps_newer_scores_unless_rescoring(tree):
+    entry = entries(tree)[0]
+    path = os.path.join(tree, TASK, entry, "gemini_result.json")
+    with open(path, "w") as f:
+        json.dump({"gemini": {"sdxl": rated(1), "bagel": rated(1)}}, f)
+    lines = [json.dumps({"key": f"{TASK}/{entry}|{m}", "response": response(json.dumps(rated(5)))})
+             for m in ("sdxl", "bagel", "uno")]
+    # sdxl was scored by a synchronous run while the batch was queued; bagel's request re-scored a stale score
+    merge_results(tree, lines, {f"{TASK}/{entry}|bagel": "k2"})
+    assert results(tree, entry) == {"gemini": {"sdxl": rated(1), "bagel": rated(5), "uno": rated(5)},
+                                    "gemini_keys": {"bagel": "k2"}}
+
+
+def test_merge_results_into_a_file_without_gemini_scores(tree):
+    # Only another judge has scored this entry; there is no "gemini" field to index into
+    entry = entries(tree)[0]
+    path = os.path.join(tree, TASK, entry, "gemini_result.json")
+    with open(path, "w") as f:
+        json.dump({"mock": {"sdxl": rated(2)}, "mock_keys": {"sdxl": "m1"}}, f)
+    line = json.dumps({"key": f"{TASK}/{entry}|sdxl", "response": response(json.dumps(rated(3)))})
+    assert merge_results(tree, [line]) == {"scored": 1, "failed": 0}
+    assert results(tree, entry) == {"mock": {"sdxl": rated(2)}, "mock_keys": {"sdxl": "m1"},
+                                    "gemini": {"sdxl": rated(3)}}
+
+    # Other fields merge the same way
+    line = json.dumps({"key": f"{TASK}/{entry}|bagel", "response": response(json.dumps(rated(4)))})
+    merge_results(tree, [line], {f"{TASK}/{entry}|bagel": "m2"}, field="mock")
+    assert results(tree, entry)["mock"] == {"sdxl": rated(2), "bagel": rated(4)}
+    assert results(tree, entry)["mock_keys"] == {"sdxl": "m1", "bagel": "m2"}
+
+
+# --- Against the fake batch endpoint ---
+def test_fake_batch_run_merges_and_requeues_failures(tree, tmp_path):
+    work = str(tmp_path / "work")
+    cache = ScoreCache(str(tmp_path / "scores.sqlite"))
+    client = FakeGeminiClient(latency=0, batch_latency=0, failure_rate=0.5, seed=1,
+                              responder=lambda parts: json.dumps(rated(3)))
+    assert prepare(client, tree, [TASK], work, cache=cache) == 6
+    submit(client, work)
+    wait(client, work, poll_interval=0, cache=cache)
+    scored = sum(len(results(tree, e).get("gemini", {})) for e in entries(tree)
+                 if os.path.exists(os.path.join(tree, TASK, e, "gemini_result.json")))
+    assert 0 < scored < 6
+    assert len(cache) == scored
+
+    # Failed requests go into a new batch; merged ones aren't requeued
+    client.failure_rate = 0.0
+    assert prepare(client, tree, [TASK], work, cache=cache) == 6 - scored
+    submit(client, work)
+    wait(client, work, poll_interval=0, cache=cache)
+    assert all(results(tree, e)["gemini"] == {m: rated(3) for m in ("bagel", "sdxl", "uno")} for e in entries(tree))
+    assert all(b["merged"] for b in load_state(work)["batches"])
+    assert prepare(client, tree, [TASK], work, cache=cache) == 0
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from batching import Batcher, group_key
+from benchmark import make_tree
+from fake_client import DummyModel
+from generation import GenerationEngine, HubGenerator
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_full_group_is_returned_at_once(clock):
+    batcher = Batcher(batch_size=3, max_wait=2.0, clock=clock)
+    assert batcher.add("a", 1) == []
+    assert batcher.add("b", 2) == []
+    assert batcher.add("a", 3) == []
+    assert batcher.add("a", 4) == [1, 3, 4]
+    assert len(batcher) == 1
+    assert batcher.expired() == []
+
+
+@pytest.mark.parametrize("now, expired, timeout", [
+    (0.0, [], 2.0),
+    (1.0, [], 1.0),
+    (1.999, [], pytest.approx(0.001)),
+    # Groups expire oldest first, each after its own max_wait
+    (2.0, [[1, 3]], 0.5),
+    (2.4, [[1, 3]], pytest.approx(0.1)),
+    (2.5, [[1, 3], [2]], None),
+    (10.0, [[1, 3], [2]], None),
+])
+def test_groups_expire_after_max_wait(clock, now, expired, timeout):
+    batcher = Batcher(batch_size=8, max_wait=2.0, clock=clock)
+    batcher.add("a", 1)
+    clock.now = 0.5
+    batcher.add("b", 2)
+    batcher.add("a", 3)  # joining doesn't extend the group's wait
+    clock.now = now
+    assert batcher.expired() == expired
+    assert batcher.timeout() == timeout
+
+
+def test_refilled_group_starts_a_new_wait(clock):
+    batcher = Batcher(batch_size=2, max_wait=2.0, clock=clock)
+    assert batcher.timeout() is None
+    batcher.add("a", 1)
+    clock.now = 1.5
+    assert batcher.add("a", 2) == [1, 2]
+    assert batcher.timeout() is None
+    batcher.add("a", 3)
+    assert batcher.timeout() == 2.0
+    clock.now = 3.0
+    assert batcher.expired() == []
+    clock.now = 3.5
+    assert batcher.timeout() == 0.0
+    assert batcher.expired() == [[3]]
+
+
+def test_drain_returns_every_open_group(clock):
+    batcher = Batcher(batch_size=4, max_wait=2.0, clock=clock)
+    for key, item in [("a", 1), ("b", 2), ("a", 3)]:
+        batcher.add(key, item)
+    assert batcher.drain() == [[1, 3], [2]]
+    assert len(batcher) == 0 and batcher.timeout() is None
+
+
+def test_group_key_separates_tasks_and_image_sizes():
+    class Img:
+        def __init__(self, size):
+            self.size = size
+
+    assert group_key("TIE", [Img((64, 64))]) == group_key("TIE", [Img((64, 64))])
+    assert group_key("TIE", [Img((64, 64))]) != group_key("TIE", [Img((32, 32))])
+    assert group_key("TIE", [Img((64, 64))]) != group_key("SRIG", [Img((64, 64))])
+    assert group_key("TIG", []) != group_key("TIE", [Img((64, 64))])
+
+
+def test_partial_batch_is_flushed_while_a_load_stalls(tmp_path):
+    root = str(tmp_path / "data")
+    make_tree(root, entries=3, tasks=["TIG"], models=0, image_size=8)
+    entries = sorted(os.listdir(os.path.join(root, "TIG")))
+    gen = HubGenerator("Dummy", model=DummyModel(), batch_size=8, max_wait=0.05)
+    engine = GenerationEngine([gen], root, ["TIG"])
+    release = threading.Event()
+    prepare = engine._prepare
+
+    def stalling_prepare(gen, entry_path):
+        if entry_path.endswith(entries[1]):
+            release.wait(10)
+        return prepare(gen, entry_path)
+
+    engine._prepare = stalling_prepare
+
+    async def main():
+        queue: asyncio.Queue = asyncio.Queue()
+        with ThreadPoolExecutor(max_workers=1) as loader:
+            feed = asyncio.create_task(engine._feed(gen, queue, loader))
+            try:
+                # Without a timer this would wait for the stalled load (or the end of input)
+                first = await asyncio.wait_for(queue.get(), timeout=5)
+            finally:
+                release.set()
+            await feed
+        rest = []
+        while not queue.empty():
+            rest.append(await queue.get())
+        return first, rest
+
+    first, rest = asyncio.run(main())
+    assert [os.path.basename(job.entry_path) for job in first] == entries[:1]
+    assert sorted(os.path.basename(job.entry_path) for jobs in rest for job in jobs) == entries[1:]
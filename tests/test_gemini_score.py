@@ -0,0 +1,193 @@
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("google.genai")
+
+import gemini_score
+from gemini_score import (
+    Sampling,
+    aggregate_samples,
+    evaluate_images_together,
+    evaluate_self_consistent,
+    majority,
+    parse_json_array,
+    request_tag,
+    score_images,
+)
+from judges import CRITERIA, Judge, JudgeReply
+
+
+class ScriptedJudge(Judge):
+    """Replies with the given texts (or score dicts) in call order; exceptions are raised."""
+
+    name = "scripted"
+
+    def __init__(self, replies):
+        super().__init__("scripted-v1")
+        self.replies = list(replies)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _generate(self, parts, temperature):
+        with self._lock:
+            self.calls += 1
+            reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return JudgeReply(reply if isinstance(reply, str) else json.dumps(reply))
+
+
+def rated(value, **overrides):
+    return dict({c: value for c in CRITERIA}, **overrides)
+
+
+# --- Self-consistency sampling ---
+FAIL = ValueError("judge down")
+
+
+@pytest.mark.parametrize("k, min_samples, tolerance, replies, calls, samples, rating", [
+    # Rounds of min_samples; stop once every criterion agrees within tolerance
+    (5, 2, 0.0, [rated(3)] * 5, 2, 2, 3),
+    (5, 2, 1.0, [rated(3), rated(4)] + [rated(1)] * 3, 2, 2, 3.5),
+    (5, 2, 0.0, [rated(3), rated(4), rated(3), rated(3), rated(3)], 5, 5, 3),
+    (4, 2, 0.0, [rated(3), rated(4), rated(5), rated(5)], 4, 4, 4.5),
+    (5, 3, 0.0, [rated(2)] * 5, 3, 3, 2),
+    # One criterion disagreeing is enough to keep sampling
+    (4, 2, 0.0, [rated(3), rated(3, artifacts=4), rated(3), rated(3)], 4, 4, 3),
+    # k below min_samples: a single round of k
+    (1, 2, 0.0, [rated(4)], 1, 1, 4),
+    # Failed calls count towards k but not towards agreement
+    (3, 2, 0.0, [FAIL, rated(3), rated(3)], 3, 2, 3),
+    (2, 2, 0.0, [FAIL, rated(3)], 2, 1, 3),
+    # Non-numeric ratings and replies without all criteria are dropped like failures
+    (3, 2, 0.0, [rated("high"), rated(2), rated(2)], 3, 2, 2),
+    (3, 2, 0.0, [{"prompt_relevance": 5}, rated(2), rated(2)], 3, 2, 2),
+])
+def test_self_consistent_sampling(k, min_samples, tolerance, replies, calls, samples, rating):
+    judge = ScriptedJudge(replies)
+    result = evaluate_self_consistent(judge, "out.png", "a cat", [], k=k, min_samples=min_samples, tolerance=tolerance)
+    assert judge.calls == calls
+    assert result["samples"] == samples
+    assert result["prompt_relevance"] == rating
+    assert all(len(r) == samples for r in result["ratings"].values())
+
+
+def test_self_consistent_sampling_all_failed():
+    judge = ScriptedJudge([FAIL, "not json", FAIL])
+    assert evaluate_self_consistent(judge, "out.png", "a cat", [], k=3, min_samples=2) is None
+    assert judge.calls == 3
+
+
+@pytest.mark.parametrize("ratings, median, majority_rating, variance", [
+    ([1, 2, 5], 2, 2, 26 / 9),
+    ([3, 4], 3.5, 3, 0.25),
+    ([1, 2, 2, 5], 2, 2, 2.25),
+    # Ties go to the rating closest to the median, then the lower one
+    ([1, 1, 5, 5], 3, 1, 4.0),
+    ([2, 2, 3, 3, 5], 3, 3, 1.2),
+    ([4], 4, 4, 0.0),
+])
+def test_aggregate_samples(ratings, median, majority_rating, variance):
+    samples = [rated(r, artifacts=1) for r in ratings]
+    by_median = aggregate_samples(samples)
+    by_majority = aggregate_samples(samples, "majority")
+    assert by_median["aesthetic_quality"] == median
+    assert by_majority["aesthetic_quality"] == majority_rating == majority([float(r) for r in ratings])
+    assert by_median["variance"]["aesthetic_quality"] == pytest.approx(variance)
+    assert by_median["artifacts"] == by_majority["artifacts"] == 1
+    assert by_median["variance"]["artifacts"] == 0
+    assert by_median["samples"] == by_majority["samples"] == len(ratings)
+    assert by_median["ratings"]["aesthetic_quality"] == [float(r) for r in ratings]
+
+
+def test_sampling_mode_is_part_of_the_cache_tag():
+    assert Sampling().cache_tag() is None
+    assert request_tag(False, Sampling()) is None
+    assert request_tag(False, Sampling(k=5)) == Sampling(k=5).cache_tag()
+    assert Sampling(k=5).cache_tag() != Sampling(k=5, tolerance=1.0).cache_tag()
+    assert request_tag(True, Sampling(k=5)) == request_tag(True)
+
+
+def test_score_image_single_call_without_sampling():
+    judge = ScriptedJudge([rated(4)])
+    assert gemini_score.score_image(judge, "out.png", "a cat", [], Sampling()) == rated(4)
+    assert judge.calls == 1
+
+
+# --- Multi-image requests ---
+@pytest.mark.parametrize("text, expected", [
+    ('[{"image": 1}, {"image": 2}]', [{"image": 1}, {"image": 2}]),
+    ('```json\n[1, 2]\n```', [1, 2]),
+    ('Here are the ratings: [1, 2] as requested.', [1, 2]),
+    ('{"results": [1, 2]}', [1, 2]),
+    ('{"note": "ok", "results": [{"image": 1}]}', [{"image": 1}]),
+    # Malformed or missing arrays
+    ("", None),
+    ("no json here", None),
+    ('[{"image": 1}, {"image": 2}', None),
+    ('[{"image": 1,}]', None),
+    ('{"prompt_relevance": 3}', None),
+])
+def test_parse_json_array(text, expected):
+    assert parse_json_array(text) == expected
+
+
+class FixedOrder:
+    """Stands in for the rng: shows the last image first (for three images: 2, 0, 1)."""
+
+    def shuffle(self, order):
+        order[:] = order[-1:] + order[:-1]
+
+
+def labelled(*labels, **overrides):
+    """Array reply rating each item with its label, so the test can see which item landed where."""
+    return json.dumps([dict(rated(int(label)), image=label, **overrides) for label in labels])
+
+
+@pytest.mark.parametrize("reply, positions", [
+    # Label k is the k-th image shown: label 1 -> image 2, label 2 -> image 0, label 3 -> image 1
+    (labelled(1, 2, 3), [2, 3, 1]),
+    (labelled(3, 1, 2), [2, 3, 1]),
+    (labelled("1", "2", "3"), [2, 3, 1]),
+    (json.dumps([rated(1), rated(2), rated(3)]), [2, 3, 1]),  # unlabelled: list position
+    # Out-of-range labels and non-object items are skipped
+    (labelled(1, 4, 0), [None, None, 1]),
+    (json.dumps(["oops", dict(rated(2), image=2)]), [2, None, None]),
+    # Items missing a criterion, and replies that aren't an array, leave their images unscored
+    (json.dumps([dict(rated(1), image=1), {"image": 2, "prompt_relevance": 2}, dict(rated(3), image=3)]),
+     [None, 3, 1]),
+    (json.dumps(rated(1)), [None, None, None]),
+    ('[{"image": 1, "prompt_relevance": 1', [None, None, None]),
+])
+def test_images_together_maps_labels_back_to_images(reply, positions):
+    results = evaluate_images_together(ScriptedJudge([reply]), ["a.png", "b.png", "c.png"], "a cat", [],
+                                       rng=FixedOrder())
+    assert [r and r["position"] for r in results] == positions
+    for r in results:
+        if r:
+            assert r["prompt_relevance"] == r["position"] and r["group_size"] == 3 and "image" not in r
+
+
+def test_images_together_judge_error_scores_nothing():
+    results = evaluate_images_together(ScriptedJudge([FAIL]), ["a.png", "b.png"], "a cat", [], rng=FixedOrder())
+    assert results == [None, None]
+
+
+def test_score_images_rescores_left_out_images_alone():
+    # The array only rates label 1 (image 2); images 0 and 1 get plain single-image calls
+    judge = ScriptedJudge([labelled(1), rated(4), rated(5)])
+    results = score_images(judge, ["a.png", "b.png", "c.png"], "a cat", [], group_size=3, rng=FixedOrder())
+    assert judge.calls == 3
+    assert [s["prompt_relevance"] for s, _ in results] == [4, 5, 1]
+    assert [tag for _, tag in results] == [None, None, request_tag(True)]
+
+
+def test_score_images_chunks_by_group_size():
+    # 3 images in groups of 2: one two-image request, then the last image on its own
+    judge = ScriptedJudge([json.dumps([rated(1), rated(2)]), rated(3)])
+    results = score_images(judge, ["a.png", "b.png", "c.png"], "a cat", [], group_size=2, rng=FixedOrder())
+    assert judge.calls == 2
+    assert [tag for _, tag in results] == [request_tag(True), request_tag(True), None]
+    assert results[2][0] == rated(3)
@@ -0,0 +1,51 @@
+import base64
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import rate_control
+from generation import Job, OpenAIGenerator
+
+
+class FakeImages:
+    """`client.images` of the OpenAI SDK: records which endpoint was called."""
+
+    def __init__(self):
+        self.calls = []
+
+    def _reply(self):
+        return SimpleNamespace(data=[SimpleNamespace(b64_json=base64.b64encode(b"png").decode())])
+
+    def generate(self, **kwargs):
+        self.calls.append("generate")
+        return self._reply()
+
+    def edit(self, image, **kwargs):
+        self.calls.append("edit")
+        return self._reply()
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """Stage names call_with_retry records API calls under."""
+    names = []
+    monkeypatch.setattr(rate_control.telemetry, "record_api_call", lambda fn_name, *a, **k: names.append(fn_name))
+    return names
+
+
+def make_job(tmp_path, cond_images):
+    for name in cond_images:
+        (tmp_path / name).write_bytes(b"cond")
+    metadata = {"prompt_refined": "a cat", "cond_images": cond_images}
+    (tmp_path / "metadata.json").write_text(json.dumps(metadata))
+    return Job(str(tmp_path), "TIE" if cond_images else "TIG", metadata)
+
+
+@pytest.mark.parametrize("cond_images, endpoint", [([], "generate"), (["cond.png"], "edit")])
+def test_openai_generator_labels_calls_by_endpoint(tmp_path, stages, cond_images, endpoint):
+    images = FakeImages()
+    generator = OpenAIGenerator(SimpleNamespace(images=images))
+    assert generator.generate(make_job(tmp_path, cond_images)) == b"png"
+    assert images.calls == [endpoint]
+    assert stages == [endpoint]
@@ -0,0 +1,114 @@
+import json
+
+import numpy as np
+import pytest
+
+import human_auto_summary as has
+
+krippendorff = pytest.importorskip("krippendorff")
+stats = pytest.importorskip("scipy.stats")
+
+SCORES = {  # (entry, model) -> gemini criteria, 1-5
+    ("TIG_A_000001", "sdxl"): [5, 4, 4, 3],
+    ("TIG_A_000001", "bagel"): [2, 3, 2, 1],
+    ("TIG_A_000002", "sdxl"): [4, 4, 5, 5],
+    ("TIG_A_000002", "bagel"): [3, 3, 3, 2],
+    ("TIG_B_000003", "sdxl"): [1, 2, 2, 1],
+    ("TIG_B_000003", "bagel"): [4, 5, 4, 4],
+}
+KEYS = list(has.CRITERIA.values())
+
+
+# --- Reductions against the reference implementations ---
+def test_grouped_alpha_matches_krippendorff():
+    rng = np.random.default_rng(0)
+    ratings = rng.integers(1, 6, size=(40, 4)).astype(float)
+    ratings[rng.random(ratings.shape) < 0.25] = np.nan
+    groups = np.repeat([0, 1], 20)
+    alpha = has.grouped_alpha(ratings, groups, 2)
+    for g in range(2):
+        expected = krippendorff.alpha(reliability_data=ratings[groups == g].T, level_of_measurement="interval")
+        assert alpha[g] == pytest.approx(expected)
+
+
+def test_grouped_spearman_matches_scipy_with_ties_and_missing():
+    rng = np.random.default_rng(1)
+    x = rng.integers(1, 5, size=60).astype(float)  # plenty of ties
+    y = x + rng.normal(0, 1.5, size=60)
+    y[[3, 17, 41]] = np.nan
+    groups = rng.integers(0, 3, size=60)
+    rho = has.grouped_spearman(x, y, groups, 3)
+    for g in range(3):
+        ok = (groups == g) & ~np.isnan(y)
+        assert rho[g] == pytest.approx(stats.spearmanr(x[ok], y[ok]).correlation)
+
+
+# --- End to end on a synthetic tree ---
+@pytest.fixture
+def dataset(tmp_path):
+    root = tmp_path / "data"
+    for (entry, model), scores in SCORES.items():
+        entry_dir = root / "TIG" / entry
+        entry_dir.mkdir(parents=True, exist_ok=True)
+        result = entry_dir / "gemini_result.json"
+        data = json.loads(result.read_text()) if result.exists() else {"gemini": {}}
+        data["gemini"][model] = dict(zip(KEYS, scores))
+        result.write_text(json.dumps(data))
+
+    # Two annotators per item, one of them a point off on artifacts; one rating missing
+    records = []
+    for (entry, model), scores in SCORES.items():
+        for annotator, offset in (("a1", 0), ("a2", 1)):
+            record = {"entry_id": f"TIG/{entry}", "model": model, "annotator": annotator}
+            record.update(zip(KEYS, scores))
+            record["artifact"] = max(1, record.pop("artifacts") - offset)
+            records.append(record)
+    records[-1]["prompt_relevance"] = None
+    annotations = tmp_path / "annotations.jsonl"
+    annotations.write_text("\n".join(json.dumps(r) for r in records))
+    return str(root), str(annotations)
+
+
+def summary(dataset, group_by=("model", "task")):
+    root, annotations = dataset
+    return has.summarize(has.load_annotations(annotations), has.load_auto_scores(root, ["TIG"]), group_by)
+
+
+def test_summarize(dataset):
+    rows = {row["model"]: row for row in summary(dataset)}
+    assert set(rows) == {"sdxl", "bagel"}
+    sdxl = rows["sdxl"]
+    assert sdxl["task"] == "TIG" and sdxl["n_items"] == 3
+
+    auto = [np.mean(has.normalize(np.array(SCORES[(e, "sdxl")], dtype=float)))
+            for e in ("TIG_A_000001", "TIG_A_000002", "TIG_B_000003")]
+    assert sdxl["auto_overall_mean"] == pytest.approx(np.mean(auto))
+    assert sdxl["auto_overall_std"] == pytest.approx(np.std(auto, ddof=1))
+    # sdxl's annotators agree with Gemini except for artifacts, so the ranking is identical
+    assert sdxl["human_auto_spearman_rho"] == pytest.approx(1.0)
+    assert 0.0 < sdxl["human_overall_alpha"] < 1.0
+
+    # bagel's missing prompt_relevance is skipped, not counted as zero
+    bagel_relevance = [2, 3, 4]  # the third item has a single rating
+    assert rows["bagel"]["prompt_relevance_mean"] == pytest.approx(np.mean(has.normalize(np.array(bagel_relevance))))
+
+
+def test_summarize_by_topic(dataset):
+    rows = summary(dataset, ("model", "topic"))
+    keys = {(row["model"], row["topic"]): row["n_items"] for row in rows}
+    assert keys == {("sdxl", "A"): 2, ("sdxl", "B"): 1, ("bagel", "A"): 2, ("bagel", "B"): 1}
+    single = next(row for row in rows if row["n_items"] == 1)
+    assert single["human_overall_std"] is None and single["human_auto_spearman_rho"] is None
+
+
+def test_compare(dataset, tmp_path):
+    rows = summary(dataset)
+    reference = tmp_path / "reference.json"
+    reference.write_text(json.dumps(rows))
+    assert has.compare(rows, str(reference), ("model", "task")) == 0
+
+    tampered = json.loads(reference.read_text())
+    tampered[0]["human_overall_mean"] += 0.1
+    tampered[1]["auto_overall_std"] = 0.0
+    reference.write_text(json.dumps(tampered))
+    assert has.compare(rows, str(reference), ("model", "task")) == 2
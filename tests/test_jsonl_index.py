@@ -0,0 +1,36 @@
+import json
+
+import pytest
+
+from jsonl_index import convert
+
+RECORDS = [1, 22, 333, 4444, 55555, -6.5e3, True, None, "a, b", {"k": [1, 2]}, [], 7]
+
+
+def lines(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 8, 1 << 20])
+def test_convert_across_chunk_boundaries(tmp_path, chunk_size):
+    src, dest = tmp_path / "a.json", tmp_path / "a.jsonl"
+    src.write_text("  \n" + json.dumps(RECORDS, indent=1))
+    assert convert(str(src), str(dest), chunk_size=chunk_size) == len(RECORDS)
+    assert lines(dest) == RECORDS
+
+
+def test_convert_compact_numbers(tmp_path):
+    src, dest = tmp_path / "a.json", tmp_path / "a.jsonl"
+    src.write_text("[1,22,333,4444,55555]")
+    assert convert(str(src), str(dest), chunk_size=3) == 5
+    assert lines(dest) == [1, 22, 333, 4444, 55555]
+
+
+def test_convert_rejects_bad_input(tmp_path):
+    src = tmp_path / "a.json"
+    src.write_text('{"not": "an array"}')
+    with pytest.raises(ValueError):
+        convert(str(src), str(tmp_path / "a.jsonl"))
+    src.write_text("[1, 2, {")
+    with pytest.raises(json.JSONDecodeError):
+        convert(str(src), str(tmp_path / "a.jsonl"), chunk_size=2)
@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+
+import pytest
+
+from benchmark import make_tree
+from manifest import Manifest
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = str(tmp_path / "data")
+    make_tree(root, entries=3, tasks=["TIG", "TIE"], models=2, image_size=8)
+    return root
+
+
+def entry(root, task, i):
+    return os.path.join(root, task, sorted(os.listdir(os.path.join(root, task)))[i])
+
+
+def write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+    # Same-second rewrites must still register; stamps are nanosecond mtimes, but be explicit
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def test_unchanged_tree_is_skipped(tree, tmp_path):
+    manifest = Manifest(tree, str(tmp_path / "m.sqlite"))
+    assert manifest.refresh(["TIG", "TIE"]) == {"entries": 6, "updated": 6, "removed": 0}
+    assert manifest.refresh(["TIG", "TIE"]) == {"entries": 6, "updated": 0, "removed": 0}
+    # A second instance on the same index starts warm too
+    assert Manifest(tree, str(tmp_path / "m.sqlite")).refresh(["TIG", "TIE"])["updated"] == 0
+
+
+def test_new_modified_and_deleted_entries(tree, tmp_path):
+    manifest = Manifest(tree, str(tmp_path / "m.sqlite"))
+    manifest.refresh(["TIG", "TIE"])
+    assert len(manifest.pending_prompt_refined("TIG")) == 3
+    assert len(manifest.pending_scores("TIE")) == 3
+
+    # Modified: metadata gains prompt_refined, and one entry gets scores for both outputs
+    first = entry(tree, "TIG", 0)
+    with open(os.path.join(first, "metadata.json")) as f:
+        meta = json.load(f)
+    write_json(os.path.join(first, "metadata.json"), dict(meta, prompt_refined="refined"))
+    scored, unscored = entry(tree, "TIE", 1), entry(tree, "TIE", 2)
+    outputs = [os.path.splitext(n)[0] for n in os.listdir(os.path.join(scored, "model_output"))]
+    write_json(os.path.join(scored, "gemini_result.json"), {"gemini": {m: {} for m in outputs}})
+    # New: a copy of an entry; deleted: another one
+    shutil.copytree(first, os.path.join(tree, "TIG", "TIG_A_000099"))
+    shutil.rmtree(entry(tree, "TIE", 0))
+
+    stats = manifest.refresh(["TIG", "TIE"])
+    assert stats["removed"] == 1 and stats["entries"] == 6 and stats["updated"] == 3
+    assert os.path.join(first, "metadata.json") not in manifest.pending_prompt_refined("TIG")
+    assert len(manifest.pending_prompt_refined("TIG")) == 2
+    assert os.path.join(tree, "TIG", "TIG_A_000099") in manifest.pending_outputs("x.png", "TIG")
+    assert scored not in manifest.pending_scores("TIE")
+    assert manifest.pending_scores("TIE") == [unscored]
+
+    # New model output and SoM preview in an existing entry
+    output_dir = os.path.join(first, "model_output")
+    shutil.copy(os.path.join(output_dir, os.listdir(output_dir)[0]), os.path.join(output_dir, "new.png"))
+    som_dir = os.path.join(first, "SoM", "new")
+    os.makedirs(som_dir)
+    shutil.copy(os.path.join(output_dir, "new.png"), os.path.join(som_dir, "new.png"))
+    assert manifest.refresh(["TIG"])["updated"] == 1
+    pending_som = manifest.pending_som("TIG")
+    assert (output_dir, "new.png") not in pending_som
+    assert len([p for p in pending_som if p[0] == output_dir]) == 2
+
+
+def test_queries_refresh_lazily(tree, tmp_path):
+    manifest = Manifest(tree, str(tmp_path / "m.sqlite"))
+    assert len(manifest.pending_outputs("x.png", "TIE")) == 3
+    assert manifest.pending_outputs("x.png", "TIG") == [entry(tree, "TIG", i) for i in range(3)]
@@ -0,0 +1,80 @@
+import os
+
+import numpy as np
+import pytest
+
+from mask_store import MaskStore, pack, unpack
+
+rng = np.random.default_rng(0)
+ARRAYS = {
+    "mask2d": rng.random((5, 7)) < 0.5,
+    "masks": rng.random((3, 5, 7)) < 0.5,
+    "mask4d": rng.random((2, 3, 5, 7)) < 0.5,
+    "areas": rng.integers(0, 1000, size=6).astype(np.int64),
+    "scores": rng.random((3, 2)).astype(np.float32),
+    "flags": np.array([True, False, True]),  # 1-D bool stays raw
+}
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = MaskStore(str(tmp_path), "TIG")
+    yield s
+    s.close()
+
+
+@pytest.mark.parametrize("name", list(ARRAYS))
+def test_array_round_trip(store, name):
+    store.put("TIG/e1", "sdxl", name, ARRAYS[name], source="sdxl.npz")
+    out = store.array("TIG/e1", "sdxl", name)
+    assert out.shape == ARRAYS[name].shape and out.dtype == ARRAYS[name].dtype
+    assert np.array_equal(out, ARRAYS[name])
+
+
+def test_masks_are_presented_as_stacks(store):
+    store.put("TIG/e1", "sdxl", "a_first", ARRAYS["mask2d"])
+    assert store.masks("TIG/e1", "sdxl").shape == (1, 5, 7)
+    store.put("TIG/e1", "sdxl", "masks", ARRAYS["mask4d"])
+    # "masks" wins over the alphabetically first array
+    stack = store.masks("TIG/e1", "sdxl")
+    assert np.array_equal(stack, ARRAYS["mask4d"].reshape(6, 5, 7))
+    assert np.array_equal(store.mask("TIG/e1", "sdxl", 4), stack[4])
+
+
+def write_npz(tmp_path, entry, model, filename, **arrays):
+    model_dir = tmp_path / "TIG" / entry / "SoM" / model
+    model_dir.mkdir(parents=True, exist_ok=True)
+    np.savez(model_dir / filename, **arrays)
+    return model_dir / filename
+
+
+def test_pack_and_unpack_keep_every_npz(tmp_path):
+    first = write_npz(tmp_path, "TIG_A_000001", "sdxl", "a.npz", masks=ARRAYS["mask2d"], areas=ARRAYS["areas"])
+    second = write_npz(tmp_path, "TIG_A_000001", "sdxl", "b.npz", masks=ARRAYS["mask4d"], scores=ARRAYS["scores"])
+    expected = {path: dict(np.load(path)) for path in (first, second)}
+
+    assert pack(str(tmp_path), "TIG", delete_npz=True) == 2
+    assert not first.exists() and not second.exists()
+    # Re-packing finds nothing new and deletes nothing it hasn't stored
+    assert pack(str(tmp_path), "TIG", delete_npz=True) == 0
+
+    assert unpack(str(tmp_path), "TIG") == 2
+    for path, arrays in expected.items():
+        with np.load(path) as npz:
+            assert sorted(npz.files) == sorted(arrays)
+            for name, value in arrays.items():
+                assert npz[name].shape == value.shape and npz[name].dtype == value.dtype
+                assert np.array_equal(npz[name], value)
+
+
+def test_pack_keeps_unstored_npz_when_one_is_already_packed(tmp_path):
+    first = write_npz(tmp_path, "TIG_A_000001", "sdxl", "a.npz", masks=ARRAYS["masks"])
+    pack(str(tmp_path), "TIG")
+    second = write_npz(tmp_path, "TIG_A_000001", "sdxl", "b.npz", masks=ARRAYS["mask2d"])
+    assert pack(str(tmp_path), "TIG", delete_npz=True) == 1
+    assert not first.exists() and not second.exists()
+    store = MaskStore(str(tmp_path), "TIG")
+    assert store.sources("TIG/TIG_A_000001", "sdxl") == ["a.npz", "b.npz"]
+    assert np.array_equal(store.array("TIG/TIG_A_000001", "sdxl", "masks", source="b.npz"), ARRAYS["mask2d"])
+    store.close()
+    assert os.listdir(tmp_path / "TIG" / "TIG_A_000001" / "SoM" / "sdxl") == []
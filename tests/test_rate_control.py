@@ -0,0 +1,146 @@
+import json
+
+import pytest
+
+import rate_control
+from fake_client import FakeAPIError, FakeGeminiClient
+from rate_control import AdaptiveRateLimiter, TokenBucket, call_with_retry, is_retryable
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    """Record the sleeps of call_with_retry/acquire instead of taking them."""
+    sleeps = []
+    monkeypatch.setattr(rate_control.time, "sleep", sleeps.append)
+    return sleeps
+
+
+# --- Token bucket ---
+def test_bucket_serves_reservations_in_order():
+    clock = FakeClock()
+    bucket = TokenBucket(60, capacity=2, clock=clock)  # one token per second
+    assert [bucket.reserve() for _ in range(5)] == [0.0, 0.0, 1.0, 2.0, 3.0]
+    clock.now = 2.5  # 2.5 tokens back, 0.5 of debt left
+    assert bucket.reserve() == pytest.approx(1.5)
+
+
+def test_bucket_refill_is_capped_and_rate_change_scales_capacity():
+    clock = FakeClock()
+    bucket = TokenBucket(60, capacity=2, clock=clock)
+    clock.now = 100.0
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 1.0]
+    bucket.set_rate(120, drain=True)  # 2 tokens/s, capacity 4, bucket emptied (debt kept)
+    assert bucket.capacity == 4
+    assert bucket.reserve() == pytest.approx(1.0)
+
+
+# --- AIMD ---
+def test_throttle_burst_halves_once_within_cooldown():
+    clock = FakeClock(1000.0)
+    limiter = AdaptiveRateLimiter(120, cooldown=5.0, clock=clock)
+    for _ in range(10):  # a burst of 429s from concurrent requests
+        limiter.record_throttle()
+    assert limiter.rpm == 60
+    clock.now += 4.9
+    limiter.record_throttle()
+    assert limiter.rpm == 60
+    clock.now += 0.2
+    limiter.record_throttle()
+    assert limiter.rpm == 30
+
+
+def test_success_adds_up_to_max_and_throttle_stops_at_min():
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(10, min_rpm=4, max_rpm=12, increase=1.0, cooldown=0.0, clock=clock)
+    for _ in range(5):
+        limiter.record_success()
+    assert limiter.rpm == 12
+    for _ in range(3):
+        clock.now += 1
+        limiter.record_throttle()
+    assert limiter.rpm == 4
+    assert limiter.requests.rate == pytest.approx(4 / 60)
+
+
+# --- call_with_retry ---
+class Flaky:
+    """Raises the given errors in turn, then returns "ok"."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return "ok"
+
+
+def test_retries_retryable_errors_then_succeeds(no_sleep):
+    fn = Flaky(FakeAPIError(429), FakeAPIError(503))
+    clock = FakeClock()
+    limiter = AdaptiveRateLimiter(60, cooldown=0.0, clock=clock)
+    assert call_with_retry(fn, limiter=limiter, base_delay=1.0, max_delay=60.0) == "ok"
+    assert fn.calls == 3
+    # Both throttles cut the rate (no cooldown here), then the success adds one
+    assert limiter.rpm == pytest.approx(60 * 0.5 * 0.5 + 1)
+
+
+def test_non_retryable_error_is_reraised_immediately(no_sleep):
+    fn = Flaky(FakeAPIError(400, "INVALID_ARGUMENT"))
+    with pytest.raises(FakeAPIError) as info:
+        call_with_retry(fn, max_retries=5)
+    assert info.value.code == 400
+    assert fn.calls == 1 and no_sleep == []
+
+
+def test_retries_stop_after_max_retries(no_sleep):
+    fn = Flaky(*[FakeAPIError(429)] * 10)
+    with pytest.raises(FakeAPIError):
+        call_with_retry(fn, max_retries=3, base_delay=0.5, max_delay=1.0)
+    assert fn.calls == 4
+    assert len(no_sleep) == 3 and all(0 <= s <= 1.0 for s in no_sleep)
+
+
+@pytest.mark.parametrize("exc, expected", [
+    (FakeAPIError(429), True), (FakeAPIError(500), True), (FakeAPIError(404), False),
+    (RuntimeError("503 UNAVAILABLE"), True), (TimeoutError(), True), (ValueError("bad"), False),
+])
+def test_is_retryable(exc, expected):
+    assert is_retryable(exc) == expected
+
+
+# --- Fake client ---
+def test_fake_client_is_deterministic_and_fails_at_its_rate():
+    def run(seed):
+        client = FakeGeminiClient(latency=0, failure_rate=0.3, seed=seed)
+        outcomes = []
+        for _ in range(200):
+            try:
+                outcomes.append(client.models.generate_content(model="m", contents=["hi"]).text)
+            except FakeAPIError as e:
+                assert e.code == 429
+                outcomes.append(None)
+        return outcomes
+
+    first = run(0)
+    assert first == run(0)
+    assert 40 <= first.count(None) <= 80
+    scores = json.loads(next(o for o in first if o))
+    assert set(scores) == {"prompt_relevance", "aesthetic_quality", "content_coherence", "artifacts"}
+
+
+def test_call_with_retry_against_fake_client(no_sleep):
+    client = FakeGeminiClient(latency=0, failure_rate=0.5, seed=3)
+    response = call_with_retry(client.models.generate_content, model="m", contents=["hi"], max_retries=20)
+    assert json.loads(response.text)
+    assert client.counts["requests"] == len(no_sleep) + 1
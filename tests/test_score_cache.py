@@ -0,0 +1,194 @@
+import json
+import os
+
+import pytest
+
+import score_cache
+from benchmark import make_tree, tiny_png
+from judges import MockJudge
+from manifest import Manifest
+from score_cache import ScoreCache
+
+
+def touch(path, data=None):
+    """Rewrite `path` (with `data` if given) and move its mtime forward, so stat caches notice."""
+    if data is not None:
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+# --- Cache keys ---
+@pytest.fixture
+def inputs(tmp_path):
+    (tmp_path / "out.png").write_bytes(tiny_png((10, 20, 30), 8))
+    (tmp_path / "cond.png").write_bytes(tiny_png((40, 50, 60), 8))
+    return {"image_path": str(tmp_path / "out.png"), "prompt": "a cat", "cond_image_paths": [str(tmp_path / "cond.png")],
+            "instruction": "Rate it", "model_name": "judge-v1"}
+
+
+@pytest.mark.parametrize("change, same", [
+    (lambda i: touch(i["image_path"]), True),
+    (lambda i: touch(i["image_path"], tiny_png((10, 20, 31), 8)), False),
+    (lambda i: touch(i["cond_image_paths"][0], tiny_png((0, 0, 0), 8)), False),
+    (lambda i: i.update(prompt="a dog"), False),
+    (lambda i: i.update(instruction="Rate it strictly"), False),
+    (lambda i: i.update(model_name="judge-v2"), False),
+    (lambda i: i.update(extra={"k": 5}), False),
+    # Missing reference images are left out, as the scorer skips them
+    (lambda i: i["cond_image_paths"].append("/nonexistent.png"), True),
+])
+def test_key_covers_every_input(tmp_path, inputs, change, same):
+    cache = ScoreCache(str(tmp_path / "scores.sqlite"))
+    before = cache.key(**inputs)
+    change(inputs)
+    assert (cache.key(**inputs) == before) is same
+
+
+def test_request_key_separates_modes_but_not_the_plain_one(tmp_path, inputs):
+    cache = ScoreCache(str(tmp_path / "scores.sqlite"))
+    key = cache.key(**inputs)
+    assert cache.request_key(key) == cache.request_key(key, None) == key
+    tags = [{"multi_image": "x"}, {"k": 3}, {"k": 5}]
+    assert len({cache.request_key(key, tag) for tag in tags} | {key}) == 4
+
+    cache.put(cache.request_key(key, {"k": 3}), {"prompt_relevance": 4})
+    assert cache.get(key) is None
+    assert cache.get(cache.request_key(key, {"k": 3})) == {"prompt_relevance": 4}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+# --- Scoring runs ---
+TASK = "SRIG"
+
+
+@pytest.fixture
+def run(tmp_path, monkeypatch):
+    """Score the tree with the mock judge (under the "gemini" field); returns the run helper."""
+    gemini_score = pytest.importorskip("gemini_score")
+    root = str(tmp_path / "data")
+    make_tree(root, entries=2, tasks=[TASK], models=3, image_size=8)
+    judge = MockJudge(result_field="gemini")
+    monkeypatch.setattr(gemini_score, "client", judge, raising=False)
+    monkeypatch.setattr(gemini_score, "limiter", None)
+    cache = ScoreCache(str(tmp_path / "scores.sqlite"))
+
+    def run(manifest=None, sampling=None, group_size=1):
+        """Judge calls made by one sweep."""
+        if manifest is not None:
+            manifest.refresh([TASK])  # as main() does at the start of every run
+        before = judge.stats.requests
+        gemini_score.process_all(os.path.join(root, TASK), manifest, cache, sampling, group_size)
+        return judge.stats.requests - before
+
+    run.root, run.cache, run.judge, run.scorer = root, cache, judge, gemini_score
+    return run
+
+
+def entries(root):
+    task_dir = os.path.join(root, TASK)
+    return [os.path.join(task_dir, e) for e in sorted(os.listdir(task_dir))]
+
+
+def results(entry):
+    with open(os.path.join(entry, "gemini_result.json")) as f:
+        return json.load(f)
+
+
+def test_unchanged_inputs_hit_the_cache(run):
+    assert run(None) == 6
+    scored = [results(e) for e in entries(run.root)]
+    assert run() == 0
+    # Lost results files are rebuilt from the cache, not re-scored
+    for e in entries(run.root):
+        os.remove(os.path.join(e, "gemini_result.json"))
+    hits = run.cache.hits
+    assert run() == 0
+    assert run.cache.hits - hits == 6
+    assert [results(e) for e in entries(run.root)] == scored
+
+
+def test_changed_output_image_is_rescored(run):
+    run()
+    entry = entries(run.root)[0]
+    before, other = results(entry), results(entries(run.root)[1])
+    image = os.path.join(entry, "model_output", "bagel.png")
+    touch(image, tiny_png((1, 2, 3), 8))
+    assert run() == 1
+    after = results(entry)
+    prompt = json.load(open(os.path.join(entry, "metadata.json")))["prompt"]
+    assert after["gemini"]["bagel"] == run.judge.ratings(image, prompt)
+    assert after["gemini_keys"]["bagel"] != before["gemini_keys"]["bagel"]
+    assert {m: k for m, k in after["gemini_keys"].items() if m != "bagel"} == \
+           {m: k for m, k in before["gemini_keys"].items() if m != "bagel"}
+    assert results(entries(run.root)[1]) == other
+
+
+def test_changed_prompt_rescores_the_entry(run):
+    run()
+    entry, other = entries(run.root)
+    untouched = results(other)
+    meta_path = os.path.join(entry, "metadata.json")
+    metadata = json.load(open(meta_path))
+    touch(meta_path, json.dumps(dict(metadata, prompt="a completely different prompt")))
+    assert run() == 3
+    assert results(other) == untouched
+    assert run() == 0
+    # Going back to the old prompt is answered from the cache
+    touch(meta_path, json.dumps(metadata))
+    assert run() == 0
+
+
+def test_changing_the_mode_keeps_scores_and_caches_per_mode(run):
+    assert run() == 6
+    # Recorded keys cover the inputs only: a sampled or grouped run doesn't re-score
+    assert run(sampling=run.scorer.Sampling(k=3, min_samples=3)) == 0
+    assert run(group_size=3) == 0
+    for e in entries(run.root):
+        os.remove(os.path.join(e, "gemini_result.json"))
+    # Without recorded scores, a sampled run can't use plain cached ones...
+    assert run(sampling=run.scorer.Sampling(k=3, min_samples=3)) == 18
+    assert all(r["samples"] == 3 for e in entries(run.root) for r in results(e)["gemini"].values())
+    for e in entries(run.root):
+        os.remove(os.path.join(e, "gemini_result.json"))
+    # ...but a grouped run reuses them (a lone or left-out output is scored with a plain call)
+    assert run(group_size=3) == 0
+    assert all("samples" not in r for e in entries(run.root) for r in results(e)["gemini"].values())
+
+
+def test_manifest_only_rechecks_entries_whose_inputs_changed(run, tmp_path, monkeypatch):
+    manifest = Manifest(run.root, str(tmp_path / "manifest.sqlite"))
+    assert run(manifest) == 6
+    hashed = []
+    key = run.cache.key
+    monkeypatch.setattr(run.cache, "key", lambda image_path, *a, **k: hashed.append(image_path) or key(image_path, *a, **k))
+    # The next sweep finds every score current and records each entry's input signature...
+    assert run(manifest) == 0
+    assert len(hashed) == 6
+    # ...so later ones don't hash anything until an input changes
+    hashed.clear()
+    assert run(manifest) == 0
+    assert hashed == []
+
+    entry = entries(run.root)[1]
+    touch(os.path.join(entry, "model_output", "sdxl.png"), tiny_png((9, 9, 9), 8))
+    assert run(manifest) == 1
+    assert sorted(os.path.dirname(os.path.dirname(p)) for p in hashed) == [entry] * 3
+
+
+def test_mock_judge_runs_use_isolated_caches(tmp_path, monkeypatch):
+    async_score = pytest.importorskip("async_score")
+    root = str(tmp_path / "data")
+    make_tree(root, entries=1, tasks=[TASK], models=2, image_size=8)
+    shared = tmp_path / "shared"
+    monkeypatch.setenv("IMAGENWORLD_SCORE_CACHE", str(shared / "gemini_scores.sqlite"))
+    monkeypatch.setenv("IMAGENWORLD_UPLOAD_CACHE", str(shared / "gemini_uploads.sqlite"))
+    monkeypatch.setattr(score_cache, "_default_cache", None)
+    monkeypatch.setattr("sys.argv", ["async_score.py", "--root", root, "--tasks", TASK, "--judge", "mock",
+                                     "--no-manifest"])
+    async_score.main()
+    assert "mock" in results(entries(root)[0])
+    assert not shared.exists()
+    assert len(score_cache.get_default_cache()) == 2
+    assert not score_cache.get_default_cache().path.startswith(str(shared))
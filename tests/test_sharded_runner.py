@@ -0,0 +1,59 @@
+import json
+import os
+import time
+
+import sharded_runner
+from benchmark import make_tree
+
+IMAGE = "dummy.png"
+
+
+def entries(root):
+    return sorted(os.path.join(root, task, e) for task in ("TIG", "TIE") for e in os.listdir(os.path.join(root, task)))
+
+
+def inferred(jsonl):
+    """Entry count the workers actually ran inference for, from their telemetry events."""
+    if not os.path.exists(jsonl):
+        return 0
+    with open(jsonl) as f:
+        events = [json.loads(line) for line in f]
+    return sum(1 for e in events if e["stage"] == "infer_one_image" and e["metric"] == "seconds")
+
+
+def claims(root):
+    return sorted(os.path.join(d, f) for d, _, files in os.walk(root) for f in files if ".claim" in f)
+
+
+def test_dummy_workers_process_each_entry_once(tmp_path, monkeypatch):
+    root = str(tmp_path / "data")
+    jsonl = str(tmp_path / "events.jsonl")
+    make_tree(root, entries=4, tasks=["TIG", "TIE"], models=1, image_size=16)
+    # Spawned workers read this when they import telemetry
+    monkeypatch.setenv("IMAGENWORLD_TELEMETRY_JSONL", jsonl)
+    all_entries = entries(root)
+
+    done = all_entries[0]
+    with open(os.path.join(done, "model_output", IMAGE), "wb") as f:
+        f.write(b"already there")
+    held = all_entries[1]
+    assert sharded_runner.try_claim(held, IMAGE)  # another live worker is on it
+
+    argv = ["--model", "Dummy", "--image-name", IMAGE, "--root", root, "--tasks", "TIG", "TIE",
+            "--devices", "cpu", "--workers", "2", "--dummy", "--no-manifest"]
+    assert sharded_runner.run(sharded_runner.parse_args(argv)) == len(all_entries) - 2
+    assert inferred(jsonl) == len(all_entries) - 2
+    for entry in all_entries:
+        assert os.path.exists(os.path.join(entry, "model_output", IMAGE)) == (entry != held)
+    with open(os.path.join(done, "model_output", IMAGE), "rb") as f:
+        assert f.read() == b"already there"
+    # Workers release their own claims; the foreign one is left alone
+    assert claims(root) == [sharded_runner.claim_path(held, IMAGE)]
+
+    # The other worker died: once its claim goes stale, a re-run takes it over and skips the rest
+    old = time.time() - sharded_runner.CLAIM_TTL - 1
+    os.utime(sharded_runner.claim_path(held, IMAGE), (old, old))
+    assert sharded_runner.run(sharded_runner.parse_args(argv)) == 1
+    assert inferred(jsonl) == len(all_entries) - 1
+    assert os.path.exists(os.path.join(held, "model_output", IMAGE))
+    assert claims(root) == []
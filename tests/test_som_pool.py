@@ -0,0 +1,27 @@
+import os
+
+import som_pool
+from benchmark import make_tree
+
+
+def som_previews(root):
+    return sorted(
+        os.path.relpath(os.path.join(d, f), root)
+        for d, _, files in os.walk(root) if os.sep + "SoM" + os.sep in d + os.sep for f in files
+    )
+
+
+def test_dummy_pool_writes_every_preview_once(tmp_path):
+    root = str(tmp_path)
+    make_tree(root, entries=3, tasks=["TIG", "TIE"], models=2, image_size=16)
+    argv = ["--root", root, "--tasks", "TIG", "TIE", "--devices", "cpu", "--workers-per-device", "2", "--dummy"]
+
+    counts = som_pool.run(som_pool.parse_args(argv))
+    assert counts == {"done": 12, "skipped": 0, "failed": 0}
+    previews = som_previews(root)
+    assert len(previews) == 12
+    # SoM/<model>/<model>.png next to model_output/
+    assert all(p.split(os.sep)[-2] == os.path.splitext(p.split(os.sep)[-1])[0] for p in previews)
+
+    # Nothing left to do on a re-run
+    assert som_pool.run(som_pool.parse_args(argv)) == {"done": 0, "skipped": 0, "failed": 0}
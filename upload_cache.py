@@ -0,0 +1,198 @@
+"""Content-addressed cache of Gemini file uploads, shared by all the Gemini scripts.
+
+Uploads are keyed by the SHA-256 of the file bytes, so the same conditioning
+image is uploaded once per API key instead of once per model output. Entries
+remember the server-side expiration (Files API uploads live for 48h) and the
+table is trimmed in least-recently-used order. The index is a small SQLite
+file so separate runs and processes share it.
+
+    from upload_cache import cached_upload
+    handle = cached_upload(client, "TIE/TIE_A_000001/cond_1.png")
+"""
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.getenv(
+    "IMAGENWORLD_UPLOAD_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "imagenworld", "gemini_uploads.sqlite")
+)
+FILE_TTL = 48 * 3600
+EXPIRY_MARGIN = 3600  # don't hand out handles that expire within the next hour
+MAX_ENTRIES = 100_000
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _client_namespace(client) -> str:
+    """Uploaded files are only visible to the project that owns the API key."""
+    api_key = getattr(getattr(client, "_api_client", None), "api_key", None) or ""
+    return hashlib.sha256(api_key.encode()).hexdigest()[:16]
+
+
+def _expiration_ts(handle) -> float:
+    exp = getattr(handle, "expiration_time", None)
+    if isinstance(exp, datetime):
+        return exp.timestamp()
+    return time.time() + FILE_TTL
+
+
+class UploadCache:
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_entries: int = MAX_ENTRIES,
+                 expiry_margin: float = EXPIRY_MARGIN):
+        self.path = path
+        self.max_entries = max_entries
+        self.expiry_margin = expiry_margin
+        self.hits = 0
+        self.misses = 0
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS uploads ("
+            " digest TEXT NOT NULL, namespace TEXT NOT NULL, name TEXT, uri TEXT, mime_type TEXT,"
+            " expires_at REAL NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (digest, namespace))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS uploads_last_used ON uploads (last_used)")
+        self._lock = threading.Lock()
+        # Live handle objects from this process, and per-key locks so concurrent
+        # callers asking for the same bytes trigger a single upload.
+        self._handles: Dict[Tuple[str, str], object] = {}
+        # (digest, namespace) -> [lock, number of threads holding or waiting on it]
+        self._inflight: Dict[Tuple[str, str], list] = {}
+        # (path, size, mtime) -> digest, to avoid re-hashing unchanged files.
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+        self.purge_expired()
+
+    def digest(self, path: str) -> str:
+        st = os.stat(path)
+        key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = file_sha256(path)
+            self._digests[key] = digest
+        return digest
+
+    def get(self, digest: str, namespace: str = "", min_ttl: Optional[float] = None):
+        """Cached handle for `digest`, if it stays valid for at least `min_ttl` seconds."""
+        now = time.time()
+        min_ttl = self.expiry_margin if min_ttl is None else min_ttl
+        with self._lock:
+            row = self._db.execute(
+                "SELECT name, uri, mime_type, expires_at FROM uploads WHERE digest=? AND namespace=?",
+                (digest, namespace),
+            ).fetchone()
+            if row is None:
+                return None
+            name, uri, mime_type, expires_at = row
+            if expires_at - min_ttl <= now:
+                self._db.execute("DELETE FROM uploads WHERE digest=? AND namespace=?", (digest, namespace))
+                self._handles.pop((digest, namespace), None)
+                return None
+            self._db.execute(
+                "UPDATE uploads SET last_used=? WHERE digest=? AND namespace=?", (now, digest, namespace)
+            )
+            handle = self._handles.get((digest, namespace))
+        if handle is None:
+            # Imported here so judges.py (and the mock judge) work without google-genai installed
+            from google.genai import types
+            handle = types.File(name=name, uri=uri, mime_type=mime_type)
+        return handle
+
+    def put(self, digest: str, handle, namespace: str = ""):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (digest, namespace, getattr(handle, "name", None), getattr(handle, "uri", None),
+                 getattr(handle, "mime_type", None), _expiration_ts(handle), now),
+            )
+            self._handles[(digest, namespace)] = handle
+            self._evict()
+
+    def _evict(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM uploads").fetchone()
+        overflow = count - self.max_entries
+        if overflow <= 0:
+            return
+        victims = self._db.execute(
+            "SELECT digest, namespace FROM uploads ORDER BY last_used LIMIT ?", (overflow,)
+        ).fetchall()
+        self._db.executemany("DELETE FROM uploads WHERE digest=? AND namespace=?", victims)
+        for key in victims:
+            self._handles.pop(tuple(key), None)
+
+    def purge_expired(self):
+        with self._lock:
+            self._db.execute("DELETE FROM uploads WHERE expires_at <= ?", (time.time() + self.expiry_margin,))
+
+    def upload(self, client, path: str, min_ttl: Optional[float] = None):
+        """Return a handle for `path`, uploading only if these bytes aren't cached."""
+        digest = self.digest(path)
+        namespace = _client_namespace(client)
+        key = (digest, namespace)
+        handle = self.get(digest, namespace, min_ttl)
+        if handle is not None:
+            self.hits += 1
+            telemetry.get_telemetry().count(telemetry.current_stage() or "upload", "upload_hits")
+            return handle
+        with self._lock:
+            entry = self._inflight.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+            inflight = entry[0]
+        try:
+            with inflight:
+                # Another thread may have finished the same upload while we waited.
+                handle = self.get(digest, namespace, min_ttl)
+                if handle is not None:
+                    self.hits += 1
+                    telemetry.get_telemetry().count(telemetry.current_stage() or "upload", "upload_hits")
+                    return handle
+                self.misses += 1
+                start = time.perf_counter()
+                handle = client.files.upload(file=path)
+                stage_name = telemetry.current_stage() or "upload"
+                telemetry.get_telemetry().observe(stage_name, "upload_seconds", time.perf_counter() - start)
+                telemetry.get_telemetry().count(stage_name, "upload_misses")
+                self.put(digest, handle, namespace)
+                return handle
+        finally:
+            # Drop the entry only once nobody else waits on it, so later callers
+            # can't race past the waiters with a fresh lock
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._inflight[key]
+
+
+_default_cache: Optional[UploadCache] = None
+_default_lock = threading.Lock()
+
+
+def get_default_cache() -> UploadCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            # Read the env var here too, so it can be redirected after import
+            _default_cache = UploadCache(os.getenv("IMAGENWORLD_UPLOAD_CACHE", DEFAULT_CACHE_PATH))
+        return _default_cache
+
+
+def cached_upload(client, path: str, min_ttl: Optional[float] = None):
+    return get_default_cache().upload(client, path, min_ttl)